@@ -1,3 +1,5 @@
+import os
+
 # App flags
 APP_FLAG_CLOSE_WINDOW = 0
 
@@ -9,9 +11,25 @@ COLOR_WHITE = (255, 255, 255)
 COLOR_BLACK = (0, 0, 0)
 
 # Local colors
-COLOR_POSITIVE = 1
-COLOR_NEGATIVE = 2
+COLOR_POSITIVE = 1  # метка первого класса разметки
+COLOR_NEGATIVE = 2  # метка запретной зоны
 COLOR_CURSOR = 3
 
+# Классы разметки: первый получает метку 1, следующие — 3, 4, ... (2 — запретная зона).
+# Свой список классов задаётся JSON-файлом в MEDICAL_ANNOTATOR_CLASSES:
+# ["liver", "spleen", ...] или [{"name": ..., "label": ..., "color": [B, G, R]}, ...]
+CLASS_NAMES = ('liver', 'spleen', 'right kidney', 'left kidney', 'gallbladder', 'pancreas', 'stomach', 'aorta',
+               'inferior vena cava', 'portal vein', 'esophagus', 'duodenum', 'adrenal glands', 'bladder', 'tumor')
+CLASSES_PATH = os.environ.get('MEDICAL_ANNOTATOR_CLASSES')
+
 # Some sizes
 CURSOR_SIZE = 3
+
+# Cache
+CACHE_DIR = os.environ.get('MEDICAL_ANNOTATOR_CACHE',
+                           os.path.join(os.path.expanduser('~'), '.cache', 'medical_annotator'))
+DENOISE_CACHE_DIR = os.path.join(CACHE_DIR, 'denoise')
+DENOISE_CACHE_SIZE = int(os.environ.get('MEDICAL_ANNOTATOR_DENOISE_CACHE_MB', 1024)) * 2 ** 20  # в байтах
+INDEX_PATH = os.path.join(CACHE_DIR, 'index.sqlite')
+PIXEL_CACHE_DIR = os.path.join(CACHE_DIR, 'pixels')
+PIXEL_CACHE_SIZE = int(os.environ.get('MEDICAL_ANNOTATOR_PIXEL_CACHE_MB', 4096)) * 2 ** 20  # в байтах
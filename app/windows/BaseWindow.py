@@ -1,64 +1,254 @@
+import os
+from functools import reduce
+
 from cv2 import cv2
 import pydicom
-from utils.preprocessing.dicom_transforms import dicom2image, apply_windowing
+from utils.io.cache import PixelCache
+from utils.io.index import StudyIndex
+from utils.io.series import DicomSeries
+from utils.preprocessing.dicom_transforms import get_windowing
+from utils.preprocessing.windowing import WindowingEngine
+from utils.analysis.rects import clip_rect, union_rect
+from utils.drawing.text import draw_text, text_rect
+from utils.drawing.viewport import ImagePyramid, Viewport
+from utils.profiling import Profiler
+from utils.workers import print_error
 from app.constants import *
 
 
 class BaseWindow:
     name = 'Medical annotator'
+    frame_interval = 15  # сколько миллисекунд цикл окна ждёт событий между кадрами
+    max_view_size = 1200  # большие изображения показываются вписанными в квадрат такого размера
+    zoom_step = 2 ** 0.5  # во сколько раз меняется масштаб на одно нажатие
+    # Методы, задержки которых замеряются при включённом профилировании (обработчики событий и фазы отрисовки)
+    profiled_methods = ('_mouse_callback', '_keyboard_callback', '_wc_callback', '_ww_callback', '_tolerance_callback',
+                        '_brush_size_callback', '_update_image', '_update_windowing', '_set_slice', '_flush_stroke',
+                        '_floodfill', '_compute_flood', '_add_anchor', '_close_contour')
 
     def __init__(self, path):
         """
         Основное окно для Медицинского разметчика.
-        :param path: DICOM путь для чтения и разметки
+        :param path: DICOM путь для чтения и разметки (файл или папка с серией срезов)
         """
-        # Читаем DICOM
-        self.survey, self.image, self.base_windowing = self.read_survey(path)
-        self.image_shape = self.image.shape[:2]  # размеры изображения
+        # Профилирование включается переменными окружения; выключенное оно не стоит ничего,
+        # так как методы оборачиваются на экземпляре, только если профилировщик есть
+        self.profiler = Profiler.from_environment()
+        if self.profiler is not None:
+            self.profiler.instrument(self, self.profiled_methods)
+
+        # Обработчики событий только меняют состояние и помечают кадр устаревшим,
+        # а перерисовка и применение результатов фоновых задач происходят в цикле окна не чаще раза за кадр
+        self._redraw = False  # нужно ли перерисовать кадр
+        self._windowing_changed = False  # изменились ли значения windowing'а
+        self._jobs = []  # фоновые задачи окна (BackgroundJob, Propagation)
+        self.status = None  # строка состояния внизу кадра (например, ход долгой фоновой задачи)
+
+        # Читаем DICOM: папку открываем как серию, срезы которой загружаются по мере надобности
+        self.path = path
+        self.series = self.open_series(path) if os.path.isdir(path) else None
+        self.slice_index = 0  # текущий срез серии
+        if self.series is not None:
+            self.survey, self.windowing_engine = self.series.load(self.slice_index)
+            self.base_windowing = list(self.series.slices[self.slice_index].windowing)
+        else:
+            self.survey, self.windowing_engine, self.base_windowing = self.read_survey(path)
 
         # Динамические значения, которые будет изменять врач во время разметки
         self.windowing = self.base_windowing.copy()  # Значения для windowing'а
+        self.image = self._apply_windowing()  # буфер движка, обновляется на месте
+        self.image_shape = self.image.shape[:2]  # размеры изображения
+
+        # Окно показывает видимую часть изображения в выбранном масштабе; уменьшенные копии кадра
+        # берутся из пирамиды, которая строится, только когда изображение показано не 1:1
+        self.viewport = Viewport(self.image_shape, self.max_view_size)
+        self.pyramid = None
+        self._view_mouse = None  # положение мыши в окне
+        self._pan_start = None  # где началось перетаскивание средней кнопкой
+        if self.series is not None:
+            self.series.prefetch(self.slice_index, self.windowing)
         if type(self) is BaseWindow:
             self._init_window()
             self._init_widgets()
 
     @staticmethod
     def read_survey(path):
-        """Чтение DICOM исследования. Возвращает объект DICOM, исследование и значения windowing'а"""
+        """
+        Чтение DICOM исследования. Возвращает объект DICOM, движок windowing'а и значения windowing'а.
+        Декодированные пиксели сжатых файлов берутся из кеша.
+        """
         survey = pydicom.dcmread(path)
-        img, base_windowing = dicom2image(survey, equalize=False, raw=True)
-        img = apply_windowing(img, *base_windowing)
-        img = cv2.cvtColor(img, cv2.COLOR_GRAY2BGR)
-        return survey, img, base_windowing
+        base_windowing = get_windowing(survey)
+        pixels = PixelCache(PIXEL_CACHE_DIR, PIXEL_CACHE_SIZE).pixels(survey)
+        engine = WindowingEngine(pixels, *base_windowing[2:4])
+        return survey, engine, base_windowing
+
+    @staticmethod
+    def open_series(directory):
+        """
+        Открывает самую большую серию из папки через индекс исследований.
+        Заголовки перечитываются только у новых и изменившихся файлов, пиксели — только при показе среза.
+        """
+        with StudyIndex(INDEX_PATH) as index:
+            index.scan(directory)
+            return DicomSeries(index.slices(directory=directory),
+                               pixel_cache=PixelCache(PIXEL_CACHE_DIR, PIXEL_CACHE_SIZE))
+
+    @property
+    def survey_path(self):
+        """Путь к DICOM файлу текущего среза."""
+        if self.series is not None:
+            return self.series.slices[self.slice_index].path
+        return self.path
 
     def _init_widgets(self):
         """Инициализирует виджеты."""
         cv2.createTrackbar("WC", self.name, self.windowing[0], 2048, self._wc_callback)
         cv2.createTrackbar("WW", self.name, self.windowing[1], 4096, self._ww_callback)
-        cv2.setMouseCallback(self.name, self._mouse_callback)
+        cv2.setMouseCallback(self.name, self._on_mouse)
 
     def _wc_callback(self, pos):
         self.windowing[0] = pos
-        self._update_windowing()
-        self._update_image()
+        self._windowing_changed = True
+        self._request_redraw()
 
     def _ww_callback(self, pos):
         self.windowing[1] = pos
-        self._update_windowing()
-        self._update_image()
+        self._windowing_changed = True
+        self._request_redraw()
 
     def _update_windowing(self):
-        self.image, _ = dicom2image(self.survey, equalize=False, raw=True)
-        self.image = apply_windowing(self.image, *self.windowing)
-        self.image = cv2.cvtColor(self.image, cv2.COLOR_GRAY2BGR)
+        self.image = self._apply_windowing()
+
+    def _apply_windowing(self):
+        """Применяет текущий windowing через LUT движка."""
+        window_center, window_width, _, _, inverted = self.windowing
+        return self.windowing_engine.apply(window_center, window_width, inverted)
 
     def _update_image(self):
         """Обновляет изображение и заново его отрисовывает."""
-        cv2.imshow(self.name, self.image)
+        self._invalidate_view()
+        self._display(self.image)
+
+    def _invalidate_view(self, rect=None):
+        """Сообщает, что кадр изменился в прямоугольнике rect (None — весь кадр), до его показа."""
+        if self.pyramid is not None:
+            self.pyramid.invalidate(rect)
+
+    def _request_redraw(self):
+        """Помечает кадр устаревшим: он будет перерисован один раз в ближайшем кадре цикла окна."""
+        self._redraw = True
+
+    def _process_frame(self, wait=False):
+        """
+        Один кадр цикла окна: применяет windowing и результаты фоновых задач, перерисовывает кадр, если нужно.
+        :param wait: дождаться фоновых задач (для работы без интерфейса)
+        """
+        if self._windowing_changed:
+            self._windowing_changed = False
+            self._update_windowing()
+            self._redraw = True
+        for job in self._jobs:
+            if wait:
+                job.wait()
+            else:
+                job.poll()
+        if self._redraw:
+            self._redraw = False
+            self._update_image()
+
+    def _display(self, image):
+        """
+        Показывает кадр в окне. Все окна выводят изображение только через этот метод.
+        Кадр — в координатах изображения; в окно попадает его видимая часть в текущем масштабе.
+        """
+        if self.pyramid is not None and self.pyramid.base is not image:
+            self.pyramid = None
+        if not self.viewport.identity:
+            if self.pyramid is None:
+                self.pyramid = ImagePyramid(image)
+            image = self.viewport.render(self.pyramid)
+            self._draw_view(image)
+        if self.profiler is not None:
+            self.profiler.frame()
+            if self.profiler.overlay:
+                image = self.profiler.draw_overlay(image)
+        lines = reversed(self._status_lines())
+        labels = [(text, (4, image.shape[0] - 20 - 16 * row)) for row, text in enumerate(lines)]
+        rect = clip_rect(reduce(union_rect, (text_rect(*label) for label in labels)), image.shape) if labels else None
+        if rect is None:
+            cv2.imshow(self.name, image)
+            return
+        # Буферы кадра переиспользуются между кадрами: подписи рисуются прямо в кадре, а участок под ними
+        # запоминается и после показа возвращается — копируется только полоса строки состояния, а не весь кадр
+        if not image.flags.writeable:
+            image = image.copy()
+        x0, y0, x1, y1 = rect
+        saved = image[y0:y1, x0:x1].copy()
+        try:
+            for text, position in labels:
+                draw_text(image, text, position)
+            cv2.imshow(self.name, image)
+        finally:
+            image[y0:y1, x0:x1] = saved
+
+    def _job_failed(self, error):
+        """Фоновая задача упала: окно продолжает работать, ошибка видна в строке состояния до удачного запуска."""
+        print_error(error)
+        self._request_redraw()
+
+    def _status_lines(self):
+        """Строки, которые выводятся внизу кадра."""
+        lines = [f"Background task failed: {job.error!r}" for job in self._jobs if getattr(job, 'error', None)]
+        return lines + [self.status] if self.status else lines
+
+    def _set_slice(self, index):
+        """Переходит к другому срезу серии. Соседние срезы готовятся в фоне."""
+        if self.series is None or not 0 <= index < len(self.series) or index == self.slice_index:
+            return
+        previous_index, self.slice_index = self.slice_index, index
+        self.survey, self.windowing_engine = self.series.load(index, self.windowing)
+        self.windowing[2:4] = self.series.slices[index].windowing[2:4]  # intercept и slope у срезов свои
+        self.image = self._apply_windowing()
+        self.series.prefetch(index, self.windowing)
+        self._on_slice_changed(previous_index)
+        self._request_redraw()
+
+    def _on_slice_changed(self, previous_index):
+        """Вызывается после перехода на другой срез серии."""
+        pass
 
     def _init_window(self):
         cv2.namedWindow(self.name)
 
+    def _draw_view(self, view):
+        """Рисует поверх кадра окна то, что должно быть в координатах окна (например, курсор)."""
+        pass
+
+    def _on_mouse(self, event, x, y, flags, *userdata):
+        """
+        Обработчик мыши HighGUI: средняя кнопка двигает изображение, остальные события
+        передаются в `_mouse_callback` уже в координатах изображения.
+        """
+        self._view_mouse = (x, y)
+        if event == cv2.EVENT_MBUTTONDOWN:
+            self._pan_start = (x, y)
+            return
+        if event == cv2.EVENT_MBUTTONUP:
+            self._pan_start = None
+            return
+        if event == cv2.EVENT_MOUSEMOVE and self._pan_start is not None:
+            self.viewport.pan(x - self._pan_start[0], y - self._pan_start[1])
+            self._pan_start = (x, y)
+            self._request_redraw()
+            return
+        self._mouse_callback(event, *self.viewport.to_image(x, y), flags, *userdata)
+
+    def _zoom(self, factor):
+        """Меняет масштаб вокруг курсора."""
+        self.viewport.zoom(factor, self._view_mouse)
+        self._request_redraw()
+
     def _mouse_callback(self, event, x, y, flags, *userdata):
         pass
 
@@ -67,14 +257,36 @@ class BaseWindow:
         if key in (ord("q"), ord("\x1b")):
             cv2.destroyWindow(self.name)
             return APP_FLAG_CLOSE_WINDOW
+        if key == ord("["):  # Предыдущий срез серии
+            self._set_slice(self.slice_index - 1)
+        if key == ord("]"):  # Следующий срез серии
+            self._set_slice(self.slice_index + 1)
+        if key in (ord("="), ord("+")):  # Приблизить
+            self._zoom(self.zoom_step)
+        if key == ord("-"):  # Отдалить
+            self._zoom(1 / self.zoom_step)
+        if key == ord("0"):  # Показать изображение целиком
+            self.viewport.reset()
+            self._request_redraw()
+        if key == ord("p") and self.profiler is not None:  # Показать/скрыть FPS и задержки
+            self.profiler.overlay = not self.profiler.overlay
+            self._request_redraw()
 
     def show(self):
         """Отображает окно."""
         self._update_image()
         print(f"{self.__class__.__name__} is currently working")
         print("Press [Q] or [ESC] to close the window.")
+        print("Press [=] and [-] to zoom, [0] to fit the image, drag with the middle button to pan.")
+        if self.series is not None:
+            print(f"Series of {len(self.series)} slices: press [ and ] to switch slices.")
         while True:
-            key = cv2.waitKey() & 0xFF
-            traceback = self._keyboard_callback(key)
-            if traceback == APP_FLAG_CLOSE_WINDOW:
-                return
+            # Ждём событий не дольше кадра, чтобы успевать применять результаты фоновых задач
+            key = cv2.waitKey(self.frame_interval)
+            if key != -1:
+                traceback = self._keyboard_callback(key & 0xFF)
+                if traceback == APP_FLAG_CLOSE_WINDOW:
+                    if self.profiler is not None:
+                        self.profiler.close()
+                    return
+            self._process_frame()
@@ -1,21 +1,33 @@
+import csv
+import os
+
 from cv2 import cv2
 import numpy as np
 
 from app.constants import *
 from app.windows import BaseWindow
 
-from utils.drawing import draw_dot, draw_line, draw_text
-from utils.analysis import distance_between_points
+from utils.drawing import draw_dot, draw_line, draw_text, text_rect
+from utils.analysis import circle_rect, clip_rect, union_rect, closest_segment, distance_between_points, \
+    segment_lengths
 
 
 class DistanceMeasureWindow(BaseWindow):
     def __init__(self, path):
         super(DistanceMeasureWindow, self).__init__(path)
         self.spacing = self.survey[('0028', '0030')].value
-        self.lines = []
+        self.lines = np.empty((0, 2, 2), dtype=np.int32)  # завершённые измерения: концы отрезков (x, y)
+        self.start = None  # первая точка незавершённого измерения
+        self.slice_lines = {}  # измерения остальных срезов серии: (отрезки, размер пикселя)
         self.x = 0
         self.y = 0
 
+        # Завершённые измерения рисуются на отдельном слое, который перерисовывается только при их изменении.
+        # В каждом кадре поверх слоя рисуются лишь незавершённое измерение и курсор
+        self._layer = None
+        self._frame = None
+        self._dynamic_rect = None  # где в кадре нарисованы незавершённое измерение и курсор
+
         # Инициализация окна и виджетов
         if type(self) is DistanceMeasureWindow:
             self._init_window()
@@ -24,7 +36,7 @@ class DistanceMeasureWindow(BaseWindow):
     def _init_widgets(self):
         """Инициализирует виджеты."""
         super(DistanceMeasureWindow, self)._init_widgets()
-        cv2.setMouseCallback(self.name, self._mouse_callback)
+        cv2.setMouseCallback(self.name, self._on_mouse)
 
     def _mouse_callback(self, event, x, y, flags, *userdata):
         if event == cv2.EVENT_LBUTTONDOWN:
@@ -34,53 +46,113 @@ class DistanceMeasureWindow(BaseWindow):
         if event == cv2.EVENT_MOUSEMOVE:
             self.x = x
             self.y = y
-            self._update_image()
+            self._request_redraw()
+
+    def _keyboard_callback(self, key):
+        """Обработка событий клавиатуры."""
+        traceback = super(DistanceMeasureWindow, self)._keyboard_callback(key)
+        if traceback is not None:  # Если поступил какой-то сигнал, то сразу отправляем его
+            return traceback
+        if key == ord("e"):  # Выгрузить измерения
+            self._export_measurements()
+
+    def _update_windowing(self):
+        super(DistanceMeasureWindow, self)._update_windowing()
+        self._layer = None
+
+    def _on_slice_changed(self, previous_index):
+        super(DistanceMeasureWindow, self)._on_slice_changed(previous_index)
+        # Измерения хранятся для каждого среза отдельно
+        if len(self.lines):
+            self.slice_lines[previous_index] = (self.lines, self.spacing)
+        self.lines, _ = self.slice_lines.pop(self.slice_index, (np.empty((0, 2, 2), dtype=np.int32), None))
+        self.start = None
+        self.spacing = self.survey[('0028', '0030')].value
+        self._layer = None
 
     def _update_image(self):
-        image = self.image.copy()
+        if self._layer is None:
+            self._render_layer()
+        if self._dynamic_rect is not None:  # Стираем прошлое незавершённое измерение и курсор
+            x0, y0, x1, y1 = self._dynamic_rect
+            self._frame[y0:y1, x0:x1] = self._layer[y0:y1, x0:x1]
+            self._invalidate_view(self._dynamic_rect)
+
         mouse = (self.x, self.y)
-        for line in self.lines:
-            if len(line) == 1:
-                line = [line[0], mouse]
-            image = draw_line(image, line)
-            image = draw_dot(image, line[0])
-            image = draw_dot(image, line[1])
-            distance = distance_between_points(*line, spacing=self.spacing)
-            image = draw_text(image, str(round(distance, 2)) + 'mm', line[1])
-        image = draw_dot(image, mouse, color=COLOR_WHITE)
-        cv2.imshow(self.name, image)
+        rect = circle_rect(*mouse, CURSOR_SIZE)
+        if self.start is not None:
+            rect = union_rect(rect, self._draw_measurement(self._frame, self.start, mouse))
+        draw_dot(self._frame, mouse, color=COLOR_WHITE)
+        self._dynamic_rect = clip_rect(rect, self.image_shape)
+        if self._dynamic_rect is not None:
+            self._invalidate_view(self._dynamic_rect)
+        self._display(self._frame)
+
+    def _render_layer(self):
+        """Рисует слой с завершёнными измерениями."""
+        self._layer = self.image.copy()
+        for start, end in self.lines.tolist():
+            self._draw_measurement(self._layer, tuple(start), tuple(end))
+        self._frame = self._layer.copy()
+        self._dynamic_rect = None
+
+    def _draw_measurement(self, image, start, end):
+        """Рисует измерение и возвращает прямоугольник, который оно заняло."""
+        text = str(round(distance_between_points(start, end, spacing=self.spacing), 2)) + 'mm'
+        draw_line(image, (start, end))
+        draw_dot(image, start)
+        draw_dot(image, end)
+        draw_text(image, text, end)
+        rect = union_rect(circle_rect(*start, CURSOR_SIZE), circle_rect(*end, CURSOR_SIZE))
+        return union_rect(rect, text_rect(text, end))
 
     def _put_dot(self):
-        if len(self.lines) == 0 or len(self.lines[-1]) == 2:
-            self.lines.append([(self.x, self.y)])
+        if self.start is None:
+            self.start = (self.x, self.y)
         else:
-            self.lines[-1].append((self.x, self.y))
-        self._update_image()
+            line = np.array([[self.start, (self.x, self.y)]], dtype=np.int32)
+            self.lines = np.concatenate((self.lines, line))
+            self.start = None
+            self._layer = None
+        self._request_redraw()
 
     def _remove_dot(self):
-        image = self.image.copy()
-        if len(self.lines) == 0:
-            return
-        last_line = self.lines[-1]
-        if len(last_line) == 1:
-            self.lines.pop(-1)
+        if self.start is not None:  # Отменяем незавершённое измерение
+            self.start = None
         else:
-            line = self._find_closest_line()
-            self.lines.remove(line)
-        cv2.imshow(self.name, image)
+            index = self._find_closest_line()
+            if index is None:
+                return
+            self.lines = np.delete(self.lines, index, axis=0)
+            self._layer = None
+        self._request_redraw()
 
     def _find_closest_line(self):
-        closest_line = None
-        min_distance = np.inf
-        for line in self.lines:
-            (x1, y1), (x2, y2) = line
-            a = (y1 - y2) / (x1 - x2) if (x1 - x2) != 0 else None
-            if a is not None:
-                c = y1 - a * x1
-                distance = abs(self.y - a * self.x - c) / (a ** 2 + 1) ** 0.5
-            else:
-                distance = abs(self.x - x1)
-            if distance < min_distance:
-                min_distance = distance
-                closest_line = line
-        return closest_line
+        """Индекс измерения, ближайшего к курсору (по расстоянию до отрезка)."""
+        return closest_segment((self.x, self.y), self.lines)
+
+    @property
+    def measurements_path(self):
+        """Файл с измерениями: рядом с DICOM файлом или внутри папки серии."""
+        if self.series is not None:
+            return os.path.join(self.path, 'measurements.csv')
+        return os.path.splitext(self.path)[0] + '_measurements.csv'
+
+    def measurements(self):
+        """Все измерения по срезам: (номер среза, отрезки (N, 2, 2), длины в мм)."""
+        slices = dict(self.slice_lines)
+        if len(self.lines):
+            slices[self.slice_index] = (self.lines, self.spacing)
+        for index in sorted(slices):
+            lines, spacing = slices[index]
+            yield index, lines, segment_lengths(lines, spacing)
+
+    def _export_measurements(self):
+        """Сохраняет все измерения в CSV с длинами в мм."""
+        with open(self.measurements_path, 'w', newline='') as file:
+            writer = csv.writer(file)
+            writer.writerow(['slice', 'x1', 'y1', 'x2', 'y2', 'length_mm'])
+            for index, lines, lengths in self.measurements():
+                for ((x1, y1), (x2, y2)), length in zip(lines.tolist(), lengths.tolist()):
+                    writer.writerow([index, x1, y1, x2, y2, round(length, 3)])
+        print(f"Measurements saved to {self.measurements_path}")
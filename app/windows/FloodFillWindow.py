@@ -1,16 +1,28 @@
+from functools import partial
+
 from cv2 import cv2
 import numpy as np
 
 from app.constants import *
 from app.windows import SegmentationWindow
 
-from utils.preprocessing.image_transforms import denoise, remove_small_dots
-from utils.analysis.contours import find_exterior_contours
+from utils.client import ServiceClient, ServiceError
+from utils.history import diff_region
+from utils.io.cache import ArrayCache
+from utils.preprocessing.denoising import cached_denoise
+from utils.preprocessing.image_transforms import remove_small_dots
+from utils.preprocessing.windowing import WindowingEngine
+from utils.pipeline import merge_flood
+from utils.workers import get_executor, BackgroundJob
+from utils.analysis.propagation import Propagation
+from utils.analysis.rects import mask_bounding_rect, union_rect
+from utils.analysis.region_growing import find_seed_points, ToleranceMap
 
 
 class FloodFillWindow(SegmentationWindow):
     connectivity = 4  # количество пикселей для усреднения вокруг стартового пикслея
-    _flood_fill_flags = (connectivity | cv2.FLOODFILL_FIXED_RANGE | cv2.FLOODFILL_MASK_ONLY | 255 << 8)
+    max_tolerance = 50  # наибольшее значение на слайдере tolerance
+    flood_delay = 0.03  # пауза после последнего тика колёсика перед пересчётом заливки, в секундах
 
     def __init__(self, path):
         """
@@ -19,13 +31,24 @@ class FloodFillWindow(SegmentationWindow):
         """
         super(FloodFillWindow, self).__init__(path)
 
-        # Читаем DICOM
-        self.blurred_image = denoise(self.image, power=7)
+        # Локальный сервис разметки (service.py), если задан: denoise считается там один раз на всех разметчиков
+        self.client = ServiceClient.from_environment()
+        self._denoise_task = self._start_denoise()
         self.flood_mask = np.zeros(self.image_shape, dtype=np.uint8)  # маска с разметкой объекта заливкой
 
         # Динамические значения, которые будет изменять врач во время разметки
         self.tolerance = 10  # максимальное отклонение значения пикселя при разметке заливкой
 
+        # Карта минимального tolerance для каждого пикселя, пересчитывается только после новых штрихов
+        self.tolerance_map = None
+        self._mask_changed_rect = None  # где менялась маска с последнего обновления карты
+
+        # Заливка пересчитывается в фоне; пока идёт пересчёт, интерфейс не ждёт, а устаревшие результаты отбрасываются
+        self.flood_job = BackgroundJob(self._prepare_flood, self._apply_flood, self.flood_delay, self._job_failed)
+        self._jobs.append(self.flood_job)
+        self.propagation = None  # перенос разметки по серии (Propagation)
+        self.propagation_label = COLOR_POSITIVE  # метка класса, который переносится
+
         self._floodfill_flag = False  # активирована ли маска заливки
 
         # Инициализация окна и виджетов
@@ -37,72 +60,120 @@ class FloodFillWindow(SegmentationWindow):
         """Инициализирует виджеты"""
         super(FloodFillWindow, self)._init_widgets()
         # Слайдеры
-        cv2.createTrackbar("Tolerance", self.name, self.tolerance, 50, self._tolerance_callback)
+        cv2.createTrackbar("Tolerance", self.name, self.tolerance, self.max_tolerance, self._tolerance_callback)
 
         # Обработка мыши
-        cv2.setMouseCallback(self.name, self._mouse_callback)
+        cv2.setMouseCallback(self.name, self._on_mouse)
 
-    def _single_floodfill(self, image, x, y, tolerance):
-        # Создаём специальную временную пустую маску для заливки
-        _flood_mask = np.zeros((self.image_shape[0] + 2, self.image_shape[1] + 2), dtype=np.uint8)
+    def _start_denoise(self):
+        """
+        Запускает подавление шума в фоне на одноканальном изображении, чтобы окно открывалось сразу.
+        Результат кешируется на диске, поэтому при повторном открытии исследования шаг пропускается.
+        """
+        image = self.windowing_engine.gray.copy()  # Буфер движка меняется в потоке интерфейса
+        return get_executor().submit(self._denoise, self.survey_path, lambda: image, self.survey.get('SOPInstanceUID'),
+                                     tuple(self.windowing))
 
-        # Процесс заливки
-        cv2.floodFill(image, _flood_mask, (x, y), 0, tolerance, tolerance, self._flood_fill_flags)
+    def _denoise(self, path, image, uid, windowing):
+        """
+        Подавление шума в сервисе, если он задан и доступен, иначе локально (вызывается в пуле).
+        :param image: функция, возвращающая изображение после windowing'а (нужно только без сервиса)
+        """
+        if self.client is not None:
+            try:
+                return self.client.denoised(path, windowing[0], windowing[1], windowing[4])
+            except ServiceError as error:
+                print(f"Annotation service is unavailable, denoising locally: {error}")
+        cache = ArrayCache(DENOISE_CACHE_DIR, DENOISE_CACHE_SIZE)
+        return cached_denoise(image(), uid=uid, cache=cache, windowing=windowing, power=7)
 
-        # Обрезаем специальную маску (такова специфика функции)
-        flood_mask = _flood_mask[1:-1, 1:-1].copy()
-        return flood_mask
+    def _slice_image(self, index, windowing):
+        """
+        Изображение без шума для любого среза серии, как у `blurred_image` текущего (вызывается в пуле).
+        Движок windowing'а свой: движки серии использует поток интерфейса.
+        """
+        info = self.series.slices[index]
+        window_center, window_width, _, _, inverted = windowing
+        windowing = (window_center, window_width) + tuple(info.windowing[2:4]) + (inverted,)
+
+        def image():
+            engine = WindowingEngine(self.series.pixels(index), *info.windowing[2:4])
+            engine.apply(window_center, window_width, inverted)
+            return engine.gray
+
+        return self._denoise(info.path, image, info.sop_uid or None, windowing)
+
+    @property
+    def blurred_image(self):
+        """Изображение без шума. Если фоновая задача ещё не закончилась, ждём её."""
+        return self._denoise_task.result()
 
     def _floodfill(self):
-        """Разметка заливкой."""
-        # Обнуляем маску с заливкой
-        self.flood_mask = np.zeros(self.image_shape, dtype=np.uint8)
+        """Разметка заливкой: запрашивает пересчёт, который выполнится в фоне после паузы в запросах."""
+        self.flood_job.request()
 
-        # Получаем контуры всех объектов
-        all_contours = find_exterior_contours(self.positive_mask)
-
-        # Переводим в [0..1] из-за особенностей функции floodfill
-        tolerance = (self.tolerance / 1000,) * 3
-        image = np.array(self.blurred_image.copy() / 1000, dtype=np.float32)
-
-        # Создаём запретную зону для floodfill (красный цвет при разметке)
-        image[self.mask == 2] = 1.0
-
-        for contours in all_contours:  # Итерируемся для каждого объекта
-            for coordinates in contours:  # Итерируемся для каждой пары координат
-                x, y = coordinates[0]  # Нас интересуют только пары координат
-                flood_mask = self._single_floodfill(image, x, y, tolerance)  # Заливка
-                self.flood_mask = cv2.bitwise_or(self.flood_mask, flood_mask)  # Объединяем с ранее созданными масками
-
-            # Такую же процедуру сделаем для центра объекта
-            centroid = contours.mean(axis=1).mean(axis=0)  # Находим примерный центр
-            xc, yc = int(centroid[0]), int(centroid[1])  # Переводим в int
-            if self.positive_mask[xc][yc] == 1:  # Если центр является размеченным (а то может быть кольцо)
-                flood_mask = self._single_floodfill(image, xc, yc, tolerance)  # Заливка
-                self.flood_mask = cv2.bitwise_or(self.flood_mask, flood_mask)  # Объединяем с ранее созданными масками
-        self.flood_mask = remove_small_dots(self.flood_mask)  # Убираем мелкие точки
-        self._update_image()
-
-    def _update_image(self):
-        """Обновляет изображение и заново его отрисовывает."""
-        positive_mask = self.positive_mask
-        if self._floodfill_flag:  # Если включен режим с заливкой, то объединяем
-            positive_mask = cv2.bitwise_or(self.positive_mask, np.array(self.flood_mask, dtype=np.uint8))
+    def _prepare_flood(self):
+        """Снимает состояние для пересчёта заливки (в потоке интерфейса) и возвращает задачу для фона."""
+        changed_rect, self._mask_changed_rect = self._mask_changed_rect, None
+        return partial(self._compute_flood, self.tolerance_map, self._denoise_task, self.positive_mask,
+                       self.negative_mask, changed_rect, self.tolerance)
 
-        # Получаем маски и контуры
-        positive_mask, positive_contours = self.apply_mask(positive_mask, color=COLOR_GREEN)
-        negative_mask, negative_contours = self.apply_mask(self.negative_mask, color=COLOR_RED)
-        _, cursor_contours = self.apply_mask(self.ui_mask, color=COLOR_WHITE)
+    def _compute_flood(self, tolerance_map, denoise_task, positive_mask, negative_mask, changed_rect, tolerance):
+        """Пересчёт заливки в фоновом потоке. Возвращает карту tolerance и маску заливки."""
+        # Стартовые точки — контуры и центры объектов, красная разметка — запретная зона для заливки.
+        # Карту tolerance обновляем, только если маска изменилась, иначе заливка — это просто порог
+        if tolerance_map is None:
+            tolerance_map = ToleranceMap(denoise_task.result(), self.max_tolerance, self.connectivity)
+            tolerance_map.update(find_seed_points(positive_mask), negative_mask)
+        elif changed_rect is not None:
+            tolerance_map.update(find_seed_points(positive_mask), negative_mask, changed_rect)
 
-        # Складываем маски и накладываем на изображение
-        image = cv2.addWeighted(self.image, 0.75, positive_mask + negative_mask, 0.25, 0)
+        flood_mask = tolerance_map.fill(tolerance)
+        flood_mask = remove_small_dots(flood_mask)  # Убираем мелкие точки
+        return tolerance_map, flood_mask
 
-        # Рисуем поверх контуры
-        image = cv2.drawContours(image, positive_contours, -1, color=COLOR_GREEN, thickness=1)
-        image = cv2.drawContours(image, negative_contours, -1, color=COLOR_RED, thickness=1)
-        image = cv2.drawContours(image, cursor_contours, -1, color=COLOR_WHITE, thickness=1)
+    def _apply_flood(self, result):
+        """Показывает готовую заливку (в потоке интерфейса)."""
+        previous_flood_mask = self.flood_mask
+        self.tolerance_map, self.flood_mask = result
 
-        cv2.imshow(self.name, image)
+        # Перерисовываем только ту область, где заливка изменилась
+        if self._floodfill_flag:
+            self.compositor.invalidate(mask_bounding_rect(previous_flood_mask != self.flood_mask))
+        self._request_redraw()
+
+    def _overlay_labels(self, rect):
+        """Метки, которые нужно отобразить в прямоугольнике rect (с учётом заливки)."""
+        labels = super(FloodFillWindow, self)._overlay_labels(rect)
+        if self._floodfill_flag:  # Если включен режим с заливкой, то объединяем
+            x0, y0, x1, y1 = rect
+            labels = merge_flood(labels, self.flood_mask[y0:y1, x0:x1], self.active_label)
+        return labels
+
+    def _on_slice_changed(self, previous_index):
+        super(FloodFillWindow, self)._on_slice_changed(previous_index)
+        # Заливка и карта tolerance относятся к конкретному срезу, пересчёт для прежнего среза уже не нужен
+        self.flood_job.cancel()
+        self._denoise_task = self._start_denoise()
+        self.tolerance_map = None
+        self._mask_changed_rect = None
+        self.flood_mask = np.zeros(self.image_shape, dtype=np.uint8)
+
+    def _on_class_changed(self):
+        super(FloodFillWindow, self)._on_class_changed()
+        # Заливка и карта tolerance строятся от разметки активного класса, для нового класса — заново
+        self.flood_job.cancel()
+        if self._floodfill_flag:
+            self.compositor.invalidate(mask_bounding_rect(self.flood_mask))
+        self.tolerance_map = None
+        self._mask_changed_rect = None
+        self.flood_mask = np.zeros(self.image_shape, dtype=np.uint8)
+        if self._floodfill_flag:
+            self._floodfill()
+
+    def _on_mask_changed(self, rect):
+        super(FloodFillWindow, self)._on_mask_changed(rect)
+        self._mask_changed_rect = union_rect(self._mask_changed_rect, rect)
 
     def _tolerance_callback(self, pos):
         self.tolerance = pos
@@ -130,4 +201,85 @@ class FloodFillWindow(SegmentationWindow):
         if key == ord("f"):  # Если нажата F, то включаем/выключаем режим заливки
             self._floodfill_flag = not self._floodfill_flag
             print("Floodfill " + "activated" if self._floodfill_flag else "disabled")
+            self.compositor.invalidate(mask_bounding_rect(self.flood_mask))
+            self._request_redraw()
             self._floodfill()
+        if key == ord("c"):  # Принять заливку: переносим её в маску разметки (можно отменить)
+            self._commit_flood()
+        if key == ord("v"):  # Перенести разметку на соседние срезы серии (повторное нажатие — отмена)
+            self._toggle_propagation()
+
+    def _commit_flood(self):
+        """Переносит текущую заливку в маску разметки одной правкой истории."""
+        rect = mask_bounding_rect(self.flood_mask)
+        if rect is None:
+            return
+        x0, y0, x1, y1 = rect
+        self.flood_job.cancel()  # Пересчёт, начатый до принятия, покажет уже принятую заливку
+        self._edit_mask(rect, lambda: np.copyto(
+            self.mask[y0:y1, x0:x1],
+            merge_flood(self.mask[y0:y1, x0:x1], self.flood_mask[y0:y1, x0:x1], self.active_label)))
+        self.history.commit()
+        self.compositor.invalidate(rect)
+        self.flood_mask = np.zeros(self.image_shape, dtype=np.uint8)
+        self._request_redraw()
+
+    def _toggle_propagation(self):
+        """
+        Переносит принятую разметку текущего среза на соседние срезы, пока область не исчезнет.
+        Каждый срез получает перенос отдельной правкой своей истории, её можно отменить при просмотре.
+        """
+        if self.propagation is not None and self.propagation.busy:
+            self.propagation.cancel()
+            return
+        if self.series is None or len(self.series) < 2:
+            print("Propagation needs a series of several slices (open a directory)")
+            return
+        mask = self.positive_mask
+        if not mask.any():
+            print("Nothing to propagate: accept a mask on this slice first")
+            return
+        if self.propagation is not None:
+            self._jobs.remove(self.propagation)
+        # Переносится активный класс; запретная зона — красная разметка и разметка других классов
+        label = self.propagation_label = self.active_label
+        forbidden = {index: (labels != 0) & (labels != label) for index, labels in self.masks.items()}
+        self.propagation = Propagation(
+            partial(self._slice_image, windowing=tuple(self.windowing)), self.slice_index, mask, len(self.series),
+            self.tolerance, forbidden, self._apply_propagation, self._finish_propagation,
+            connectivity=self.connectivity)
+        self._jobs.append(self.propagation)
+        self.status = "Propagating... [V] to cancel"
+        self._request_redraw()
+
+    def _apply_propagation(self, index, flood_mask):
+        """Добавляет перенесённую разметку к разметке среза index (в потоке интерфейса)."""
+        rect = mask_bounding_rect(flood_mask)
+        if rect is not None:
+            x0, y0, x1, y1 = rect
+            if index == self.slice_index:
+                self._edit_mask(rect, lambda: np.copyto(
+                    self.mask[y0:y1, x0:x1],
+                    merge_flood(self.mask[y0:y1, x0:x1], flood_mask[y0:y1, x0:x1], self.propagation_label)))
+                self.history.commit()
+            else:
+                mask = self.masks.get(index)
+                if mask is None:
+                    mask = np.zeros(self.image_shape, dtype=np.uint8)
+                history = self.histories.get(index) or self._new_history()
+                before = mask[y0:y1, x0:x1].copy()
+                mask[y0:y1, x0:x1] = merge_flood(before, flood_mask[y0:y1, x0:x1], self.propagation_label)
+                history.record(*diff_region(mask, before, rect))
+                history.commit()
+                self.masks[index], self.histories[index] = mask, history
+                self._slice_counts.pop(index, None)  # Количества пикселей для объёма пересчитаются
+        first, last = self.propagation.indices
+        self.status = f"Propagating: {self.propagation.done} slices ({first}..{last}), [V] to cancel"
+        self._request_redraw()
+
+    def _finish_propagation(self):
+        first, last = self.propagation.indices
+        state = "cancelled" if self.propagation.cancelled else "finished"
+        print(f"Propagation {state}: {self.propagation.done} slices ({first}..{last})")
+        self.status = None
+        self._request_redraw()
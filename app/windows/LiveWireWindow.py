@@ -0,0 +1,148 @@
+from functools import partial
+
+from cv2 import cv2
+import numpy as np
+
+from app.constants import *
+from app.windows import SegmentationWindow
+
+from utils.analysis.livewire import LiveWire, LiveWirePath
+from utils.analysis.rects import clip_rect
+from utils.workers import BackgroundJob
+
+
+class LiveWireWindow(SegmentationWindow):
+    """
+    Обводка границ «умными ножницами»: ЛКМ ставит опорные точки, путь между ними идёт вдоль границ органа.
+    Клик рядом с первой точкой, двойной клик или Enter замыкает контур и заливает его в разметку,
+    ПКМ или Backspace убирает последнюю опорную точку.
+    """
+    close_distance = 8  # клик ближе к первой точке (в пикселях окна) замыкает контур
+    graph_delay = 0.1  # пауза после изменения windowing'а перед пересчётом графа стоимостей, в секундах
+
+    def __init__(self, path):
+        super(LiveWireWindow, self).__init__(path)
+        self.brush_size = CURSOR_SIZE  # Кисти нет, курсор — маленький круг
+        self.contour = LiveWirePath()  # обводимый контур
+        self._preview = None  # путь от последней опорной точки до курсора
+
+        # Граф стоимостей строится в фоне для каждого изображения после windowing'а, окно открывается сразу
+        self.live_wire = None
+        self.graph_job = BackgroundJob(self._prepare_graph, self._apply_graph, self.graph_delay, self._job_failed)
+        self._jobs.append(self.graph_job)
+        self.graph_job.request()
+
+        # Инициализация окна и виджетов
+        if type(self) is LiveWireWindow:
+            self._init_window()
+            self._init_widgets()
+
+    def _init_widgets(self):
+        """Инициализирует виджеты (без слайдера кисти)."""
+        super(SegmentationWindow, self)._init_widgets()
+
+    def _prepare_graph(self):
+        return partial(LiveWire, self.windowing_engine.gray.copy())
+
+    def _apply_graph(self, live_wire):
+        """Подключает новый граф; дерево путей строится заново от последней опорной точки."""
+        self.live_wire = live_wire
+        if len(self.contour):
+            live_wire.set_source(self.contour.anchors[-1])
+        self._request_redraw()
+
+    def _ready_live_wire(self):
+        """Граф стоимостей; если он ещё строится, ждём его."""
+        if self.live_wire is None:
+            self.graph_job.wait()
+        return self.live_wire
+
+    def _update_windowing(self):
+        super(LiveWireWindow, self)._update_windowing()
+        self.graph_job.request()
+
+    def _on_slice_changed(self, previous_index):
+        super(LiveWireWindow, self)._on_slice_changed(previous_index)
+        # Контур и граф относятся к прежнему срезу
+        self.contour = LiveWirePath()
+        self.live_wire = None
+        self._preview = None
+        self.graph_job.request()
+
+    def _update_image(self):
+        # Путь до курсора — проход по готовому дереву путей, поиск заново не нужен
+        live_wire = self.live_wire
+        if live_wire is not None and live_wire.source is not None and self.cursor is not None:
+            self._preview = live_wire.path_to(self.cursor)
+        else:
+            self._preview = None
+        super(LiveWireWindow, self)._update_image()
+
+    def _overlay_paths(self):
+        paths = [(self.contour.points(), COLOR_GREEN)]
+        if self._preview is not None:
+            paths.append((self._preview, COLOR_WHITE))
+        return paths
+
+    def _add_anchor(self, x, y):
+        """Ставит опорную точку; клик рядом с первой точкой замыкает контур."""
+        live_wire = self._ready_live_wire()
+        if len(self.contour) >= 2:
+            x0, y0 = self.contour.anchors[0]
+            if np.hypot(x - x0, y - y0) * self.viewport.scale <= self.close_distance:
+                self._close_contour()
+                return
+        segment = live_wire.path_to((x, y)) if len(self.contour) else None
+        self.contour.add((x, y), segment)
+        live_wire.set_source((x, y))
+        self._request_redraw()
+
+    def _remove_anchor(self):
+        """Убирает последнюю опорную точку."""
+        if not len(self.contour):
+            return
+        self.contour.pop()
+        live_wire = self._ready_live_wire()
+        if len(self.contour):
+            live_wire.set_source(self.contour.anchors[-1])
+        else:
+            live_wire.source = None
+        self._request_redraw()
+
+    def _close_contour(self):
+        """Замыкает контур и заливает его в разметку одной правкой истории."""
+        if len(self.contour) < 2:
+            return
+        live_wire = self._ready_live_wire()
+        polygon = self.contour.points(live_wire.path_to(self.contour.anchors[0]))
+        self.contour = LiveWirePath()
+        live_wire.source = None
+        rect = clip_rect((*polygon.min(axis=0), *(polygon.max(axis=0) + 1)), self.image_shape)
+        if rect is not None:
+            x0, y0, x1, y1 = rect
+            self._edit_mask(rect, lambda: cv2.fillPoly(
+                self.mask[y0:y1, x0:x1], [(polygon - (x0, y0)).reshape(-1, 1, 2)], self.active_label))
+            self.history.commit(polygon)
+        self._request_redraw()
+
+    def _mouse_callback(self, event, x, y, flags, *userdata):
+        """Обработка событий мыши (кисть в этом режиме не используется)."""
+        if event == cv2.EVENT_LBUTTONDOWN:
+            self._add_anchor(x, y)
+        if event == cv2.EVENT_LBUTTONDBLCLK:
+            self._close_contour()
+        if event == cv2.EVENT_RBUTTONDOWN:
+            self._remove_anchor()
+        if event == cv2.EVENT_MOUSEMOVE:
+            self.cursor = (x, y)
+            self._request_redraw()
+
+    def _keyboard_callback(self, key):
+        """Обработка событий клавиатуры."""
+        traceback = super(LiveWireWindow, self)._keyboard_callback(key)
+        if traceback is not None:  # Если поступил какой-то сигнал, то сразу отправляем его
+            return traceback
+        if key in (10, 13):  # Enter: замкнуть контур
+            self._close_contour()
+        if key == 8:  # Backspace: убрать последнюю опорную точку
+            self._remove_anchor()
@@ -1,20 +1,42 @@
+import os
+
 from cv2 import cv2
 import numpy as np
 
 from app.constants import *
 from app.windows import BaseWindow
 
-from utils.analysis import find_exterior_contours
+from utils.analysis import clip_rect
+from utils.analysis.statistics import LabelStatistics
+from utils.drawing import OverlayCompositor, Stroke, ClassPalette
+from utils.history import EditHistory, HistoryBudget, diff_region
+from utils.io.masks import MASK_EXTENSION, save_mask, load_mask
 
 
 class SegmentationWindow(BaseWindow):
     def __init__(self, path):
         super(SegmentationWindow, self).__init__(path)
         self.mask = np.zeros(self.image_shape, dtype=np.uint8)  # маска с разметкой
-        self.ui_mask = np.zeros(self.image_shape, dtype=np.uint8)  # маска для отображения курсора
+        self.masks = {}  # маски остальных срезов серии
+        self.history_budget = HistoryBudget()  # бюджет памяти, общий для историй всех срезов
+        self.history = self._new_history()  # история правок маски для undo/redo
+        self.histories = {}  # истории правок остальных срезов серии
+        self.cursor = None  # положение курсора
         self.brush_size = 5  # толщина кисти
-        self._draw_flag = False  # рисуем ли
-        self._erase_flag = False  # стираем ли
+        self.stroke = None  # текущий штрих кисти (рисование или стирание)
+
+        # Классы разметки (органы): кисть и заливка работают с активным классом, запретная зона общая
+        self.palette = ClassPalette.default()
+        self.active_class = 0  # номер активного класса в палитре
+
+        # Статистика разметки по меткам, обновляется только по изменённым пикселям
+        self.statistics = LabelStatistics.from_engine(self.windowing_engine, self.pixel_spacing)
+        self._slice_counts = {}  # номер среза -> количество пикселей каждой метки (для объёма)
+        self.show_statistics = True
+
+        # Отрисовка разметки поверх изображения, перерисовывается только изменившаяся область
+        # Все классы — одна таблица цветов и один проход поиска границ, число классов на время отрисовки не влияет
+        self.compositor = OverlayCompositor(self.image, self._overlay_labels, self.palette.colors())
 
         # Инициализация окна и виджетов
         if type(self) is SegmentationWindow:
@@ -25,75 +47,265 @@ class SegmentationWindow(BaseWindow):
         """Инициализирует виджеты."""
         super(SegmentationWindow, self)._init_widgets()
         cv2.createTrackbar("brush size", self.name, self.brush_size, 20, self._brush_size_callback)
-        cv2.setMouseCallback(self.name, self._mouse_callback)
+        cv2.setMouseCallback(self.name, self._on_mouse)
 
     def _brush_size_callback(self, pos):
         self.brush_size = pos
 
+    def _update_windowing(self):
+        super(SegmentationWindow, self)._update_windowing()
+        self.compositor.image = self.image
+        self.compositor.invalidate()
+
+    def _new_history(self):
+        """История правок среза; память под истории всех срезов ограничена одним бюджетом."""
+        return EditHistory(self.image_shape, budget=self.history_budget)
+
+    def _on_slice_changed(self, previous_index):
+        self._finish_stroke()  # Штрих относится к прежнему срезу
+        super(SegmentationWindow, self)._on_slice_changed(previous_index)
+        # Разметка хранится для каждого среза отдельно
+        if self.mask.any():
+            self.masks[previous_index] = self.mask
+        self.mask = self.masks.pop(self.slice_index, None)
+        if self.mask is None:
+            self.mask = np.zeros(self.image_shape, dtype=np.uint8)
+        # Статистика — по сырым значениям нового среза; для прежнего запоминаем только количества пикселей
+        self._slice_counts[previous_index] = self.statistics.counts()
+        self.statistics = LabelStatistics.from_engine(self.windowing_engine, self.pixel_spacing)
+        self.statistics.reset(self.mask)
+        # История правок тоже своя у каждого среза
+        self.history.commit()
+        self.histories[previous_index] = self.history
+        self.history = self.histories.pop(self.slice_index, None) or self._new_history()
+        self.compositor.image = self.image
+        self.compositor.invalidate()
+
     def _update_image(self):
         """Обновляет изображение и заново его отрисовывает."""
-        # Получаем маски и контуры
-        positive_mask, positive_contours = self.apply_mask(self.positive_mask, color=COLOR_GREEN)
-        negative_mask, negative_contours = self.apply_mask(self.negative_mask, color=COLOR_RED)
-        _, cursor_contours = self.apply_mask(self.ui_mask, color=COLOR_WHITE)
+        self._flush_stroke()
+        # Разметка пересчитывается только в видимой части; курсор и линии в масштабе 1:1 рисует компоновщик,
+        # иначе они рисуются поверх кадра окна, чтобы не теряться при уменьшении
+        identity = self.viewport.identity
+        frame = self.compositor.render(self.cursor if identity else None, self.brush_size, self.cursor_color,
+                                       visible=self.viewport.image_rect(),
+                                       paths=self._overlay_paths() if identity else ())
+        if self.compositor.changed_rect is not None:
+            self._invalidate_view(self.compositor.changed_rect)
+        self._display(frame)
+
+    def _draw_view(self, view):
+        for points, color in self._overlay_paths():
+            if len(points):
+                cv2.polylines(view, [self.viewport.points_to_view(points).reshape(-1, 1, 2)], False, color, 1)
+        if self.cursor is not None:
+            radius = max(1, round(self.brush_size * self.viewport.scale))
+            cv2.circle(view, self.viewport.to_view(*self.cursor), radius, self.cursor_color, 1)
+
+    @property
+    def cursor_color(self):
+        """Курсор кисти — цвета активного класса."""
+        return self.palette[self.active_class].color
+
+    @property
+    def active_label(self):
+        """Метка активного класса."""
+        return self.palette[self.active_class].label
+
+    def _select_class(self, index):
+        """Делает активным класс с номером index в палитре."""
+        if not 0 <= index < len(self.palette) or index == self.active_class:
+            return
+        self._finish_stroke()  # Штрих относится к прежнему классу
+        self.active_class = index
+        self._on_class_changed()
+        self._request_redraw()
+
+    def _on_class_changed(self):
+        """Вызывается после смены активного класса."""
 
-        # Складываем маски и накладываем на изображение
-        image = cv2.addWeighted(self.image, 0.75, positive_mask + negative_mask, 0.25, 0)
+    def _overlay_paths(self):
+        """Временные линии поверх разметки: [(массив (N, 2) из (x, y), цвет)]."""
+        return ()
 
-        # Рисуем поверх контуры
-        image = cv2.drawContours(image, positive_contours, -1, color=COLOR_GREEN, thickness=1)
-        image = cv2.drawContours(image, negative_contours, -1, color=COLOR_RED, thickness=1)
-        image = cv2.drawContours(image, cursor_contours, -1, color=COLOR_WHITE, thickness=1)
+    def _overlay_labels(self, rect):
+        """Метки, которые нужно отобразить в прямоугольнике rect."""
+        x0, y0, x1, y1 = rect
+        return self.mask[y0:y1, x0:x1]
 
-        cv2.imshow(self.name, image)
+    def _on_mask_changed(self, rect):
+        """Вызывается после изменения маски внутри прямоугольника rect."""
+        self.compositor.invalidate(rect)
 
-    def apply_mask(self, mask, color=(255, 255, 255)):
-        """Накладывает маску на изображение и возвращает его."""
-        # Находим контуры маски
-        contours = find_exterior_contours(mask)
+    def _edit_mask(self, rect, edit):
+        """
+        Изменяет маску внутри прямоугольника rect и записывает изменения в историю.
+        :param edit: функция без аргументов, изменяющая self.mask только внутри rect
+        """
+        rect = clip_rect(rect, self.image_shape)
+        if rect is None:
+            return
+        x0, y0, x1, y1 = rect
+        before = self.mask[y0:y1, x0:x1].copy()
+        edit()
+        changes = diff_region(self.mask, before, rect)
+        self.history.record(*changes)
+        self.statistics.update(*changes)
+        self._on_mask_changed(rect)
 
-        # Накладываем маску и её контуры
-        viz = np.zeros(self.image.shape, dtype=np.uint8)
-        viz = cv2.drawContours(viz, contours, -1, color=color, thickness=-1)
+    def _start_stroke(self, value, x, y):
+        self._finish_stroke()
+        self.stroke = Stroke(value, self.brush_size)
+        self._move_cursor(x, y)
 
-        return viz, contours
+    def _move_cursor(self, x, y):
+        """Запоминает положение курсора и точку штриха; рисование откладывается до кадра."""
+        if self.stroke is not None:
+            self.stroke.add(x, y)
+        self.cursor = (x, y)
+        self._request_redraw()
 
-    def _draw_circle(self, x, y):
-        if self._draw_flag:
-            cv2.circle(self.mask, (x, y), self.brush_size, COLOR_POSITIVE, -1)
-        elif self._erase_flag:
-            cv2.circle(self.mask, (x, y), self.brush_size, COLOR_NEGATIVE, -1)
-        self.ui_mask = np.zeros(self.image_shape, dtype=np.uint8)  # маска для отображения курсора
-        cv2.circle(self.ui_mask, (x, y), self.brush_size, 1, 2)
-        self._update_image()
+    def _finish_stroke(self):
+        """Дорисовывает штрих и записывает его в историю одной правкой."""
+        if self.stroke is None:
+            return
+        self._flush_stroke()
+        self.history.commit(self.stroke)
+        self.stroke = None
+
+    def _flush_stroke(self):
+        """Рисует накопленные с прошлого кадра точки штриха одной пачкой внутри их прямоугольника."""
+        if self.stroke is None or not self.stroke.pending:
+            return
+        rect = self.stroke.pending_rect(self.image_shape)
+        if rect is None:  # Точки за пределами изображения
+            self.stroke.rasterize(self.mask)
+        else:
+            self._edit_mask(rect, lambda: self.stroke.rasterize(self.mask))
+
+    def _undo(self):
+        """Отменяет последнюю правку, перерисовывается только изменённая область."""
+        edit = self.history.undo(self.mask)
+        if edit is not None:
+            self.statistics.update(edit.indices, edit.after, edit.before)
+            self._on_mask_changed(edit.rect)
+            self._request_redraw()
+
+    def _redo(self):
+        """Повторяет отменённую правку."""
+        edit = self.history.redo(self.mask)
+        if edit is not None:
+            self.statistics.update(edit.indices, edit.before, edit.after)
+            self._on_mask_changed(edit.rect)
+            self._request_redraw()
 
     def _mouse_callback(self, event, x, y, flags, *userdata):
         """Обработка событий мыши."""
         super(SegmentationWindow, self)._mouse_callback(event, x, y, flags, *userdata)
         # Рисование
-        if event == cv2.EVENT_LBUTTONDOWN:  # Если нажали ЛКМ
-            self._draw_flag = True  # Теперь мы рисуем
-            self._erase_flag = False  # и не стираем
-            self._draw_circle(x, y)
-        if event == cv2.EVENT_LBUTTONUP:
-            self._draw_flag = False  # Теперь мы не рисуем
-
+        if event == cv2.EVENT_LBUTTONDOWN:  # Если нажали ЛКМ, начинаем штрих разметки активного класса
+            self._start_stroke(self.active_label, x, y)
         # Стирание
-        if event == cv2.EVENT_RBUTTONDOWN:  # Если нажали ПКМ
-            self._draw_flag = False  # Теперь мы стираем
-            self._erase_flag = True  # и не рисуем
-            self._draw_circle(x, y)
-        if event == cv2.EVENT_RBUTTONUP:
-            self._erase_flag = False  # Теперь мы не стираем
+        if event == cv2.EVENT_RBUTTONDOWN:  # Если нажали ПКМ, начинаем штрих запретной зоны
+            self._start_stroke(COLOR_NEGATIVE, x, y)
 
         # Передвижение мыши
         if event == cv2.EVENT_MOUSEMOVE:
-            self._draw_circle(x, y)
+            self._move_cursor(x, y)
+
+        # Штрих — одна правка в истории
+        if event in (cv2.EVENT_LBUTTONUP, cv2.EVENT_RBUTTONUP):
+            self._move_cursor(x, y)
+            self._finish_stroke()
+
+    def _keyboard_callback(self, key):
+        """Обработка событий клавиатуры."""
+        traceback = super(SegmentationWindow, self)._keyboard_callback(key)
+        if traceback is not None:  # Если поступил какой-то сигнал, то сразу отправляем его
+            return traceback
+        if key == ord("s"):  # Сохранить разметку
+            self._save_mask()
+        if key == ord("l"):  # Загрузить разметку
+            self._load_mask()
+        if key == ord("z"):  # Отменить правку
+            self._undo()
+        if key == ord("y"):  # Повторить отменённую правку
+            self._redo()
+        if key == ord("i"):  # Показать/скрыть статистику разметки
+            self.show_statistics = not self.show_statistics
+            self._request_redraw()
+        if ord("1") <= key <= ord("9"):  # Выбрать класс разметки
+            self._select_class(key - ord("1"))
+        if key == ord(","):  # Предыдущий класс
+            self._select_class(self.active_class - 1)
+        if key == ord("."):  # Следующий класс
+            self._select_class(self.active_class + 1)
+
+    @property
+    def pixel_spacing(self):
+        """Размер пикселя в мм (0028,0030): между строками, между столбцами."""
+        return tuple(float(value) for value in self.survey.get('PixelSpacing', (1, 1)))
+
+    def _label_volume(self, label):
+        """Объём метки по всем срезам серии в мм³."""
+        count = self.statistics.count(label)
+        for index, mask in self.masks.items():
+            counts = self._slice_counts.get(index)
+            if counts is None:
+                values = np.bincount(mask.ravel())
+                counts = self._slice_counts[index] = {value: int(n) for value, n in enumerate(values) if value and n}
+            count += counts.get(label, 0)
+        return count * self.statistics.pixel_area * self.series.slice_spacing
+
+    def _status_lines(self):
+        lines = super(SegmentationWindow, self)._status_lines()
+        lines.append(f"class {self.active_class + 1}/{len(self.palette)}: {self.palette.name(self.active_label)}")
+        if not self.show_statistics:
+            return lines
+        for label, summary in self.statistics.summaries().items():
+            text = (f"{self.palette.name(label)}: {summary['count']} px, {summary['area']:.1f} mm2, "
+                    f"HU {summary['mean']:.0f} +/- {summary['std']:.0f} [{summary['min']}..{summary['max']}]")
+            if self.series is not None:
+                text += f", volume {self._label_volume(label) / 1000:.2f} ml"
+            lines.append(text)
+        return lines
+
+    @property
+    def mask_path(self):
+        """Файл разметки рядом с DICOM файлом текущего среза."""
+        return os.path.splitext(self.survey_path)[0] + MASK_EXTENSION
+
+    def _save_mask(self):
+        """Сохраняет разметку в том виде, в котором она отображается."""
+        save_mask(self.mask_path, self._overlay_labels((0, 0, self.image_shape[1], self.image_shape[0])))
+        print(f"Mask saved to {self.mask_path}")
+
+    def _load_mask(self):
+        """Загружает ранее сохранённую разметку."""
+        if not os.path.exists(self.mask_path):
+            print(f"No mask at {self.mask_path}")
+            return
+        mask = load_mask(self.mask_path)
+        if mask.shape != self.image_shape:
+            print(f"Mask at {self.mask_path} has shape {mask.shape}, expected {self.image_shape}")
+            return
+        # Метки, которых нет в палитре (разметка с другим списком классов), получают свои классы
+        added = self.palette.extend(np.flatnonzero(np.bincount(mask.ravel())))
+        if added:
+            print(f"Mask has labels missing from the class palette: {', '.join(str(item.label) for item in added)}")
+            self.compositor.set_palette(self.palette.colors())
+        # Загрузка — обычная правка, её тоже можно отменить
+        self._edit_mask((0, 0, self.image_shape[1], self.image_shape[0]), lambda: np.copyto(self.mask, mask))
+        self.history.commit()
+        self._request_redraw()
+        print(f"Mask loaded from {self.mask_path}")
 
     @property
     def positive_mask(self):
-        return np.array(self.mask == 1, dtype=np.uint8)
+        """Разметка активного класса."""
+        return np.array(self.mask == self.active_label, dtype=np.uint8)
 
     @property
     def negative_mask(self):
-        return np.array(self.mask == 2, dtype=np.uint8)
+        """Запретная зона для активного класса: красная разметка и разметка других классов."""
+        return np.array((self.mask != 0) & (self.mask != self.active_label), dtype=np.uint8)
@@ -1,4 +1,5 @@
 from .BaseWindow import BaseWindow
 from .SegmentationWindow import SegmentationWindow
 from .FloodFillWindow import FloodFillWindow
-from .DistanceMeasureWindow import DistanceMeasureWindow
\ No newline at end of file
+from .DistanceMeasureWindow import DistanceMeasureWindow
+from .LiveWireWindow import LiveWireWindow
\ No newline at end of file
@@ -0,0 +1,142 @@
+"""
+Пакетная разметка заливкой без окон: denoise -> заливка от разметки -> удаление мелких точек.
+
+Манифест — CSV с колонками `dicom`, `seeds` и необязательной `name`. В `seeds` лежит карта меток
+той же разметки, что и в окнах (классы органов, 2 — запретная зона) в формате .rle, .npy или картинкой.
+Каждый класс заливается от своей разметки, разметка других классов для него — барьер.
+Результаты (карта меток с добавленной заливкой, формат .rle) пишутся в папку по мере готовности;
+уже посчитанные исследования при повторном запуске пропускаются. В конце маски можно выгрузить одним архивом,
+а статистику разметки (площадь в мм² и HU по каждой метке, как в окне) — в CSV.
+
+Пример: python batch.py manifest.csv --output results --workers 8 --archive results.zip --statistics stats.csv
+"""
+import argparse
+import csv
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from cv2 import cv2
+import numpy as np
+
+from app.constants import *
+from utils.io.cache import ArrayCache, PixelCache
+from utils.io.masks import MASK_EXTENSION, save_mask, load_mask, export_masks
+from utils.drawing.palette import ClassPalette
+from utils.pipeline import segment_survey, survey_statistics
+
+
+def read_manifest(path):
+    """Строки манифеста: (имя, путь к DICOM, путь к разметке)."""
+    base = os.path.dirname(os.path.abspath(path))
+    with open(path, newline='') as file:
+        for row in csv.DictReader(file):
+            dicom_path = os.path.join(base, row['dicom'])
+            name = row.get('name') or os.path.splitext(os.path.basename(dicom_path))[0]
+            yield name, dicom_path, os.path.join(base, row['seeds'])
+
+
+def read_labels(path):
+    """Карта меток разметки из .rle, .npy или картинки."""
+    if path.endswith(MASK_EXTENSION):
+        return load_mask(path)
+    if path.endswith('.npy'):
+        return np.load(path)
+    labels = cv2.imread(path, cv2.IMREAD_GRAYSCALE)
+    if labels is None:
+        raise FileNotFoundError(path)
+    return labels
+
+
+def output_path(directory, name):
+    return os.path.join(directory, name + MASK_EXTENSION)
+
+
+def init_worker():
+    # Параллелимся процессами, поэтому внутри процесса OpenCV не нужны свои потоки
+    cv2.setNumThreads(1)
+
+
+def process(name, dicom_path, seeds_path, output, tolerance, denoise_power, cache_dir, pixel_cache_dir):
+    start = time.perf_counter()
+    cache = ArrayCache(cache_dir, DENOISE_CACHE_SIZE) if cache_dir else None
+    # Кеш пикселей общий для всех процессов: запись атомарная, вытеснение под блокировкой
+    pixel_cache = PixelCache(pixel_cache_dir, PIXEL_CACHE_SIZE) if pixel_cache_dir else None
+    labels = read_labels(seeds_path)
+    labels = segment_survey(dicom_path, labels, tolerance, denoise_power, cache, pixel_cache)
+    # Запись атомарная: недописанный файл не будет принят за готовый результат при повторном запуске
+    save_mask(output_path(output, name), labels)
+    return name, time.perf_counter() - start
+
+
+def study_statistics(name, dicom_path, mask_path, pixel_cache_dir):
+    pixel_cache = PixelCache(pixel_cache_dir, PIXEL_CACHE_SIZE) if pixel_cache_dir else None
+    return name, survey_statistics(dicom_path, load_mask(mask_path), pixel_cache)
+
+
+def write_statistics(path, items, output, workers, pixel_cache_dir):
+    """Считает статистику всех готовых масок манифеста в пуле процессов и пишет её в CSV."""
+    ready = [(name, dicom_path) for name, dicom_path, _ in items if os.path.exists(output_path(output, name))]
+    columns = ['name', 'label', 'class', 'count', 'area', 'mean', 'std', 'min', 'max']
+    palette = ClassPalette.default()
+    with ProcessPoolExecutor(max_workers=workers, initializer=init_worker) as executor, \
+            open(path, 'w', newline='') as file:
+        writer = csv.DictWriter(file, columns)
+        writer.writeheader()
+        futures = [executor.submit(study_statistics, name, dicom_path, output_path(output, name), pixel_cache_dir)
+                   for name, dicom_path in ready]
+        for future in as_completed(futures):
+            name, summaries = future.result()
+            for label, summary in summaries.items():
+                writer.writerow({'name': name, 'label': label, 'class': palette.name(label), **summary})
+    print(f"Statistics of {len(ready)} masks saved to {path}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('manifest', help="CSV с колонками dicom, seeds[, name]")
+    parser.add_argument('--output', required=True, help="папка для результатов")
+    parser.add_argument('--workers', type=int, default=os.cpu_count(), help="количество процессов")
+    parser.add_argument('--tolerance', type=int, default=10)
+    parser.add_argument('--denoise-power', type=int, default=7)
+    parser.add_argument('--cache-dir', default=DENOISE_CACHE_DIR, help="кеш denoise ('' — без кеша)")
+    parser.add_argument('--pixel-cache-dir', default=PIXEL_CACHE_DIR,
+                        help="кеш декодированных пикселей сжатых DICOM ('' — без кеша)")
+    parser.add_argument('--archive', help="выгрузить все маски манифеста в один zip-архив")
+    parser.add_argument('--statistics', help="записать статистику разметки всех масок манифеста в CSV")
+    args = parser.parse_args()
+
+    os.makedirs(args.output, exist_ok=True)
+    items = list(read_manifest(args.manifest))
+    pending = [item for item in items if not os.path.exists(output_path(args.output, item[0]))]
+    print(f"{len(items)} studies in manifest, {len(items) - len(pending)} already done, {len(pending)} to process")
+
+    start = time.perf_counter()
+    done = failed = 0
+    with ProcessPoolExecutor(max_workers=args.workers, initializer=init_worker) as executor:
+        futures = {executor.submit(process, *item, args.output, args.tolerance, args.denoise_power, args.cache_dir,
+                                   args.pixel_cache_dir): item[0] for item in pending}
+        for future in as_completed(futures):
+            try:
+                name, seconds = future.result()
+                done += 1
+                status = f"{name} ({seconds:.2f} s)"
+            except Exception as error:
+                failed += 1
+                status = f"{futures[future]} FAILED: {error}"
+            elapsed = time.perf_counter() - start
+            print(f"[{done + failed}/{len(pending)}] {status}, {(done + failed) / elapsed:.2f} studies/s")
+    print(f"Finished: {done} done, {failed} failed in {time.perf_counter() - start:.1f} s")
+
+    if args.archive:
+        ready = [(name, output_path(args.output, name)) for name, _, _ in items
+                 if os.path.exists(output_path(args.output, name))]
+        export_masks(args.archive, ready)
+        print(f"{len(ready)} masks exported to {args.archive}")
+
+    if args.statistics:
+        write_statistics(args.statistics, items, args.output, args.workers, args.pixel_cache_dir)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,98 @@
+"""
+Отрисовка разметки с классами: отдельный проход на каждый класс (маска класса -> findContours -> drawContours,
+как до OverlayCompositor) против одной таблицы цветов и одного поиска границ для всех классов.
+Перед замером проверяется, что общий поиск границ даёт те же пиксели, что и поиск по каждому классу,
+и что заливка по классам не заходит на разметку других классов, а для одного класса совпадает с прежней.
+Запуск: python -m benchmarks.classes --size 1024 --classes 2 5 10 20
+"""
+import argparse
+
+from cv2 import cv2
+import numpy as np
+
+from app.constants import *
+from benchmarks.common import measure, summarize, print_row
+from benchmarks.synthetic import synthetic_ct
+from utils.analysis.contours import find_exterior_contours, find_label_boundaries
+from utils.drawing import OverlayCompositor, ClassPalette
+from utils.pipeline import floodfill_labels, floodfill_classes, merge_flood
+from utils.preprocessing.image_transforms import denoise
+
+
+def synthetic_labels(size, count, seed=0):
+    """Карта меток: по несколько кругов каждого класса и полоса запретной зоны."""
+    rng = np.random.default_rng(seed)
+    labels = np.zeros((size, size), dtype=np.uint8)
+    for item in ClassPalette.from_names(map(str, range(count))):
+        for _ in range(3):
+            center = tuple(int(value) for value in rng.integers(size // 10, size - size // 10, 2))
+            cv2.circle(labels, center, int(rng.integers(size // 40, size // 12)), item.label, -1)
+    labels[:, :size // 20] = COLOR_NEGATIVE
+    return labels
+
+
+def render_per_class(image, labels, colors, alpha=0.25):
+    """Прежняя отрисовка: заливка и контуры отдельно для каждой метки."""
+    overlay = image.copy()
+    contours = []
+    for label, color in colors.items():
+        class_mask = np.array(labels == label, dtype=np.uint8)
+        overlay[class_mask != 0] = color
+        contours.append((find_exterior_contours(class_mask), color))
+    frame = cv2.addWeighted(image, 1 - alpha, overlay, alpha, 0)
+    for class_contours, color in contours:
+        cv2.drawContours(frame, class_contours, -1, color, 1)
+    return frame
+
+
+def check_boundaries(labels):
+    expected = np.zeros(labels.shape, dtype=bool)
+    for label in np.unique(labels):
+        if label != 0:
+            expected |= find_label_boundaries(np.where(labels == label, label, 0)) & (labels == label)
+    assert np.array_equal(find_label_boundaries(labels), expected), "single-pass boundaries differ"
+
+
+def check_floodfill(blurred, labels):
+    single = np.where(labels == COLOR_NEGATIVE, labels, np.where(labels != 0, COLOR_POSITIVE, 0)).astype(np.uint8)
+    assert np.array_equal(floodfill_classes(blurred, single, 10),
+                          merge_flood(single, floodfill_labels(blurred, single, 10))), "single class flood differs"
+    # Каждый класс заливается не дальше, чем заливка только его разметки: залитое раньше — барьер
+    merged = floodfill_classes(blurred, labels, 10)
+    assert np.array_equal(merged[labels != 0], labels[labels != 0]), "flood overwrote existing labels"
+    for label in np.unique(labels):
+        if label not in (0, COLOR_NEGATIVE):
+            flooded = (merged == label) & (labels == 0)
+            alone = floodfill_labels(blurred, labels, 10, label=label) != 0
+            assert not (flooded & ~alone).any(), f"class {label} flood leaked"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--size', type=int, default=1024)
+    parser.add_argument('--classes', type=int, nargs='+', default=[2, 5, 10, 20])
+    parser.add_argument('--repeats', type=int, default=20)
+    args = parser.parse_args()
+
+    gray = synthetic_ct(args.size)
+    gray = np.array(np.clip(gray // 8, 0, 255), dtype=np.uint8)
+    image = cv2.cvtColor(gray, cv2.COLOR_GRAY2BGR)
+    check_floodfill(denoise(gray, power=7), synthetic_labels(args.size, 3))
+    for count in args.classes:
+        labels = synthetic_labels(args.size, count)
+        check_boundaries(labels)
+        colors = ClassPalette.from_names(map(str, range(count))).colors()
+        compositor = OverlayCompositor(image, lambda rect: labels[rect[1]:rect[3], rect[0]:rect[2]], colors)
+
+        def render():
+            compositor.invalidate()
+            compositor.render()
+
+        print(f"{args.size}x{args.size}, {count} classes")
+        print_row("  per class", summarize(measure(
+            lambda: render_per_class(image, labels, colors), [()] * args.repeats)))
+        print_row("  single pass", summarize(measure(render, [()] * args.repeats)))
+
+
+if __name__ == '__main__':
+    main()
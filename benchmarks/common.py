@@ -0,0 +1,46 @@
+import time
+
+import numpy as np
+
+
+def measure(function, calls):
+    """Вызывает `function(*args)` для каждого набора аргументов и возвращает задержки в миллисекундах."""
+    latencies = []
+    for args in calls:
+        start = time.perf_counter()
+        function(*args)
+        latencies.append((time.perf_counter() - start) * 1000)
+    return np.array(latencies)
+
+
+def summarize(latencies):
+    """Сводка по задержкам: среднее, p50 и p95 в миллисекундах."""
+    return {
+        'mean': float(np.mean(latencies)),
+        'p50': float(np.percentile(latencies, 50)),
+        'p95': float(np.percentile(latencies, 95)),
+    }
+
+
+def print_row(name, stats):
+    print(f"{name:<32}" + "".join(f"{key}={value:9.3f}  " for key, value in stats.items()))
+
+
+class CallTimer:
+    """Замеряет каждый вызов выбранных методов объекта (обёртки ставятся на экземпляр)."""
+
+    def __init__(self):
+        self.latencies = {}  # имя метода -> задержки в миллисекундах
+
+    def wrap(self, instance, name):
+        method = getattr(instance, name)
+        latencies = self.latencies.setdefault(name, [])
+
+        def timed(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return method(*args, **kwargs)
+            finally:
+                latencies.append((time.perf_counter() - start) * 1000)
+
+        setattr(instance, name, timed)
@@ -0,0 +1,92 @@
+"""
+Замена HighGUI OpenCV для запуска окон без дисплея.
+Окна не создаются, кадры и обработчики событий запоминаются, события подаются из сценария.
+"""
+from collections import deque
+
+from cv2 import cv2
+
+# События сценария
+MOUSE = 'mouse'  # (MOUSE, событие cv2.EVENT_*, x, y, flags)
+KEY = 'key'  # (KEY, код клавиши)
+TRACKBAR = 'trackbar'  # (TRACKBAR, имя слайдера, положение)
+
+_PATCHED = ('imshow', 'namedWindow', 'destroyWindow', 'destroyAllWindows', 'waitKey', 'createTrackbar',
+            'setTrackbarPos', 'getTrackbarPos', 'setMouseCallback')
+
+
+class HeadlessDisplay:
+    """Контекстный менеджер, подменяющий функции HighGUI в модуле cv2 на время работы."""
+
+    def __init__(self):
+        self.frames = {}  # окно -> последний показанный кадр
+        self.frame_count = 0
+        self.mouse_callbacks = {}  # окно -> обработчик мыши
+        self.trackbars = {}  # (окно, слайдер) -> [положение, обработчик]
+        self.keys = deque()  # очередь клавиш для waitKey
+        self._originals = {}
+
+    def __enter__(self):
+        for name in _PATCHED:
+            self._originals[name] = getattr(cv2, name)
+            setattr(cv2, name, getattr(self, name))
+        return self
+
+    def __exit__(self, *exc_info):
+        for name, function in self._originals.items():
+            setattr(cv2, name, function)
+        self._originals = {}
+
+    # Подменённые функции HighGUI
+
+    def imshow(self, window, image):
+        self.frames[window] = image
+        self.frame_count += 1
+
+    def namedWindow(self, window, flags=None):
+        pass
+
+    def destroyWindow(self, window):
+        self.frames.pop(window, None)
+
+    def destroyAllWindows(self):
+        self.frames.clear()
+
+    def waitKey(self, delay=0):
+        return self.keys.popleft() if self.keys else -1
+
+    def createTrackbar(self, trackbar, window, value, count, callback):
+        self.trackbars[(window, trackbar)] = [value, callback]
+
+    def setTrackbarPos(self, trackbar, window, pos):
+        # Как и в HighGUI, изменение положения вызывает обработчик слайдера
+        state = self.trackbars[(window, trackbar)]
+        state[0] = pos
+        state[1](pos)
+
+    def getTrackbarPos(self, trackbar, window):
+        return self.trackbars[(window, trackbar)][0]
+
+    def setMouseCallback(self, window, callback, param=None):
+        self.mouse_callbacks[window] = callback
+
+    # Воспроизведение сценария
+
+    def play(self, window, trace):
+        """
+        Подаёт окну события сценария так, как их подавал бы HighGUI.
+        После каждого события окно отрисовывает кадр, фоновые задачи дожидаются — так каждое событие
+        оплачивает полную стоимость своей обработки.
+        """
+        for event in trace:
+            kind = event[0]
+            if kind == MOUSE:
+                _, mouse_event, x, y, flags = event
+                self.mouse_callbacks[window.name](mouse_event, x, y, flags, None)
+            elif kind == KEY:
+                window._keyboard_callback(event[1])
+            elif kind == TRACKBAR:
+                self.setTrackbarPos(event[1], window.name, event[2])
+            else:
+                raise ValueError(f"Unknown event {event!r}")
+            window._process_frame(wait=True)
@@ -0,0 +1,71 @@
+"""
+Хранение масок: размер на диске и время кодирования/декодирования RLE против np.save и PNG.
+Запуск: python -m benchmarks.masks --sizes 512 2048
+"""
+import argparse
+import io
+
+from cv2 import cv2
+import numpy as np
+
+from benchmarks.common import measure, summarize, print_row
+from utils.io.masks import encode_mask, decode_mask
+
+
+def synthetic_labels(size, seed=0):
+    """Карта меток, похожая на ручную разметку: несколько крупных областей и штрихи запретной зоны."""
+    rng = np.random.default_rng(seed)
+    labels = np.zeros((size, size), dtype=np.uint8)
+    for _ in range(6):
+        center = tuple(int(c) for c in rng.integers(size // 8, size - size // 8, 2))
+        axes = tuple(int(a) for a in rng.integers(size // 32, size // 6, 2))
+        cv2.ellipse(labels, center, axes, float(rng.uniform(0, 180)), 0, 360, 1, -1)
+    points = np.array(rng.integers(0, size, (8, 2)), dtype=np.int32)
+    cv2.polylines(labels, [points], False, 2, thickness=max(size // 100, 1))
+    return labels
+
+
+def npy_encode(labels):
+    buffer = io.BytesIO()
+    np.save(buffer, labels)
+    return buffer.getvalue()
+
+
+def npy_decode(data):
+    return np.load(io.BytesIO(data))
+
+
+def png_encode(labels):
+    return cv2.imencode('.png', labels)[1].tobytes()
+
+
+def png_decode(data):
+    return cv2.imdecode(np.frombuffer(data, dtype=np.uint8), cv2.IMREAD_UNCHANGED)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[512, 2048, 4096])
+    parser.add_argument('--repeat', type=int, default=10)
+    args = parser.parse_args()
+
+    formats = [('rle', encode_mask, decode_mask), ('np.save', npy_encode, npy_decode), ('png', png_encode, png_decode)]
+    for size in args.sizes:
+        labels = synthetic_labels(size)
+        print(f"{size}x{size}")
+        for name, encode, decode in formats:
+            data = encode(labels)
+            assert np.array_equal(decode(data), labels), f"{name} round trip failed"
+            print(f"  {name:<8} size={len(data) / 1024:10.1f} KiB")
+            print_row("    encode", summarize(measure(encode, [(labels,)] * args.repeat)))
+            print_row("    decode", summarize(measure(decode, [(data,)] * args.repeat)))
+
+        # Чтение части маски: декодируются только нужные строки
+        data = encode_mask(labels)
+        rect = (size // 4, size // 4, size // 4 + 256, size // 4 + 256)
+        assert np.array_equal(decode_mask(data, rect), labels[rect[1]:rect[3], rect[0]:rect[2]])
+        print_row("  rle decode 256x256 region", summarize(measure(decode_mask, [(data, rect)] * args.repeat)))
+
+
+if __name__ == '__main__':
+    main()
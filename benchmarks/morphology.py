@@ -0,0 +1,70 @@
+"""
+Удаление мелких дыр в маске заливки: прежний цикл remove_small_dots по каждой компоненте
+против выборки компонент одной таблицей, а также fill_holes и remove_small_objects.
+Совпадение с прежней и эталонными реализациями проверяют тесты (tests/test_morphology.py).
+Запуск: python -m benchmarks.morphology --sizes 512 2048
+"""
+import argparse
+
+from cv2 import cv2
+import numpy as np
+
+from benchmarks.common import measure, summarize, print_row
+from utils.preprocessing.image_transforms import remove_small_dots
+from utils.preprocessing.morphology import fill_holes, remove_small_objects
+
+
+def noisy_flood_mask(size, specks, seed=0):
+    """Маска заливки 0/255 с крупными областями, тысячами мелких дыр и отдельных точек."""
+    rng = np.random.default_rng(seed)
+    mask = np.zeros((size, size), dtype=np.uint8)
+    for _ in range(6):
+        center = tuple(int(c) for c in rng.integers(size // 8, size - size // 8, 2))
+        cv2.circle(mask, center, int(rng.integers(size // 16, size // 5)), 255, -1)
+    ys, xs = rng.integers(0, size, (2, specks))
+    mask[ys, xs] = 255 - mask[ys, xs]
+    return mask
+
+
+def legacy_remove_small_dots(image):
+    """Прежняя реализация remove_small_dots."""
+    binary_map = 255 - image
+    nlabels, labels, stats, centroids = cv2.connectedComponentsWithStats(binary_map, None, None, None, 8, cv2.CV_32S)
+    areas = stats[1:, cv2.CC_STAT_AREA]
+    result = np.zeros(labels.shape, np.uint8)
+    for i in range(nlabels - 1):
+        if areas[i] <= 10:
+            result[labels == i + 1] = 1
+    return cv2.bitwise_or(result, image)
+
+
+def reference_fill_holes(mask):
+    """Эталон: заливка фона от краёв через floodFill, всё не залитое — дыры."""
+    outside = np.array(mask == 0, dtype=np.uint8)
+    padded = np.pad(outside, 1, constant_values=1)
+    flood = np.zeros((padded.shape[0] + 2, padded.shape[1] + 2), dtype=np.uint8)
+    cv2.floodFill(padded, flood, (0, 0), 2, 0, 0, 4)
+    result = mask.copy()
+    result[padded[1:-1, 1:-1] == 1] = 255
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[512, 2048])
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    for size in args.sizes:
+        for specks in (size, size * 8):
+            mask = noisy_flood_mask(size, specks)
+            print(f"{size}x{size}, {specks} specks")
+            calls = [(mask,)] * args.repeat
+            print_row("  legacy remove_small_dots", summarize(measure(legacy_remove_small_dots, calls)))
+            print_row("  remove_small_dots", summarize(measure(remove_small_dots, calls)))
+            print_row("  fill_holes", summarize(measure(fill_holes, calls)))
+            print_row("  remove_small_objects", summarize(measure(remove_small_objects, [(mask, 10)] * args.repeat)))
+
+
+if __name__ == '__main__':
+    main()
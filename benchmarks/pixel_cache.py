@@ -0,0 +1,87 @@
+"""
+Кеш декодированных пикселей: открытие сжатого (RLE Lossless) DICOM с декодированием против
+попадания в PixelCache. Перед замером проверяется, что из кеша приходят те же пиксели в виде
+отображённого в память массива только для чтения, что вытеснение держит кеш в пределах бюджета
+и что несколько процессов могут одновременно наполнять и читать один кеш.
+Запуск: python -m benchmarks.pixel_cache --sizes 512 2048
+"""
+import argparse
+import os
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pydicom
+from pydicom.uid import RLELossless
+
+from benchmarks.common import measure, summarize, print_row
+from benchmarks.synthetic import synthetic_ct, make_dataset
+from utils.io.cache import PixelCache
+
+
+def write_compressed(path, size, seed=0):
+    dataset = make_dataset(synthetic_ct(size, seed))
+    dataset.compress(RLELossless)
+    dataset.save_as(path, write_like_original=False)
+    return path
+
+
+def decode(path):
+    return pydicom.dcmread(path).pixel_array
+
+
+def cached(cache, path):
+    return cache.pixels(pydicom.dcmread(path))
+
+
+def check(cache, path):
+    expected = decode(path)
+    assert np.array_equal(cached(cache, path), expected), "cache miss returns different pixels"
+    array = cached(cache, path)
+    assert isinstance(array, np.memmap) and not array.flags.writeable, "cache hit is not a read-only memmap"
+    assert np.array_equal(array, expected), "cache hit returns different pixels"
+
+
+def check_eviction(directory, paths):
+    cache = PixelCache(directory, max_bytes=1)
+    for path in paths:
+        cached(cache, path)
+    files = [name for name in os.listdir(directory) if name.endswith('.npy')]
+    assert len(files) <= 1, f"eviction left {len(files)} files"
+
+
+def read_all(directory, paths):
+    cache = PixelCache(directory, max_bytes=3 * 2 ** 17)
+    return [int(np.asarray(cached(cache, path), dtype=np.int64).sum()) for path in paths * 3]
+
+
+def check_processes(directory, paths, processes=4):
+    # Бюджет меньше суммы файлов: процессы одновременно пишут, читают и вытесняют
+    expected = [int(decode(path).sum(dtype=np.int64)) for path in paths * 3]
+    with ProcessPoolExecutor(processes) as executor:
+        for sums in executor.map(read_all, [directory] * processes, [paths] * processes):
+            assert sums == expected, "concurrent processes read different pixels"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[512, 1024, 2048])
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(prefix='annotator-pixels-') as directory:
+        paths = [write_compressed(os.path.join(directory, f'ct_{index}.dcm'), 256, index) for index in range(6)]
+        check_eviction(os.path.join(directory, 'eviction'), paths)
+        check_processes(os.path.join(directory, 'shared'), paths)
+
+        for size in args.sizes:
+            path = write_compressed(os.path.join(directory, f'ct_{size}.dcm'), size)
+            cache = PixelCache(os.path.join(directory, f'cache_{size}'))
+            check(cache, path)
+            print(f"{size}x{size}")
+            print_row("  decode", summarize(measure(decode, [(path,)] * args.repeat)))
+            print_row("  cache hit", summarize(measure(cached, [(cache, path)] * args.repeat)))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,89 @@
+"""
+Перенос разметки по серии: синтетический том с «органом»-эллипсоидом, разметка среднего среза
+переносится в обе стороны. Перед замером проверяется, что перенос находит орган на всех срезах
+(Dice с истинной маской), останавливается там, где он исчезает, и не заходит в запретную зону.
+Сравниваются последовательная подготовка срезов (lookahead=1) и конвейер (подготовка заранее).
+Запуск: python -m benchmarks.propagation --size 512 --slices 64
+"""
+import argparse
+import time
+
+from cv2 import cv2
+import numpy as np
+
+from benchmarks.common import print_row
+from utils.analysis.propagation import Propagation
+from utils.preprocessing.image_transforms import denoise
+
+
+def synthetic_volume(size, slices, seed=0):
+    """Срезы uint8 с шумом и эллипсоидом, радиус которого меняется по срезам, и истинные маски органа."""
+    rng = np.random.default_rng(seed)
+    images, masks = [], []
+    for index in range(slices):
+        image = np.full((size, size), 90, dtype=np.uint8)
+        mask = np.zeros((size, size), dtype=np.uint8)
+        z = (index - slices / 2) / (slices * 0.4)  # эллипсоид занимает 80% срезов
+        if abs(z) < 1:
+            radius = int(size * 0.25 * np.sqrt(1 - z * z))
+            center = (size // 2 + int(size * 0.05 * z), size // 2)
+            cv2.circle(mask, center, radius, 1, -1)
+        image[mask != 0] = 160
+        noise = rng.normal(0, 6, image.shape)
+        images.append(np.array(np.clip(image + noise, 0, 255), dtype=np.uint8))
+        masks.append(mask)
+    return images, masks
+
+
+def dice(a, b):
+    a, b = a != 0, b != 0
+    total = a.sum() + b.sum()
+    return 1.0 if total == 0 else 2 * (a & b).sum() / total
+
+
+def propagate(images, start, mask, forbidden=None, lookahead=2):
+    results = {}
+    load = lambda index: denoise(images[index], power=7)
+    propagation = Propagation(load, start, mask, len(images), 15, forbidden,
+                              apply=lambda index, result: results.__setitem__(index, result), lookahead=lookahead)
+    propagation.wait()
+    return results
+
+
+def check(images, masks):
+    start = len(images) // 2
+    results = propagate(images, start, masks[start])
+    expected = [index for index, mask in enumerate(masks) if np.count_nonzero(mask) >= 16 and index != start]
+    for index in expected:
+        if index in results:
+            score = dice(results[index], masks[index])
+            assert score > 0.95, f"slice {index}: dice {score:.3f}"
+    found = sorted(results)
+    assert found and found[0] <= expected[0] + 2 and found[-1] >= expected[-1] - 2, "propagation stopped early"
+    assert all(masks[index].any() for index in found), "propagation went past the organ"
+
+    # Запретная зона — левая половина среза над начальным
+    forbidden = np.zeros(masks[start].shape, dtype=bool)
+    forbidden[:, :forbidden.shape[1] // 2] = True
+    results = propagate(images, start, masks[start], {start + 1: forbidden})
+    assert not (results[start + 1][forbidden] != 0).any(), "propagation ignored the forbidden zone"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--size', type=int, default=512)
+    parser.add_argument('--slices', type=int, default=64)
+    args = parser.parse_args()
+
+    images, masks = synthetic_volume(args.size, args.slices)
+    check(images, masks)
+    start = len(images) // 2
+    for name, lookahead in (('sequential', 1), ('pipelined', 4)):
+        begin = time.perf_counter()
+        results = propagate(images, start, masks[start], lookahead=lookahead)
+        seconds = time.perf_counter() - begin
+        print_row(f"  {name}", {'slices': len(results), 'seconds': seconds, 'slices_per_s': len(results) / seconds})
+
+
+if __name__ == '__main__':
+    main()
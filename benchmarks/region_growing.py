@@ -0,0 +1,133 @@
+"""
+Заливка из всех точек контура: прежний цикл `_single_floodfill` по каждой точке против grow_regions,
+а также построение карты ToleranceMap (заново и после штриха рядом с разметкой) и цена одного тика колёсика.
+Перед замером проверяется, что grow_regions совпадает с заливкой из каждой точки по отдельности,
+а карта после полного и частичного обновления — с grow_regions для любого tolerance.
+Запуск: python -m benchmarks.region_growing --sizes 512 1024
+"""
+import argparse
+
+from cv2 import cv2
+import numpy as np
+
+from benchmarks.common import measure, summarize, print_row
+from utils.analysis.contours import find_exterior_contours
+from utils.analysis.region_growing import find_seed_points, grow_regions, ToleranceMap
+
+FLOOD_FILL_FLAGS = 4 | cv2.FLOODFILL_FIXED_RANGE | cv2.FLOODFILL_MASK_ONLY | 255 << 8
+
+
+def synthetic_scene(size, seed=0):
+    """Гладкое изображение с «органами», штрих позитивной разметки и запретная зона."""
+    rng = np.random.default_rng(seed)
+    image = np.array(rng.normal(120, 20, (size, size)), dtype=np.float32)
+    image = np.array(np.clip(cv2.GaussianBlur(image, (0, 0), size / 64), 0, 255), dtype=np.uint8)
+    for _ in range(8):
+        center = tuple(int(c) for c in rng.integers(size // 8, size - size // 8, 2))
+        cv2.circle(image, center, int(rng.integers(size // 32, size // 8)), int(rng.integers(40, 220)), -1)
+
+    mask = np.zeros((size, size), dtype=np.uint8)
+    points = rng.integers(size // 4, 3 * size // 4, (12, 2))
+    cv2.polylines(mask, [np.array(points, dtype=np.int32)], False, 1, thickness=size // 64)
+    cv2.circle(mask, (size // 2, size // 8), size // 32, 2, -1)
+    return image, mask
+
+
+def legacy_floodfill(image, mask, tolerance):
+    """Прежняя реализация FloodFillWindow._floodfill (без remove_small_dots)."""
+    positive_mask = np.array(mask == 1, dtype=np.uint8)
+    flood_mask = np.zeros(image.shape, dtype=np.uint8)
+    tolerance = (tolerance / 1000,) * 3
+    scaled = np.array(cv2.cvtColor(image, cv2.COLOR_GRAY2BGR) / 1000, dtype=np.float32)
+    scaled[mask == 2] = 1.0
+
+    def single(x, y):
+        _flood_mask = np.zeros((image.shape[0] + 2, image.shape[1] + 2), dtype=np.uint8)
+        cv2.floodFill(scaled, _flood_mask, (int(x), int(y)), 0, tolerance, tolerance, FLOOD_FILL_FLAGS)
+        return _flood_mask[1:-1, 1:-1].copy()
+
+    for contours in find_exterior_contours(positive_mask):
+        for coordinates in contours:
+            x, y = coordinates[0]
+            flood_mask = cv2.bitwise_or(flood_mask, single(x, y))
+        centroid = contours.mean(axis=1).mean(axis=0)
+        xc, yc = int(centroid[0]), int(centroid[1])
+        if positive_mask[yc][xc] == 1:
+            flood_mask = cv2.bitwise_or(flood_mask, single(xc, yc))
+    return flood_mask
+
+
+def per_seed_floodfill(image, seeds, tolerance, forbidden=None, connectivity=4):
+    """Эталон: объединение отдельных cv2.floodFill из каждой стартовой точки вне запретной зоны."""
+    flags = connectivity | cv2.FLOODFILL_FIXED_RANGE | cv2.FLOODFILL_MASK_ONLY | 255 << 8
+    result = np.zeros(image.shape[:2], dtype=np.uint8)
+    for x, y in np.asarray(seeds, dtype=np.int32).reshape(-1, 2):
+        if forbidden is not None and forbidden[y, x]:
+            continue
+        work = np.zeros((image.shape[0] + 2, image.shape[1] + 2), dtype=np.uint8)
+        if forbidden is not None:
+            work[1:-1, 1:-1][forbidden != 0] = 1
+        cv2.floodFill(image, work, (int(x), int(y)), 0, tolerance, tolerance, flags)
+        result[work[1:-1, 1:-1] == 255] = 255
+    return result
+
+
+def check_tolerance_map(tolerance_map, image, seeds, forbidden):
+    for tolerance in (0, 1, 5, 10, 25, 50):
+        expected = grow_regions(image, seeds, tolerance, forbidden)
+        assert np.array_equal(tolerance_map.fill(tolerance), expected), f"tolerance map differs at {tolerance}"
+
+
+def new_floodfill(image, mask, tolerance):
+    seeds = find_seed_points(np.array(mask == 1, dtype=np.uint8))
+    return grow_regions(image, seeds, tolerance, forbidden=mask == 2)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[512, 1024])
+    parser.add_argument('--tolerance', type=int, default=10)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    for size in args.sizes:
+        image, mask = synthetic_scene(size)
+
+        # Прежний путь работает во float32 в масштабе 1/1000 и расходится на пикселях, отличающихся
+        # от стартового значения ровно на tolerance, поэтому сравниваем с точной заливкой из каждой точки
+        seeds = find_seed_points(np.array(mask == 1, dtype=np.uint8))
+        result = new_floodfill(image, mask, args.tolerance)
+        differing = int(np.count_nonzero(per_seed_floodfill(image, seeds, args.tolerance, mask == 2) != result))
+        assert differing == 0, f"grow_regions differs from per-seed floodFill in {differing} pixels"
+        print(f"{size}x{size}: seeds={len(seeds)}, filled={int(np.count_nonzero(result))}")
+
+        calls = [(image, mask, args.tolerance)] * args.repeat
+        print_row("  _single_floodfill loop", summarize(measure(legacy_floodfill, calls)))
+        print_row("  grow_regions", summarize(measure(new_floodfill, calls)))
+
+        # Карта tolerance должна давать ту же заливку, что и grow_regions, для любого tolerance
+        def build():
+            tolerance_map = ToleranceMap(image)
+            tolerance_map.update(seeds, mask == 2)
+            return tolerance_map
+
+        print_row("  ToleranceMap build", summarize(measure(build, [()] * args.repeat)))
+        tolerance_map = build()
+        check_tolerance_map(tolerance_map, image, seeds, mask == 2)
+
+        # Штрих: новая запретная зона и новые стартовые точки, пересчитываются только затронутые значения
+        stroke = mask.copy()
+        cv2.circle(stroke, (size // 2, size // 2), size // 32, 1, -1)
+        stroke[size - size // 16:, :size // 16] = 2
+        stroke_seeds = find_seed_points(np.array(stroke == 1, dtype=np.uint8))
+        changed_rect = (0, size - size // 16, size // 16, size)  # где менялась запретная зона
+        maps = [(build(),) for _ in range(args.repeat)]
+        print_row("  ToleranceMap update after stroke", summarize(measure(
+            lambda built: built.update(stroke_seeds, stroke == 2, changed_rect), maps)))
+        tolerance_map.update(stroke_seeds, stroke == 2, changed_rect)
+        check_tolerance_map(tolerance_map, image, stroke_seeds, stroke == 2)
+        print_row("  ToleranceMap.fill", summarize(measure(tolerance_map.fill, [(t,) for t in range(51)])))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,146 @@
+"""
+Нагрузка на локальный сервис разметки: сервис поднимается в этом же процессе на синтетических исследованиях,
+несколько клиентов в потоках шлют смесь запросов (windowing, denoise, заливка) по нескольким исследованиям.
+Перед замером проверяется, что ответы сервиса совпадают с локальным расчётом, разметка сохраняется и
+читается обратно (и только для открытых в сервисе исследований — иначе 403), а переполненная очередь
+даёт отказ (503), а не бесконечное ожидание.
+Запуск: python -m benchmarks.service_load --size 512 --clients 1 4 16
+"""
+import argparse
+import os
+import tempfile
+import threading
+import time
+
+from cv2 import cv2
+import numpy as np
+
+from benchmarks.common import summarize, print_row
+from benchmarks.synthetic import write_survey, WINDOW_CENTER, WINDOW_WIDTH
+from utils.client import ServiceClient, ServiceError
+from utils.pipeline import read_windowed_survey, floodfill_labels
+from utils.preprocessing.image_transforms import denoise
+from utils.service import AnnotationService, ServiceBusy, make_server
+
+
+def seed_labels(shape):
+    """Разметка: круг объекта в центре и полоса запретной зоны."""
+    labels = np.zeros(shape, dtype=np.uint8)
+    cv2.circle(labels, (shape[1] // 2, shape[0] // 2), shape[0] // 16, 1, -1)
+    labels[:, :shape[1] // 8] = 2
+    return labels
+
+
+def start(service):
+    server = make_server(service, port=0)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, ServiceClient(f'http://127.0.0.1:{server.server_port}')
+
+
+def check(client, path):
+    windowed = read_windowed_survey(path)[1]
+    assert np.array_equal(client.windowed(path), windowed), "remote windowing differs"
+    blurred = denoise(windowed, power=7)
+    assert np.array_equal(client.denoised(path), blurred), "remote denoise differs"
+    labels = seed_labels(windowed.shape)
+    assert np.array_equal(client.floodfill(path, labels, 10), floodfill_labels(blurred, labels, 10)), \
+        "remote floodfill differs"
+    assert client.load_mask(path) is None, "mask exists before save"
+    client.save_mask(path, labels)
+    assert np.array_equal(client.load_mask(path), labels), "saved mask differs"
+    unopened = os.path.join(os.path.dirname(os.path.abspath(path)), 'not_opened.dcm')
+    for request in (lambda: client.save_mask(unopened, labels), lambda: client.load_mask(unopened)):
+        try:
+            request()
+            raise AssertionError("mask request for a study that is not opened accepted")
+        except ServiceError as error:
+            assert error.status == 403, f"mask request for a study that is not opened gave {error.status}"
+    try:
+        client.floodfill(path, labels[1:], 10)
+        raise AssertionError("wrong labels shape accepted")
+    except ServiceError as error:
+        assert error.status == 400, f"wrong labels shape gave {error.status}"
+
+
+def check_backpressure():
+    service = AnnotationService(workers=1, queue_size=0)
+    release = threading.Event()
+    worker = threading.Thread(target=service.run, args=(release.wait,))
+    worker.start()
+    time.sleep(0.1)
+    try:
+        service.run(time.sleep, 0)
+        raise AssertionError("full queue accepted a job")
+    except ServiceBusy:
+        pass
+    finally:
+        release.set()
+        worker.join()
+    service.run(time.sleep, 0)  # Очередь освободилась
+    service.close()
+
+
+def load(client, paths, clients, duration, seed=0):
+    """Клиенты шлют запросы duration секунд; возвращает задержки в мс и число отказов."""
+    latencies, failures = [], []
+    labels = seed_labels(client.open_study(paths[0])['shape'])
+    deadline = time.perf_counter() + duration
+
+    def run(index):
+        rng = np.random.default_rng(seed + index)
+        while time.perf_counter() < deadline:
+            path = paths[int(rng.integers(len(paths)))]
+            center = WINDOW_CENTER + int(rng.integers(-2, 3)) * 10  # несколько windowing'ов на исследование
+            kind = rng.random()
+            begin = time.perf_counter()
+            try:
+                if kind < 0.5:
+                    client.windowed(path, center, WINDOW_WIDTH, False)
+                elif kind < 0.8:
+                    client.denoised(path, center, WINDOW_WIDTH, False)
+                else:
+                    client.floodfill(path, labels, int(rng.integers(5, 20)), center, WINDOW_WIDTH, False)
+                latencies.append((time.perf_counter() - begin) * 1000)
+            except ServiceError:
+                failures.append(1)
+
+    threads = [threading.Thread(target=run, args=(index,)) for index in range(clients)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return np.array(latencies), len(failures)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--size', type=int, default=512)
+    parser.add_argument('--studies', type=int, default=4)
+    parser.add_argument('--clients', type=int, nargs='+', default=[1, 4, 16])
+    parser.add_argument('--workers', type=int, default=os.cpu_count())
+    parser.add_argument('--queue', type=int, default=16)
+    parser.add_argument('--duration', type=float, default=5)
+    args = parser.parse_args()
+
+    check_backpressure()
+    with tempfile.TemporaryDirectory() as directory:
+        paths = [write_survey(os.path.join(directory, f'{index}.dcm'), args.size, seed=index)
+                 for index in range(args.studies)]
+        server, client = start(AnnotationService(args.workers, args.queue))
+        check(client, paths[0])
+        server.shutdown()
+        server.service.close()
+
+        for clients in args.clients:
+            # Каждый прогон — с холодными сессиями, первые запросы открывают исследования
+            server, client = start(AnnotationService(args.workers, args.queue))
+            latencies, failures = load(client, paths, clients, args.duration)
+            stats = server.service.stats()
+            server.shutdown()
+            server.service.close()
+            print_row(f"  {clients} clients", dict(summarize(latencies), requests_per_s=len(latencies) / args.duration,
+                                                   rejected=stats.get('rejected', 0), failed=failures))
+
+
+if __name__ == '__main__':
+    main()
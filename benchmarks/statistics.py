@@ -0,0 +1,88 @@
+"""
+Статистика разметки: пересчёт по всему кадру после каждой правки против обновления LabelStatistics
+только по изменённым пикселям. Перед замером проверяется, что после серии штрихов, стираний,
+отмен и повторов инкрементальная статистика совпадает с посчитанной заново.
+Запуск: python -m benchmarks.statistics --sizes 512 2048
+"""
+import argparse
+
+import numpy as np
+
+from benchmarks.common import measure, summarize, print_row
+from benchmarks.synthetic import synthetic_ct, INTERCEPT
+from utils.analysis.statistics import LabelStatistics
+from utils.drawing.strokes import Stroke
+from utils.history import EditHistory, diff_region
+
+SPACING = (0.7, 0.7)
+
+
+def random_strokes(size, count, seed=0):
+    """Штрихи разметки и запретной зоны по 20 точек."""
+    rng = np.random.default_rng(seed)
+    strokes = []
+    for _ in range(count):
+        stroke = Stroke(int(rng.integers(1, 3)), int(rng.integers(2, 12)))
+        for x, y in np.cumsum(rng.integers(-size // 40, size // 40 + 1, (20, 2)), axis=0) + rng.integers(0, size, 2):
+            stroke.add(int(x), int(y))
+        strokes.append(stroke)
+    return strokes
+
+
+def apply_stroke(mask, history, stroke):
+    rect = stroke.pending_rect(mask.shape)
+    if rect is None:
+        return np.zeros(0, dtype=np.int64), mask[:0, 0], mask[:0, 0]
+    x0, y0, x1, y1 = rect
+    before = mask[y0:y1, x0:x1].copy()
+    stroke.rasterize(mask)
+    changes = diff_region(mask, before, rect)
+    history.record(*changes)
+    history.commit(stroke)
+    return changes
+
+
+def check(hu, strokes):
+    mask = np.zeros(hu.shape, dtype=np.uint8)
+    history = EditHistory(hu.shape)
+    statistics = LabelStatistics.from_mask(mask, hu, SPACING)
+    for index, stroke in enumerate(strokes):
+        statistics.update(*apply_stroke(mask, history, stroke))
+        if index % 3 == 2:  # Отмена и повтор
+            edit = history.undo(mask)
+            if edit is not None:
+                statistics.update(edit.indices, edit.after, edit.before)
+            edit = history.redo(mask) if index % 2 else None
+            if edit is not None:
+                statistics.update(edit.indices, edit.before, edit.after)
+        expected = LabelStatistics.from_mask(mask, hu, SPACING).summaries()
+        actual = statistics.summaries()
+        assert actual.keys() == expected.keys(), f"labels differ after edit {index}"
+        for label in expected:
+            for key, value in expected[label].items():
+                assert np.isclose(actual[label][key], value), f"{key} of label {label} differs after edit {index}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[512, 1024, 2048])
+    parser.add_argument('--strokes', type=int, default=30)
+    args = parser.parse_args()
+
+    for size in args.sizes:
+        hu = np.asarray(synthetic_ct(size), dtype=np.int32) + INTERCEPT
+        check(hu, random_strokes(size, args.strokes))
+
+        mask = np.zeros(hu.shape, dtype=np.uint8)
+        history = EditHistory(hu.shape)
+        statistics = LabelStatistics.from_mask(mask, hu, SPACING)
+        changes = [apply_stroke(mask, history, stroke) for stroke in random_strokes(size, args.strokes, seed=1)]
+        print(f"{size}x{size}")
+        print_row("  full recompute", summarize(measure(
+            lambda: LabelStatistics.from_mask(mask, hu, SPACING).summaries(), [()] * args.strokes)))
+        print_row("  incremental", summarize(measure(
+            lambda change: (statistics.update(*change), statistics.summaries()), [(change,) for change in changes])))
+
+
+if __name__ == '__main__':
+    main()
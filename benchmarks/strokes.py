@@ -0,0 +1,63 @@
+"""
+Рисование штриха кистью: прежний штамп cv2.circle на каждую точку (с перерисовкой маски целиком)
+против Stroke, который рисует пачку точек толстой ломаной только внутри их прямоугольника.
+Перед замером проверяется, что быстрый штрих не рвётся, а время не зависит от размера изображения.
+Запуск: python -m benchmarks.strokes --sizes 512 4096 --points 100 500
+"""
+import argparse
+
+from cv2 import cv2
+import numpy as np
+
+from benchmarks.common import measure, summarize, print_row
+from utils.drawing.strokes import Stroke
+
+RADIUS = 5
+
+
+def fast_stroke(size, count, seed=0):
+    """Точки быстрого штриха: шаг между соседними точками больше диаметра кисти."""
+    rng = np.random.default_rng(seed)
+    t = np.linspace(0, 1, count)
+    xs = size * 0.2 + size * 0.6 * t
+    ys = size / 2 + size * 0.1 * np.sin(t * 6 * np.pi) + rng.normal(0, 1, count)
+    return [(int(x), int(y)) for x, y in zip(xs, ys)]
+
+
+def legacy_stamp(mask, points):
+    """Прежний путь: круг на каждую точку и копия всей маски, как при полной перерисовке кадра."""
+    for point in points:
+        cv2.circle(mask, point, RADIUS, 1, -1)
+        mask.copy()
+
+
+def stroke_batch(mask, points):
+    stroke = Stroke(1, RADIUS)
+    for point in points:
+        stroke.add(*point)
+    stroke.rasterize(mask)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[512, 2048, 4096])
+    parser.add_argument('--points', type=int, nargs='+', default=[100, 500])
+    parser.add_argument('--repeat', type=int, default=10)
+    args = parser.parse_args()
+
+    for size in args.sizes:
+        for count in args.points:
+            points = fast_stroke(size, count)
+            mask = np.zeros((size, size), dtype=np.uint8)
+            stroke_batch(mask, points)
+            components, _ = cv2.connectedComponents(mask)
+            assert components == 2, f"stroke has gaps: {components - 1} pieces"
+
+            print(f"{size}x{size}, {count} points per frame")
+            calls = [(np.zeros((size, size), dtype=np.uint8), points)] * args.repeat
+            print_row("  circle per point", summarize(measure(legacy_stamp, calls)))
+            print_row("  Stroke batch", summarize(measure(stroke_batch, calls)))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,206 @@
+"""
+Сквозной бенчмарк окон без дисплея: синтетические КТ-срезы разных размеров, HighGUI подменён,
+события мыши, клавиатуры и слайдеров подаются по сценарию. Для каждого замеряемого метода
+считаются p50/p95 задержки (заливка идёт в фоне, поэтому замеряется её фоновая часть _compute_flood),
+для каждого сценария — пик памяти (tracemalloc и max RSS процесса).
+Результат пишется в JSON, чтобы сравнивать коммиты между собой.
+
+Координаты событий мыши — в пикселях окна: большие срезы показываются уменьшенными до размера окна.
+
+Запуск: python -m benchmarks.suite --sizes 512 2048 4096 --output results.json [--baseline old.json]
+"""
+import argparse
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+# Кеш и индекс — во временной папке, чтобы не трогать пользовательские и не мерить тёплый кеш
+_CACHE = tempfile.TemporaryDirectory(prefix='annotator-bench-')
+os.environ['MEDICAL_ANNOTATOR_CACHE'] = _CACHE.name
+
+from cv2 import cv2
+import numpy as np
+
+from app.windows import BaseWindow, SegmentationWindow, FloodFillWindow, LiveWireWindow
+from benchmarks.common import CallTimer, measure, summarize, print_row
+from benchmarks.headless import HeadlessDisplay, MOUSE, KEY, TRACKBAR
+from benchmarks.synthetic import write_survey, WINDOW_CENTER, WINDOW_WIDTH
+
+
+def stroke(size, button_down, button_up, y_ratio=0.45, steps=40):
+    """Штрих через «печень» синтетического среза."""
+    y = int(size * y_ratio)
+    xs = np.linspace(size * 0.30, size * 0.46, steps).astype(int).tolist()
+    return ([(MOUSE, button_down, xs[0], y, 0)] + [(MOUSE, cv2.EVENT_MOUSEMOVE, x, y, 0) for x in xs[1:]] +
+            [(MOUSE, button_up, xs[-1], y, 0)])
+
+
+def windowing_trace(ticks=40):
+    """Перетаскивание слайдеров WC и WW туда и обратно."""
+    centers = np.linspace(WINDOW_CENTER, WINDOW_CENTER + 400, ticks // 2).astype(int).tolist()
+    widths = np.linspace(WINDOW_WIDTH, WINDOW_WIDTH * 4, ticks // 2).astype(int).tolist()
+    return ([(TRACKBAR, 'WC', value) for value in centers + centers[::-1]] +
+            [(TRACKBAR, 'WW', value) for value in widths + widths[::-1]])
+
+
+def brush_trace(size):
+    """Штрих разметки и штрих стирания."""
+    return (stroke(size, cv2.EVENT_LBUTTONDOWN, cv2.EVENT_LBUTTONUP) +
+            stroke(size, cv2.EVENT_RBUTTONDOWN, cv2.EVENT_RBUTTONUP, y_ratio=0.50, steps=20))
+
+
+def floodfill_trace(size, ticks=20):
+    """Штрих, включение заливки, колёсико вверх и вниз, запретный штрих и снова колёсико."""
+    x, y = int(size * 0.38), int(size * 0.45)
+    wheel = [(MOUSE, cv2.EVENT_MOUSEWHEEL, x, y, 120)] * ticks + [(MOUSE, cv2.EVENT_MOUSEWHEEL, x, y, -120)] * ticks
+    return (stroke(size, cv2.EVENT_LBUTTONDOWN, cv2.EVENT_LBUTTONUP) + [(KEY, ord('f'))] + wheel +
+            stroke(size, cv2.EVENT_RBUTTONDOWN, cv2.EVENT_RBUTTONUP, y_ratio=0.55, steps=10) + wheel[:ticks // 2])
+
+
+def livewire_trace(size, anchors=8, steps=6):
+    """Обводка «печени» опорными точками с движением курсора между ними и замыкание контура."""
+    cx, cy, radius = size * 0.38, size * 0.45, size * 0.14
+    angles = np.linspace(0, 2 * np.pi, anchors * steps, endpoint=False)
+    points = [(int(cx + radius * np.cos(angle)), int(cy + radius * np.sin(angle))) for angle in angles]
+    trace = []
+    for index, (x, y) in enumerate(points):
+        trace.append((MOUSE, cv2.EVENT_LBUTTONDOWN if index % steps == 0 else cv2.EVENT_MOUSEMOVE, x, y, 0))
+    return trace + [(KEY, 13)]
+
+
+def viewport_trace(view, steps=10):
+    """Приближение к центру, перетаскивание средней кнопкой туда и обратно, отдаление и сброс масштаба."""
+    center = view // 2
+    xs = np.linspace(center, center - view // 4, steps).astype(int).tolist()
+    drag = ([(MOUSE, cv2.EVENT_MBUTTONDOWN, center, center, 0)] +
+            [(MOUSE, cv2.EVENT_MOUSEMOVE, x, center, 0) for x in xs + xs[::-1]] +
+            [(MOUSE, cv2.EVENT_MBUTTONUP, center, center, 0)])
+    return ([(MOUSE, cv2.EVENT_MOUSEMOVE, center, center, 0)] + [(KEY, ord('='))] * 4 + drag +
+            [(KEY, ord('-'))] * 2 + drag + [(KEY, ord('0'))])
+
+
+def view_size(size):
+    """Размер окна для квадратного среза size x size."""
+    return min(size, BaseWindow.max_view_size)
+
+
+def run_window_scenario(display, window_class, path, trace, methods, prepare=None):
+    """Открывает окно, ставит таймеры на методы и проигрывает сценарий. Возвращает задержки и пик памяти."""
+    tracemalloc.start()
+    start = time.perf_counter()
+    window = window_class(path)
+    latencies = {'open': [(time.perf_counter() - start) * 1000]}
+    if prepare is not None:
+        prepare(window)
+    timer = CallTimer()
+    for name in methods:
+        timer.wrap(window, name)
+    window._update_image()
+    display.play(window, trace)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    latencies.update(timer.latencies)
+    return latencies, peak
+
+
+def max_rss_mb():
+    # ru_maxrss в Linux — в килобайтах, в macOS — в байтах
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss / (2 ** 20 if sys.platform == 'darwin' else 2 ** 10)
+
+
+def records(scenario, size, latencies, peak):
+    for metric, values in latencies.items():
+        if len(values) == 0:  # values — список или массив задержек из measure()
+            continue
+        stats = summarize(np.array(values))
+        yield dict(scenario=scenario, size=size, metric=metric, calls=len(values), **stats,
+                   peak_traced_mb=peak / 2 ** 20, max_rss_mb=max_rss_mb())
+
+
+def run(sizes, repeat):
+    results = []
+    with tempfile.TemporaryDirectory(prefix='annotator-dicom-') as directory, HeadlessDisplay() as display:
+        for size in sizes:
+            path = write_survey(os.path.join(directory, f'ct_{size}.dcm'), size)
+            print(f"{size}x{size}")
+
+            tracemalloc.start()
+            latencies = measure(BaseWindow.read_survey, [(path,)] * repeat)
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+            scenarios = [('read_survey', {'read_survey': latencies}, peak)]
+
+            scenarios.append(('windowing', *run_window_scenario(
+                display, SegmentationWindow, path, windowing_trace(), ['_update_windowing', '_update_image'])))
+            view = view_size(size)
+            scenarios.append(('brush', *run_window_scenario(
+                display, SegmentationWindow, path, brush_trace(view), ['_flush_stroke', '_update_image'])))
+            scenarios.append(('livewire', *run_window_scenario(
+                display, LiveWireWindow, path, livewire_trace(view), ['_add_anchor', '_close_contour', '_update_image'],
+                prepare=lambda window: window.graph_job.wait())))
+            scenarios.append(('viewport', *run_window_scenario(
+                display, SegmentationWindow, path, viewport_trace(view), ['_update_image'])))
+            # Подавление шума идёт в фоне при открытии окна, дожидаемся его до начала сценария
+            scenarios.append(('floodfill', *run_window_scenario(
+                display, FloodFillWindow, path, floodfill_trace(view), ['_compute_flood', '_update_image'],
+                prepare=lambda window: window.blurred_image)))
+
+            for scenario, latencies, peak in scenarios:
+                for record in records(scenario, size, latencies, peak):
+                    results.append(record)
+                    print_row(f"  {scenario}.{record['metric']}",
+                              {key: record[key] for key in ('p50', 'p95', 'peak_traced_mb')})
+    return results
+
+
+def environment():
+    try:
+        commit = subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True,
+                                cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        commit = None
+    return {'commit': commit, 'python': platform.python_version(), 'numpy': np.__version__,
+            'opencv': cv2.__version__, 'machine': platform.machine(), 'cpus': os.cpu_count()}
+
+
+def compare(results, baseline_path):
+    """Печатает отношение p50/p95 к базовому прогону (больше 1 — стало медленнее)."""
+    with open(baseline_path) as file:
+        baseline = {(r['scenario'], r['size'], r['metric']): r for r in json.load(file)['results']}
+    print(f"Compared with {baseline_path}")
+    for record in results:
+        old = baseline.get((record['scenario'], record['size'], record['metric']))
+        if old is not None:
+            print_row(f"  {record['size']} {record['scenario']}.{record['metric']}",
+                      {key: record[key] / old[key] if old[key] else float('nan') for key in ('p50', 'p95')})
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[512, 1024, 2048, 4096])
+    parser.add_argument('--repeat', type=int, default=5, help="сколько раз читать DICOM для read_survey")
+    parser.add_argument('--output', help="куда записать JSON (по умолчанию — в stdout)")
+    parser.add_argument('--baseline', help="JSON прошлого прогона для сравнения")
+    args = parser.parse_args()
+
+    results = run(args.sizes, args.repeat)
+    report = {'environment': environment(), 'results': results}
+    if args.output:
+        with open(args.output, 'w') as file:
+            json.dump(report, file, indent=2)
+        print(f"Results saved to {args.output}")
+    else:
+        print(json.dumps(report, indent=2))
+    if args.baseline:
+        compare(results, args.baseline)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,85 @@
+"""
+Синтетические КТ-подобные DICOM файлы для бенчмарков: тело, органы, кости и шум.
+Значения хранятся как в КТ: 12 бит без знака, Rescale Intercept -1024, окно мягких тканей.
+"""
+import os
+
+from cv2 import cv2
+import numpy as np
+from pydicom.dataset import FileDataset, FileMetaDataset
+from pydicom.uid import CTImageStorage, ExplicitVRLittleEndian, generate_uid
+
+INTERCEPT = -1024
+WINDOW_CENTER = 40
+WINDOW_WIDTH = 400
+
+
+def synthetic_ct(size, seed=0):
+    """Пиксели среза size x size (сырые значения, HU = value + INTERCEPT)."""
+    rng = np.random.default_rng(seed)
+    hu = np.full((size, size), -1000, dtype=np.float32)  # воздух
+    center = (size // 2, size // 2)
+    cv2.ellipse(hu, center, (int(size * 0.42), int(size * 0.32)), 0, 0, 360, 40, -1)  # мягкие ткани
+    cv2.ellipse(hu, center, (int(size * 0.40), int(size * 0.30)), 0, 0, 360, -80, max(size // 128, 1))  # жир
+    cv2.circle(hu, (int(size * 0.38), int(size * 0.45)), int(size * 0.14), 60, -1)  # печень
+    cv2.circle(hu, (int(size * 0.65), int(size * 0.42)), int(size * 0.06), 30, -1)  # почка
+    cv2.circle(hu, (size // 2, int(size * 0.68)), int(size * 0.05), 700, -1)  # позвонок
+    for _ in range(12):  # сосуды
+        position = tuple(int(c) for c in rng.integers(int(size * 0.3), int(size * 0.7), 2))
+        cv2.circle(hu, position, int(rng.integers(max(size // 256, 1), max(size // 64, 2))), 180, -1)
+    hu = cv2.GaussianBlur(hu, (0, 0), max(size / 512, 0.5))
+    hu += np.array(rng.normal(0, 15, hu.shape), dtype=np.float32)
+    return np.array(np.clip(hu - INTERCEPT, 0, 4095), dtype=np.uint16)
+
+
+def make_dataset(pixels, study_uid=None, series_uid=None, instance_number=1, spacing=(0.7, 0.7), position=0.0):
+    """Датасет pydicom с пикселями и тегами, которые читает разметчик."""
+    meta = FileMetaDataset()
+    meta.MediaStorageSOPClassUID = CTImageStorage
+    meta.MediaStorageSOPInstanceUID = generate_uid()
+    meta.TransferSyntaxUID = ExplicitVRLittleEndian
+
+    dataset = FileDataset(None, {}, file_meta=meta, preamble=b'\0' * 128)
+    dataset.is_little_endian = True
+    dataset.is_implicit_VR = False
+    dataset.SOPClassUID = CTImageStorage
+    dataset.SOPInstanceUID = meta.MediaStorageSOPInstanceUID
+    dataset.StudyInstanceUID = study_uid or generate_uid()
+    dataset.SeriesInstanceUID = series_uid or generate_uid()
+    dataset.Modality = 'CT'
+    dataset.PatientID = 'SYNTHETIC'
+    dataset.InstanceNumber = instance_number
+    dataset.ImageOrientationPatient = [1, 0, 0, 0, 1, 0]
+    dataset.ImagePositionPatient = [0, 0, position]
+    dataset.PixelSpacing = list(spacing)
+
+    dataset.Rows, dataset.Columns = pixels.shape
+    dataset.SamplesPerPixel = 1
+    dataset.PhotometricInterpretation = 'MONOCHROME2'
+    dataset.BitsAllocated = 16
+    dataset.BitsStored = 12
+    dataset.HighBit = 11
+    dataset.PixelRepresentation = 0
+    dataset.WindowCenter = WINDOW_CENTER
+    dataset.WindowWidth = WINDOW_WIDTH
+    dataset.RescaleIntercept = INTERCEPT
+    dataset.RescaleSlope = 1
+    dataset.PixelData = np.ascontiguousarray(pixels, dtype=np.uint16).tobytes()
+    return dataset
+
+
+def write_survey(path, size, seed=0):
+    """Пишет один синтетический срез и возвращает путь к нему."""
+    make_dataset(synthetic_ct(size, seed)).save_as(path, write_like_original=False)
+    return path
+
+
+def write_series(directory, size, slices, seed=0):
+    """Пишет серию из slices срезов в папку и возвращает её путь."""
+    os.makedirs(directory, exist_ok=True)
+    study_uid, series_uid = generate_uid(), generate_uid()
+    for index in range(slices):
+        dataset = make_dataset(synthetic_ct(size, seed + index), study_uid, series_uid, index + 1,
+                               position=float(index))
+        dataset.save_as(os.path.join(directory, f'{index:04d}.dcm'), write_like_original=False)
+    return directory
@@ -0,0 +1,53 @@
+"""
+Задержка одного тика слайдера WC/WW: прежний путь (apply_windowing + cvtColor) против WindowingEngine.
+Запуск: python -m benchmarks.windowing --sizes 512 3000
+"""
+import argparse
+
+from cv2 import cv2
+import numpy as np
+
+from benchmarks.common import measure, summarize, print_row
+from utils.preprocessing.dicom_transforms import apply_windowing
+from utils.preprocessing.windowing import WindowingEngine
+
+
+def synthetic_pixels(size, seed=0):
+    """Сырые значения, похожие на КТ: 12 бит, Rescale Intercept -1024."""
+    rng = np.random.default_rng(seed)
+    pixels = rng.normal(1024, 300, (size, size))
+    return np.array(np.clip(pixels, 0, 4095), dtype=np.uint16)
+
+
+def legacy_tick(pixels, windowing):
+    image = apply_windowing(pixels, *windowing)
+    return cv2.cvtColor(image, cv2.COLOR_GRAY2BGR)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[512, 1024, 3000])
+    parser.add_argument('--ticks', type=int, default=50)
+    args = parser.parse_args()
+
+    for size in args.sizes:
+        pixels = synthetic_pixels(size)
+        engine = WindowingEngine(pixels, intercept=-1024, slope=1)
+
+        # Проверяем, что движок даёт тот же результат, что и прежний путь
+        for inverted in (False, True):
+            expected = legacy_tick(pixels, [40, 400, -1024, 1, inverted])
+            assert np.array_equal(engine.apply(40, 400, inverted), expected), "results differ"
+
+        # Каждый тик — новое значение WC, как при движении слайдера
+        ticks = [(40 + i, 400) for i in range(args.ticks)]
+        legacy = measure(lambda wc, ww: legacy_tick(pixels, [wc, ww, -1024, 1, False]), ticks)
+        lut = measure(engine.apply, ticks)
+
+        print(f"{size}x{size}")
+        print_row("  apply_windowing + cvtColor", summarize(legacy))
+        print_row("  WindowingEngine.apply", summarize(lut))
+
+
+if __name__ == '__main__':
+    main()
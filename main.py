@@ -1,10 +1,22 @@
+import sys
+
 from app.windows import *
 from cv2 import cv2
 
+# Режимы разметки: второй аргумент командной строки
+WINDOWS = {
+    'floodfill': FloodFillWindow,
+    'segmentation': SegmentationWindow,
+    'livewire': LiveWireWindow,
+    'distance': DistanceMeasureWindow,
+}
+
 if __name__ == "__main__":
-    dicom_path = 'test_data/liver_001.dcm'
+    # Путь к DICOM файлу или к папке с серией срезов
+    dicom_path = sys.argv[1] if len(sys.argv) > 1 else 'test_data/liver_001.dcm'
+    mode = sys.argv[2] if len(sys.argv) > 2 else 'floodfill'
 
-    window = FloodFillWindow(dicom_path)
+    window = WINDOWS[mode](dicom_path)
 
     window.show()
     cv2.destroyAllWindows()
@@ -0,0 +1,45 @@
+"""
+Локальный сервис разметки: одно открытое исследование (пиксели, windowing, denoise) на всех разметчиков машины.
+Окна разметки отдают сервису denoise, если задана переменная окружения MEDICAL_ANNOTATOR_SERVICE
+с адресом сервиса. Протокол описан в `utils/service.py`.
+
+Пример: python service.py --port 8765 --workers 4 --queue 16
+        MEDICAL_ANNOTATOR_SERVICE=http://127.0.0.1:8765 python main.py test_data/liver_001.dcm
+"""
+import argparse
+import os
+
+from app.constants import *
+from utils.io.cache import ArrayCache, PixelCache
+from utils.service import AnnotationService, make_server
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--host', default='127.0.0.1', help="адрес (по умолчанию — только локальные подключения)")
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--workers', type=int, default=os.cpu_count(), help="потоков для тяжёлых операций")
+    parser.add_argument('--queue', type=int, default=16, help="сколько операций может ждать, сверх — ответ 503")
+    parser.add_argument('--sessions', type=int, default=8, help="сколько исследований держать открытыми")
+    parser.add_argument('--cache-dir', default=DENOISE_CACHE_DIR, help="кеш denoise ('' — без кеша)")
+    parser.add_argument('--pixel-cache-dir', default=PIXEL_CACHE_DIR,
+                        help="кеш декодированных пикселей сжатых DICOM ('' — без кеша)")
+    parser.add_argument('--verbose', action='store_true', help="печатать каждый запрос")
+    args = parser.parse_args()
+
+    service = AnnotationService(args.workers, args.queue, args.sessions,
+                                PixelCache(args.pixel_cache_dir, PIXEL_CACHE_SIZE) if args.pixel_cache_dir else None,
+                                ArrayCache(args.cache_dir, DENOISE_CACHE_SIZE) if args.cache_dir else None)
+    server = make_server(service, args.host, args.port, args.verbose)
+    print(f"Serving on http://{args.host}:{server.server_port} ({service.workers} workers, queue {args.queue})")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        service.close()
+
+
+if __name__ == '__main__':
+    main()
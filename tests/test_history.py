@@ -0,0 +1,107 @@
+import numpy as np
+import pytest
+
+from utils.history import EditHistory, HistoryBudget, diff_region
+
+
+def paint(mask, history, rect, value):
+    """Закрашивает прямоугольник и записывает правку в историю."""
+    x0, y0, x1, y1 = rect
+    before = mask[y0:y1, x0:x1].copy()
+    mask[y0:y1, x0:x1] = value
+    history.record(*diff_region(mask, before, rect))
+    return history.commit()
+
+
+def test_undo_redo_round_trip():
+    rng = np.random.default_rng(0)
+    mask = np.zeros((40, 50), dtype=np.uint8)
+    history = EditHistory(mask.shape)
+    states = [mask.copy()]
+    for _ in range(20):
+        x0, y0 = rng.integers(0, 40, 2)
+        paint(mask, history, (x0, y0, x0 + rng.integers(1, 10), y0 + rng.integers(1, 10)), rng.integers(0, 4))
+        states.append(mask.copy())
+    states = [state for index, state in enumerate(states) if index == 0 or not np.array_equal(state, states[index - 1])]
+
+    for state in reversed(states[:-1]):
+        edit = history.undo(mask)
+        assert edit is not None and np.array_equal(mask, state)
+    assert history.undo(mask) is None
+    for state in states[1:]:
+        assert history.redo(mask) is not None and np.array_equal(mask, state)
+    assert history.redo(mask) is None
+
+
+def test_new_edit_drops_redo():
+    mask = np.zeros((10, 10), dtype=np.uint8)
+    history = EditHistory(mask.shape)
+    paint(mask, history, (0, 0, 5, 5), 1)
+    history.undo(mask)
+    paint(mask, history, (5, 5, 10, 10), 2)
+    assert history.redo(mask) is None
+    assert history.nbytes == sum(edit.nbytes for edit in history._undo)
+
+
+def test_pending_strokes_merge_into_one_edit():
+    mask = np.zeros((10, 10), dtype=np.uint8)
+    history = EditHistory(mask.shape)
+    for value in (1, 2, 0):  # Пиксели меняются несколько раз, а в итоге — только часть
+        before = mask[0:5, 0:5].copy()
+        mask[0:5, 0:5] = value
+        mask[0, 0] = 3
+        history.record(*diff_region(mask, before, (0, 0, 5, 5)))
+    edit = history.commit()
+    assert len(edit.indices) == 1 and edit.before[0] == 0 and edit.after[0] == 3
+    history.undo(mask)
+    assert not mask.any()
+
+
+def test_own_budget_evicts_oldest():
+    mask = np.zeros((100, 100), dtype=np.uint8)
+    edit = paint(mask, EditHistory(mask.shape), (0, 0, 10, 10), 1)
+    history = EditHistory(mask.shape, memory_budget=3 * edit.nbytes)
+    for row in range(5):
+        paint(mask, history, (0, 20 + row * 10, 10, 30 + row * 10), 1)
+    assert len(history._undo) == 3 and history.nbytes <= 3 * edit.nbytes
+    for _ in range(3):
+        assert history.undo(mask) is not None
+    assert history.undo(mask) is None
+    assert mask[20:40, :10].all() and not mask[40:].any()  # Две самые старые правки забыты
+
+
+@pytest.mark.parametrize('slices', [2, 5])
+def test_shared_budget_evicts_oldest_across_histories(slices):
+    masks = [np.zeros((100, 100), dtype=np.uint8) for _ in range(slices)]
+    size = paint(masks[0].copy(), EditHistory(masks[0].shape), (0, 0, 10, 10), 1).nbytes
+    budget = HistoryBudget(4 * size)
+    histories = [EditHistory(mask.shape, budget=budget) for mask in masks]
+    order = []
+    for step in range(3):
+        for index, (mask, history) in enumerate(zip(masks, histories)):
+            paint(mask, history, (step * 10, 0, step * 10 + 10, 10), 1)
+            order.append((index, step))
+            assert budget.nbytes <= 4 * size
+    # Остались четыре последние правки из всех историй, независимо от того, в какой истории они сделаны
+    kept = sorted((index, len(history._undo)) for index, history in enumerate(histories))
+    expected = {}
+    for index, _ in order[-4:]:
+        expected[index] = expected.get(index, 0) + 1
+    assert kept == sorted((index, expected.get(index, 0)) for index in range(slices))
+
+
+def test_shared_budget_drops_undone_edits_of_other_histories():
+    mask = np.zeros((100, 100), dtype=np.uint8)
+    size = paint(mask.copy(), EditHistory(mask.shape), (0, 0, 10, 10), 1).nbytes
+    budget = HistoryBudget(2 * size)
+    first, second = EditHistory(mask.shape, budget=budget), EditHistory(mask.shape, budget=budget)
+    other = mask.copy()
+    paint(mask, first, (0, 0, 10, 10), 1)
+    paint(mask, first, (10, 0, 20, 10), 1)
+    first.undo(mask)
+    first.undo(mask)
+    paint(other, second, (0, 0, 10, 10), 1)  # Бюджет превышен: забывается отменённая правка, а не новая
+    assert budget.nbytes <= 2 * size
+    assert first.redo(mask) is not None and mask[:10, :10].all()
+    assert first.redo(mask) is None
+    assert second.undo(other) is not None and not other.any()
@@ -0,0 +1,37 @@
+import os
+
+from benchmarks.synthetic import make_dataset, synthetic_ct, write_series
+from utils.io.index import StudyIndex, read_record
+from utils.io.series import DicomSeries, read_slice_info
+
+
+def write_malformed(path):
+    """DICOM файл, который читается, но с пустым WindowCenter: get_windowing на нём падает."""
+    dataset = make_dataset(synthetic_ct(16))
+    dataset.WindowCenter = ''
+    dataset.save_as(path, write_like_original=False)
+    return path
+
+
+def test_scan_skips_malformed_file(tmp_path):
+    directory = write_series(str(tmp_path / 'archive'), 16, 3)
+    bad = write_malformed(os.path.join(directory, 'bad.dcm'))
+    with open(os.path.join(directory, 'notes.txt'), 'w') as file:
+        file.write("not a DICOM file")
+    assert read_record(bad) is None and read_slice_info(bad) is None
+
+    with StudyIndex(':memory:') as index:
+        result = index.scan(directory, batch_size=2)
+        assert result.added == 5
+        assert [info.slice_count for info in index.series()] == [3]
+        slices = index.slices()
+        assert len(slices) == 3 and bad not in [info.path for info in slices]
+        assert index.scan(directory).unchanged == 5  # Испорченный файл не перечитывается
+
+
+def test_series_skips_malformed_file(tmp_path):
+    directory = write_series(str(tmp_path / 'series'), 16, 2)
+    write_malformed(os.path.join(directory, 'bad.dcm'))
+    series = DicomSeries.from_directory(directory)
+    assert len(series) == 2
+    series.close()
@@ -0,0 +1,51 @@
+import os
+
+import numpy as np
+import pytest
+
+from utils.io import masks
+from utils.io.masks import encode_mask, decode_mask, save_mask, load_mask
+
+
+@pytest.fixture
+def labels():
+    rng = np.random.default_rng(0)
+    labels = np.zeros((40, 60), dtype=np.uint8)
+    labels[5:30, 10:50] = 1
+    labels[20:35, 30:55] = 2
+    labels[rng.integers(0, 40, 50), rng.integers(0, 60, 50)] = 3
+    return labels
+
+
+def test_round_trip(labels, tmp_path):
+    assert np.array_equal(decode_mask(encode_mask(labels)), labels)
+    path = str(tmp_path / 'mask.rle')
+    save_mask(path, labels)
+    assert np.array_equal(load_mask(path), labels)
+    assert np.array_equal(load_mask(path, (10, 5, 50, 30)), labels[5:30, 10:50])
+
+
+def test_rect_is_clipped_like_a_slice(labels):
+    data = encode_mask(labels)
+    assert np.array_equal(decode_mask(data, (50, 30, 100, 100)), labels[30:, 50:])
+    assert np.array_equal(decode_mask(data, (-5, -5, 10, 10)), labels[:10, :10])
+
+
+@pytest.mark.parametrize('rect', [(60, 0, 70, 10), (0, 40, 10, 50), (10, 10, 10, 20), (20, 10, 10, 20)])
+def test_empty_rect_raises(labels, rect):
+    with pytest.raises(ValueError):
+        decode_mask(encode_mask(labels), rect)
+
+
+def test_failed_save_leaves_no_files(labels, tmp_path, monkeypatch):
+    path = str(tmp_path / 'mask.rle')
+    save_mask(path, labels)
+
+    def fail(_):
+        raise RuntimeError("encoding failed")
+
+    monkeypatch.setattr(masks, 'encode_mask', fail)
+    with pytest.raises(RuntimeError):
+        save_mask(path, labels)
+    assert os.listdir(tmp_path) == ['mask.rle']
+    assert np.array_equal(load_mask(path), labels)  # Прежний файл не повреждён
@@ -0,0 +1,47 @@
+import numpy as np
+import pytest
+
+from benchmarks.morphology import noisy_flood_mask, legacy_remove_small_dots, reference_fill_holes
+from utils.preprocessing.image_transforms import remove_small_dots
+from utils.preprocessing.morphology import fill_holes, fill_small_holes, remove_small_objects, select_components
+
+MASKS = [(64, 64), (64, 512), (128, 128), (128, 1024)]  # (размер, количество мелких точек)
+
+
+@pytest.fixture(params=MASKS, ids=lambda item: f'{item[0]}px-{item[1]}specks')
+def mask(request):
+    size, specks = request.param
+    return noisy_flood_mask(size, specks)
+
+
+def test_remove_small_dots_matches_legacy(mask):
+    assert np.array_equal(remove_small_dots(mask), legacy_remove_small_dots(mask))
+
+
+def test_fill_holes_matches_reference(mask):
+    assert np.array_equal(fill_holes(mask), reference_fill_holes(mask))
+
+
+def test_fill_small_holes_matches_remove_small_dots(mask):
+    assert np.array_equal(fill_small_holes(mask, 10, value=1) | mask, remove_small_dots(mask))
+
+
+def test_remove_small_objects_is_inverted_fill_small_holes(mask):
+    # Удаление мелких объектов — то же, что заливка мелких дыр в инвертированной маске
+    assert np.array_equal(remove_small_objects(mask, 10), 255 - fill_small_holes(255 - mask, 9))
+
+
+def test_select_components_by_area():
+    mask = np.zeros((16, 16), dtype=np.uint8)
+    mask[1:3, 1:3] = 255  # 4 пикселя
+    mask[8:14, 8:14] = 255  # 36 пикселей
+    assert select_components(mask, max_area=4).sum() == 4
+    assert select_components(mask, min_area=5).sum() == 36
+    assert not select_components(mask, min_area=5, max_area=10).any()
+
+
+def test_remove_small_objects_with_spacing():
+    mask = np.zeros((16, 16), dtype=np.uint8)
+    mask[1:3, 1:3] = 255  # 4 пикселя по 0.25 мм² = 1 мм²
+    assert not remove_small_objects(mask, 2, spacing=(0.5, 0.5)).any()
+    assert np.array_equal(remove_small_objects(mask, 1, spacing=(0.5, 0.5)), mask)
@@ -0,0 +1,34 @@
+import json
+
+import numpy as np
+
+from utils.profiling import Profiler, RollingHistogram
+
+
+def test_histogram_keeps_last_window():
+    histogram = RollingHistogram(window=10)
+    for value in range(100):
+        histogram.add(float(value))
+    summary = histogram.summary()
+    assert summary['count'] == 100 and summary['max'] == 99
+    assert summary['p50'] == np.percentile(np.arange(90, 100), 50)
+
+
+def test_trace_is_streamed_to_valid_json(tmp_path, capsys):
+    path = str(tmp_path / 'trace.json')
+    profiler = Profiler(path)
+    for index in range(5):
+        profiler.record('render', index, index + 0.001)
+        profiler.frame()
+    profiler.close()
+    with open(path) as file:
+        events = json.load(file)['traceEvents']
+    assert [event['name'] for event in events] == ['render', 'frame'] * 5
+    assert 'render' in capsys.readouterr().out
+
+
+def test_empty_trace(tmp_path, capsys):
+    path = str(tmp_path / 'trace.json')
+    Profiler(path).close()
+    with open(path) as file:
+        assert json.load(file)['traceEvents'] == []
@@ -0,0 +1,39 @@
+import numpy as np
+import pytest
+
+from utils.analysis.propagation import Propagation
+
+
+def disk_slices(count, size=64, radius=15):
+    yy, xx = np.mgrid[:size, :size]
+    image = np.where((yy - size // 2) ** 2 + (xx - size // 2) ** 2 <= radius ** 2, 200, 40).astype(np.uint8)
+    return [image] * count
+
+
+@pytest.mark.parametrize('count, start', [(1, 0), (3, 0), (3, 2)])
+def test_finish_is_not_called_from_constructor(count, start):
+    slices = disk_slices(count)
+    calls = []
+    propagation = Propagation(slices.__getitem__, start, slices[start] > 100, count, 10,
+                              finish=lambda: calls.append(propagation.done))
+    assert calls == [] and propagation.busy
+    propagation.wait()
+    assert calls == [count - 1] and not propagation.busy
+    assert propagation.indices == [0, count - 1]
+
+
+def test_single_slice_finishes_on_first_poll():
+    slices = disk_slices(1)
+    calls = []
+    propagation = Propagation(slices.__getitem__, 0, slices[0] > 100, 1, 10, finish=lambda: calls.append(True))
+    propagation.poll()
+    assert calls == [True] and propagation.done == 0
+
+
+def test_cancel_before_poll():
+    slices = disk_slices(5)
+    calls = []
+    propagation = Propagation(slices.__getitem__, 2, slices[2] > 100, 5, 10, finish=lambda: calls.append(True))
+    propagation.cancel()
+    propagation.poll()
+    assert calls == [True] and propagation.cancelled and not propagation.busy
@@ -0,0 +1,98 @@
+from cv2 import cv2
+import numpy as np
+import pytest
+
+from benchmarks.region_growing import synthetic_scene, per_seed_floodfill
+from utils.analysis.region_growing import find_seed_points, grow_regions, ToleranceMap
+
+
+def noisy_image(size, seed=0):
+    rng = np.random.default_rng(seed)
+    image = np.array(rng.normal(120, 25, (size, size)), dtype=np.float32)
+    return np.array(np.clip(cv2.GaussianBlur(image, (0, 0), 2), 0, 255), dtype=np.uint8)
+
+
+@pytest.mark.parametrize('connectivity', [4, 8])
+@pytest.mark.parametrize('tolerance', [0, 1, 10, 50, 255])
+def test_grow_regions_matches_per_seed_floodfill(tolerance, connectivity):
+    image, mask = synthetic_scene(96)
+    seeds = find_seed_points(np.array(mask == 1, dtype=np.uint8))
+    expected = per_seed_floodfill(image, seeds, tolerance, mask == 2, connectivity)
+    assert np.array_equal(grow_regions(image, seeds, tolerance, mask == 2, connectivity), expected)
+
+
+@pytest.mark.parametrize('tolerance', [0, 3, 20, 255])
+def test_grow_regions_seeds_at_borders(tolerance):
+    image = noisy_image(64)
+    size = image.shape[0]
+    seeds = np.array([[0, 0], [size - 1, 0], [0, size - 1], [size - 1, size - 1], [size // 2, 0], [0, size // 2]])
+    assert np.array_equal(grow_regions(image, seeds, tolerance), per_seed_floodfill(image, seeds, tolerance))
+
+
+@pytest.mark.parametrize('tolerance', [0, 5, 30])
+def test_grow_regions_duplicate_seed_values(tolerance):
+    # Несколько точек с одним значением в разных областях и повторяющиеся точки
+    image = noisy_image(64, seed=1)
+    image[10, 10] = image[50, 40] = image[30, 5] = 77
+    seeds = np.array([[10, 10], [40, 50], [5, 30], [10, 10], [40, 50]])
+    assert np.array_equal(grow_regions(image, seeds, tolerance), per_seed_floodfill(image, seeds, tolerance))
+
+
+def test_grow_regions_skips_forbidden_seeds():
+    image = noisy_image(32)
+    forbidden = np.zeros(image.shape, dtype=bool)
+    forbidden[:, :16] = True
+    seeds = np.array([[4, 4], [20, 20]])
+    result = grow_regions(image, seeds, 255, forbidden)
+    assert np.array_equal(result, per_seed_floodfill(image, seeds, 255, forbidden))
+    assert not result[forbidden].any()
+
+
+def test_grow_regions_without_seeds():
+    image = noisy_image(16)
+    assert not grow_regions(image, np.zeros((0, 2), dtype=np.int32), 10).any()
+
+
+@pytest.mark.parametrize('connectivity', [4, 8])
+def test_tolerance_map_matches_grow_regions(connectivity):
+    image, mask = synthetic_scene(96)
+    seeds = find_seed_points(np.array(mask == 1, dtype=np.uint8))
+    tolerance_map = ToleranceMap(image, connectivity=connectivity)
+    tolerance_map.update(seeds, mask == 2)
+    for tolerance in (0, 1, 10, 49, 50, 80):
+        expected = grow_regions(image, seeds, tolerance, mask == 2, connectivity)
+        assert np.array_equal(tolerance_map.fill(tolerance), expected), tolerance
+
+
+def test_tolerance_map_updates_only_changed_values():
+    # Левая и правая половины отличаются больше чем на max_tolerance: заливка слева не доходит до правой
+    image = noisy_image(96)
+    image[:, 48:] = np.clip(image[:, 48:].astype(np.int16) + 100, 0, 255).astype(np.uint8)
+    image[:, :48] //= 2
+    mask = np.zeros(image.shape, dtype=np.uint8)
+    mask[20:40, 10:30] = 1
+    seeds = find_seed_points(mask)
+    tolerance_map = ToleranceMap(image)
+    tolerance_map.update(seeds, mask == 2)
+    assert not tolerance_map.fill(50)[:, 60:].any()
+    levels = dict(tolerance_map._levels)
+
+    # Запретная зона вдали от заливок при тех же точках: карта не пересчитывается
+    mask[80:90, 80:90] = 2
+    tolerance_map.update(seeds, mask == 2, (80, 80, 90, 90))
+    assert all(tolerance_map._levels[value] is level for value, level in levels.items())
+    assert np.array_equal(tolerance_map.fill(50), grow_regions(image, seeds, 50, mask == 2))
+
+    # Новая запретная зона внутри заливки и новые точки
+    mask[30:50, 20:40] = 2
+    mask[60:70, 5:15] = 1
+    seeds = find_seed_points(np.array(mask == 1, dtype=np.uint8))
+    tolerance_map.update(seeds, mask == 2, (20, 30, 40, 50))
+    for tolerance in (0, 10, 50):
+        assert np.array_equal(tolerance_map.fill(tolerance), grow_regions(image, seeds, tolerance, mask == 2))
+
+    # Запретная зона убрана
+    mask[30:50, 20:40] = 0
+    tolerance_map.update(seeds, mask == 2, (20, 30, 40, 50))
+    for tolerance in (0, 10, 50):
+        assert np.array_equal(tolerance_map.fill(tolerance), grow_regions(image, seeds, tolerance, mask == 2))
@@ -0,0 +1,30 @@
+import numpy as np
+
+from benchmarks.synthetic import write_series
+from utils.io.cache import PixelCache
+from utils.io.series import DicomSeries
+
+
+def test_pixel_cache_hit_is_not_copied(tmp_path):
+    directory = write_series(str(tmp_path / 'series'), 32, 3)
+    cache = PixelCache(str(tmp_path / 'cache'), compressed_only=False)
+
+    first = DicomSeries.from_directory(directory, pixel_cache=cache)
+    expected = [np.array(first.pixels(index)) for index in range(len(first))]
+    assert first._decoded.all() and not first._cached  # Промах: срезы декодированы в том
+    first.close()
+
+    second = DicomSeries.from_directory(directory, pixel_cache=cache)
+    for index in range(len(second)):
+        pixels = second.pixels(index)
+        assert isinstance(pixels, np.memmap) and not pixels.flags.writeable
+        assert np.array_equal(pixels, expected[index])
+        assert second.pixels(index) is pixels
+    assert not second._decoded.any()  # Попадание: в том ничего не копировалось
+    second.close()
+
+
+def test_without_pixel_cache(tmp_path):
+    series = DicomSeries.from_directory(write_series(str(tmp_path / 'series'), 16, 2))
+    assert series.pixels(1).shape == (16, 16) and series._decoded[1]
+    series.close()
@@ -0,0 +1,59 @@
+import numpy as np
+import pytest
+
+from utils.analysis.statistics import LabelStatistics
+
+
+def naive_summaries(mask, hu, spacing):
+    """Сводки по каждой метке отдельно, по всему кадру."""
+    summaries = {}
+    for label in np.unique(mask):
+        if label != 0:
+            values = hu[mask == label].astype(np.float64)
+            summaries[int(label)] = {
+                'count': len(values), 'area': len(values) * spacing[0] * spacing[1], 'mean': values.mean(),
+                'std': values.std(), 'min': int(values.min()), 'max': int(values.max())}
+    return summaries
+
+
+def assert_summaries_equal(actual, expected):
+    assert actual.keys() == expected.keys()
+    for label, summary in expected.items():
+        for key, value in summary.items():
+            assert actual[label][key] == pytest.approx(value), (label, key)
+
+
+@pytest.fixture
+def hu():
+    return np.random.default_rng(0).integers(-1024, 3000, (64, 80)).astype(np.int16)
+
+
+@pytest.mark.parametrize('labels', [[], [1], [1, 2], [1, 2, 3, 7, 255]])
+def test_reset_matches_per_label(hu, labels):
+    rng = np.random.default_rng(1)
+    mask = rng.choice(np.array([0] + labels, dtype=np.uint8), hu.shape)
+    statistics = LabelStatistics.from_mask(mask, hu, (0.5, 0.7))
+    assert_summaries_equal(statistics.summaries(), naive_summaries(mask, hu, (0.5, 0.7)))
+
+
+def test_update_matches_reset(hu):
+    rng = np.random.default_rng(2)
+    mask = np.zeros(hu.shape, dtype=np.uint8)
+    statistics = LabelStatistics.from_mask(mask, hu)
+    for _ in range(30):
+        indices = np.unique(rng.integers(0, mask.size, 200))
+        before = mask.ravel()[indices].copy()
+        after = rng.choice(np.array([0, 1, 2, 3], dtype=np.uint8), len(indices))
+        mask.ravel()[indices] = after
+        statistics.update(indices, before, after)
+        assert_summaries_equal(statistics.summaries(), naive_summaries(mask, hu, (1, 1)))
+
+
+def test_erasing_restores_min_and_max(hu):
+    mask = np.zeros(hu.shape, dtype=np.uint8)
+    mask[10:20, 10:20] = 1
+    statistics = LabelStatistics.from_mask(mask, hu)
+    extreme = int(np.argmax(np.where(mask == 1, hu, -2000)))  # Плоский индекс максимума HU в метке
+    statistics.update(np.array([extreme]), np.array([1], dtype=np.uint8), np.array([0], dtype=np.uint8))
+    mask.ravel()[extreme] = 0
+    assert_summaries_equal(statistics.summaries(), naive_summaries(mask, hu, (1, 1)))
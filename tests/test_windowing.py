@@ -0,0 +1,82 @@
+from cv2 import cv2
+import numpy as np
+import pytest
+
+from utils.preprocessing.dicom_transforms import apply_windowing
+from utils.preprocessing.windowing import WindowingEngine
+
+
+def reference(pixels, window_center, window_width, intercept, slope, inverted):
+    """`apply_windowing` в BGR; пиксели в int64, чтобы арифметика не зависела от правил приведения типов NumPy."""
+    image = apply_windowing(np.asarray(pixels, dtype=np.int64), window_center, window_width, intercept, slope,
+                            inverted)
+    return cv2.cvtColor(image, cv2.COLOR_GRAY2BGR)
+
+
+def random_pixels(low, high, dtype, size=64, seed=0):
+    return np.random.default_rng(seed).integers(low, high, (size, size), endpoint=True).astype(dtype)
+
+
+# (пиксели, intercept, slope): uint8 путь через cv2.LUT, uint16 и uint32 индексы, знаковые значения
+CASES = {
+    'uint8 lut': (random_pixels(0, 200, np.uint8), -100, 1),
+    'uint8 lut full range': (random_pixels(0, 255, np.uint8), 0, 1),
+    'ct': (random_pixels(0, 4095, np.uint16), -1024, 1),
+    'slope': (random_pixels(0, 2000, np.uint16), -1024, 2),
+    'signed': (random_pixels(-2000, 3000, np.int16), 0, 1),
+    'signed intercept': (random_pixels(-2000, 2000, np.int16), 1000, 3),
+    'uint16 full range': (random_pixels(0, 65535, np.uint16), -32768, 1),
+    'uint32 index': (random_pixels(-100000, 100000, np.int32), 0, 1),
+}
+
+WINDOWS = [(40, 400), (-600, 1500), (3000, 100), (-5000, 50), (100, 300000)]
+
+
+@pytest.mark.parametrize('inverted', [False, True])
+@pytest.mark.parametrize('window', WINDOWS)
+@pytest.mark.parametrize('case', sorted(CASES))
+def test_engine_matches_apply_windowing(case, window, inverted):
+    pixels, intercept, slope = CASES[case]
+    engine = WindowingEngine(pixels, intercept, slope)
+    window_center, window_width = window
+    hu = np.clip(pixels.astype(np.int64) * slope + intercept,
+                 window_center - window_width // 2, window_center + window_width // 2)
+    if inverted and hu.min() == hu.max():
+        # Всё изображение за пределами окна: у apply_windowing после инверсии деление 0 на 0, у движка — чёрный кадр
+        expected = np.zeros(pixels.shape + (3,), dtype=np.uint8)
+    else:
+        expected = reference(pixels, window_center, window_width, intercept, slope, inverted)
+    assert np.array_equal(engine.apply(window_center, window_width, inverted), expected)
+    assert np.array_equal(engine.gray, expected[..., 0])
+
+
+@pytest.mark.parametrize('inverted', [False, True])
+@pytest.mark.parametrize('case', sorted(CASES))
+def test_zero_window_width(case, inverted):
+    # У apply_windowing здесь деление 0 на 0; движок даёт чёрное изображение без предупреждений
+    pixels, intercept, slope = CASES[case]
+    engine = WindowingEngine(pixels, intercept, slope)
+    assert not engine.apply(40, 0, inverted).any()
+
+
+def test_index_dtype():
+    assert WindowingEngine(CASES['uint8 lut'][0], -100).hu_index.dtype == np.uint8
+    assert WindowingEngine(CASES['ct'][0], -1024).hu_index.dtype == np.uint16
+    assert WindowingEngine(CASES['uint32 index'][0]).hu_index.dtype == np.uint32
+
+
+def test_hu_round_trip():
+    pixels, intercept, slope = CASES['signed intercept']
+    engine = WindowingEngine(pixels, intercept, slope)
+    assert np.array_equal(engine.hu, pixels.astype(np.int64) * slope + intercept)
+    assert engine.hu_min == int(engine.hu.min()) and engine.hu_max == int(engine.hu.max())
+
+
+def test_buffer_is_reused_and_updated():
+    pixels, intercept, slope = CASES['ct']
+    engine = WindowingEngine(pixels, intercept, slope)
+    first = engine.apply(40, 400)
+    assert engine.apply(40, 400) is first
+    second = engine.apply(400, 2000, True)
+    assert second is first
+    assert np.array_equal(second, reference(pixels, 400, 2000, intercept, slope, True))
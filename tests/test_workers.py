@@ -0,0 +1,38 @@
+from utils.workers import BackgroundJob
+
+
+def fail():
+    raise RuntimeError("denoise failed")
+
+
+def run(job):
+    job.request()
+    job.wait()  # Ошибка запуска не выходит наружу
+
+
+def test_failed_run_is_reported_and_dropped():
+    applied, failures = [], []
+    tasks = [lambda: 1, fail, lambda: 3]
+    job = BackgroundJob(lambda: tasks.pop(0), applied.append, delay=0, fail=failures.append)
+    run(job)
+    run(job)
+    assert applied == [1] and isinstance(job.error, RuntimeError) and failures == [job.error]
+    run(job)
+    assert applied == [1, 3] and job.error is None and len(failures) == 1 and not job.busy
+
+
+def test_failed_prepare_is_reported():
+    applied, failures = [], []
+    prepares = [fail, lambda: (lambda: 2)]
+    job = BackgroundJob(lambda: prepares.pop(0)(), applied.append, delay=0, fail=failures.append)
+    run(job)
+    assert applied == [] and isinstance(job.error, RuntimeError) and not job.busy
+    run(job)
+    assert applied == [2] and job.error is None and len(failures) == 1
+
+
+def test_default_fail_prints(capsys):
+    job = BackgroundJob(lambda: fail, lambda result: None, delay=0)
+    run(job)
+    assert isinstance(job.error, RuntimeError)
+    assert "denoise failed" in capsys.readouterr().err
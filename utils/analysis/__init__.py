@@ -1,2 +1,5 @@
 from .contours import *
 from .distances import *
+from .rects import *
+from .region_growing import *
+from .propagation import *
@@ -1,4 +1,5 @@
 from cv2 import cv2
+import numpy as np
 
 
 def find_exterior_contours(img):
@@ -9,3 +10,19 @@ def find_exterior_contours(img):
     if len(ret) == 3:
         return ret[1]
     raise Exception("Check the signature for `cv.findContours()`.")
+
+
+def find_label_boundaries(labels):
+    """
+    Граничные пиксели всех размеченных областей за один проход.
+    Пиксель граничный, если его метка ненулевая и хотя бы у одного из 4 соседей метка другая.
+    """
+    boundaries = np.zeros(labels.shape, dtype=bool)
+    vertical = labels[1:, :] != labels[:-1, :]
+    horizontal = labels[:, 1:] != labels[:, :-1]
+    boundaries[1:, :] |= vertical
+    boundaries[:-1, :] |= vertical
+    boundaries[:, 1:] |= horizontal
+    boundaries[:, :-1] |= horizontal
+    boundaries &= labels != 0
+    return boundaries
@@ -1,2 +1,35 @@
+import numpy as np
+
+
 def distance_between_points(p1, p2, spacing=(1, 1)):
     return (((p1[0] - p2[0]) * spacing[1]) ** 2 + ((p1[1] - p2[1]) * spacing[0]) ** 2) ** 0.5
+
+
+def segment_lengths(segments, spacing=(1, 1)):
+    """
+    Длины отрезков с учётом размера пикселя.
+    :param segments: массив (N, 2, 2) — концы отрезков (x, y)
+    :param spacing: размер пикселя (между строками, между столбцами), как в PixelSpacing
+    """
+    segments = np.asarray(segments, dtype=np.float64).reshape(-1, 2, 2)
+    delta = segments[:, 1] - segments[:, 0]
+    return np.hypot(delta[:, 0] * float(spacing[1]), delta[:, 1] * float(spacing[0]))
+
+
+def point_segment_distances(point, segments):
+    """Расстояния от точки (x, y) до каждого из отрезков (N, 2, 2) — до ближайшей точки отрезка, а не прямой."""
+    segments = np.asarray(segments, dtype=np.float64).reshape(-1, 2, 2)
+    start, direction = segments[:, 0], segments[:, 1] - segments[:, 0]
+    offset = np.asarray(point, dtype=np.float64) - start
+    squared_length = np.einsum('ij,ij->i', direction, direction)
+    # Проекция точки на отрезок; вырожденный отрезок — это просто точка
+    t = np.einsum('ij,ij->i', offset, direction) / np.where(squared_length > 0, squared_length, 1)
+    nearest = np.clip(t, 0, 1)[:, None] * direction
+    return np.hypot(*(offset - nearest).T)
+
+
+def closest_segment(point, segments):
+    """Индекс ближайшего к точке отрезка или None, если отрезков нет."""
+    if len(segments) == 0:
+        return None
+    return int(np.argmin(point_segment_distances(point, segments)))
@@ -0,0 +1,70 @@
+from cv2 import cv2
+import numpy as np
+
+
+class LiveWire:
+    """
+    «Умные ножницы» (live-wire): путь между опорными точками идёт вдоль границ изображения.
+    Граф стоимостей рёбер (градиенты, Canny, лапласиан) строится один раз на изображение,
+    дерево кратчайших путей — один раз на опорную точку, а путь до курсора — это проход по дереву.
+    """
+
+    def __init__(self, image, canny=(32, 100), gradient_limit=200):
+        """
+        :param image: изображение uint8 после windowing'а (одно- или трёхканальное)
+        :param canny: пороги Canny для признака границ
+        :param gradient_limit: модуль градиента, выше которого все границы считаются одинаково сильными
+        """
+        self.shape = image.shape[:2]
+        self.tool = cv2.segmentation_IntelligentScissorsMB()
+        self.tool.setEdgeFeatureCannyParameters(*canny)
+        self.tool.setGradientMagnitudeMaxLimit(gradient_limit)
+        self.tool.applyImage(image)  # Граф стоимостей: самая долгая часть
+        self.source = None  # опорная точка, от которой построено дерево
+
+    def set_source(self, point):
+        """Строит дерево кратчайших путей от опорной точки (x, y)."""
+        self.source = (int(point[0]), int(point[1]))
+        self.tool.buildMap(self.source)
+
+    def path_to(self, point):
+        """Путь от опорной точки до точки (x, y): массив (N, 2) из (x, y)."""
+        if self.source is None:
+            return np.zeros((0, 2), dtype=np.int32)
+        x = min(max(int(point[0]), 0), self.shape[1] - 1)
+        y = min(max(int(point[1]), 0), self.shape[0] - 1)
+        return np.array(self.tool.getContour((x, y)), dtype=np.int32).reshape(-1, 2)
+
+
+class LiveWirePath:
+    """
+    Замкнутый контур, который обводится «умными ножницами»: опорные точки и готовые участки между ними.
+    Хранится отдельно от LiveWire, поэтому переживает пересчёт графа (например, после смены windowing'а).
+    """
+
+    def __init__(self):
+        self.anchors = []  # опорные точки (x, y)
+        self.segments = []  # участки пути между соседними опорными точками, массивы (N, 2)
+
+    def __len__(self):
+        return len(self.anchors)
+
+    def add(self, point, segment=None):
+        """Добавляет опорную точку; segment — путь до неё от предыдущей."""
+        if self.anchors:
+            self.segments.append(segment if segment is not None else np.array([self.anchors[-1], point]))
+        self.anchors.append(tuple(point))
+
+    def pop(self):
+        """Убирает последнюю опорную точку."""
+        if self.segments:
+            self.segments.pop()
+        if self.anchors:
+            self.anchors.pop()
+
+    def points(self, tail=None):
+        """Все точки пути и, если задан, незавершённый участок tail (до курсора или замыкающий)."""
+        parts = list(self.segments) + ([tail] if tail is not None else [])
+        if not parts:
+            return np.array(self.anchors, dtype=np.int32).reshape(-1, 2)
+        return np.array(np.concatenate(parts), dtype=np.int32).reshape(-1, 2)
@@ -0,0 +1,175 @@
+from concurrent.futures import wait, FIRST_COMPLETED
+
+from cv2 import cv2
+import numpy as np
+
+from utils.analysis.region_growing import find_seed_points, grow_regions
+from utils.preprocessing.image_transforms import remove_small_dots
+from utils.workers import get_executor
+
+
+def propagation_seeds(mask, erosion=2):
+    """
+    Стартовые точки для соседнего среза: контуры и центры разметки, сжатой на erosion пикселей,
+    чтобы не начать заливку за границей органа, которая сдвинулась между срезами.
+    Если после сжатия ничего не осталось, берётся сама разметка.
+    """
+    mask = np.array(mask != 0, dtype=np.uint8)
+    if erosion > 0:
+        kernel = cv2.getStructuringElement(cv2.MORPH_ELLIPSE, (2 * erosion + 1, 2 * erosion + 1))
+        eroded = cv2.erode(mask, kernel)
+        if eroded.any():
+            mask = eroded
+    return find_seed_points(mask)
+
+
+def propagate_slice(image, previous_image, previous_mask, tolerance, forbidden=None, connectivity=4, erosion=2):
+    """
+    Разметка среза по разметке соседнего: заливка с фиксированным диапазоном из сжатой соседней разметки.
+    Стартовые точки, значение в которых отличается от медианы соседней области больше чем на tolerance,
+    отбрасываются — они попали на другую ткань.
+    :param image: одноканальное изображение uint8 размечаемого среза
+    :param previous_image: изображение соседнего среза
+    :param previous_mask: разметка соседнего среза (ненулевые пиксели)
+    :param forbidden: запретная зона размечаемого среза
+    :return: маска uint8, залитые пиксели равны 255
+    """
+    values = previous_image[previous_mask != 0]
+    seeds = propagation_seeds(previous_mask, erosion)
+    if len(values) == 0 or len(seeds) == 0:
+        return np.zeros(image.shape[:2], dtype=np.uint8)
+    reference = int(np.median(values))
+    seed_values = np.asarray(image[seeds[:, 1], seeds[:, 0]], dtype=np.int16)
+    seeds = seeds[np.abs(seed_values - reference) <= tolerance]
+    return remove_small_dots(grow_regions(image, seeds, tolerance, forbidden, connectivity))
+
+
+class Propagation:
+    """
+    Перенос разметки по серии в обе стороны от начального среза, пока область не исчезнет.
+    Срез размечается по результату соседнего, поэтому внутри одного направления срезы идут по очереди,
+    а подготовка следующих срезов (чтение, windowing, подавление шума) заранее идёт в пуле — конвейером.
+    Как и BackgroundJob, управляется из цикла окна через `poll()`: результаты отдаются в потоке интерфейса.
+    """
+
+    def __init__(self, load, start, mask, count, tolerance, forbidden=None, apply=None, finish=None,
+                 lookahead=2, connectivity=4, erosion=2, min_area=16, max_growth=4.0):
+        """
+        :param load: функция (номер среза) -> изображение uint8 для заливки, вызывается в пуле
+        :param start: номер начального среза
+        :param mask: принятая разметка начального среза (ненулевые пиксели)
+        :param count: количество срезов в серии
+        :param tolerance: максимальное отклонение значения пикселя
+        :param forbidden: словарь {номер среза: запретная зона}
+        :param apply: вызывается в потоке интерфейса с (номер среза, маска 0/255) для каждого размеченного среза
+        :param finish: вызывается в потоке интерфейса, когда перенос закончен или отменён
+        :param lookahead: сколько срезов вперёд готовить в каждом направлении
+        :param min_area: область меньше этого (в пикселях) считается исчезнувшей
+        :param max_growth: во сколько раз область может вырасти от среза к срезу; больше — утечка заливки
+        """
+        self.load = load
+        self.start = start
+        self.count = count
+        self.tolerance = tolerance
+        self.forbidden = forbidden or {}
+        self.apply = apply
+        self.finish = finish
+        self.lookahead = lookahead
+        self.connectivity = connectivity
+        self.erosion = erosion
+        self.min_area = min_area
+        self.max_growth = max_growth
+
+        self.done = 0  # сколько срезов размечено
+        self.indices = [start, start]  # крайние размеченные срезы
+        self.cancelled = False
+        # Направление: шаг, последний размеченный срез, его разметка и площадь, Future заливки следующего
+        self._directions = [dict(step=step, index=start, mask=np.array(mask != 0, dtype=np.uint8),
+                                 area=int(np.count_nonzero(mask)), task=None)
+                            for step in (1, -1) if 0 <= start + step < count]
+        # Номер среза -> Future изображения
+        self._loads = {start: get_executor().submit(load, start)} if self._directions else {}
+        # Без соседних срезов перенос закончится на первом `poll()`: finish не вызывается из конструктора,
+        # пока вызывающий код ещё не сохранил объект переноса
+        self._finished = False
+
+    @property
+    def busy(self):
+        return not self._finished
+
+    def cancel(self):
+        """Останавливает перенос; уже размеченные срезы остаются, результаты идущих заливок отбрасываются."""
+        if self._finished:
+            return
+        self.cancelled = True
+        for future in self._pending():
+            future.cancel()
+        self._directions = []
+        self._finish()
+
+    def poll(self):
+        """Отдаёт готовые срезы и запускает следующие. Вызывается в цикле окна."""
+        if self._finished:
+            return
+        for direction in list(self._directions):
+            self._advance(direction)
+        if not self._directions:
+            self._finish()
+
+    def wait(self):
+        """Дожидается конца переноса (для работы без интерфейса)."""
+        while self.busy:
+            pending = self._pending()
+            if pending:
+                wait(pending, return_when=FIRST_COMPLETED)
+            self.poll()
+
+    def _advance(self, direction):
+        step, index = direction['step'], direction['index']
+        task = direction['task']
+        if task is not None:
+            if not task.done():
+                return
+            direction['task'] = None
+            mask = task.result()
+            area = int(np.count_nonzero(mask))
+            self._release(index)
+            if area < self.min_area or area > self.max_growth * direction['area']:  # Область исчезла или утекла
+                self._directions.remove(direction)
+                return
+            index += step
+            direction.update(index=index, mask=mask, area=area)
+            self.done += 1
+            self.indices = [min(self.indices[0], index), max(self.indices[1], index)]
+            if self.apply is not None:
+                self.apply(index, mask)
+            if not 0 <= index + step < self.count:
+                self._directions.remove(direction)
+                self._release(index)
+                return
+
+        # Заранее готовим следующие срезы, размечаем следующий, как только он и текущий готовы
+        for offset in range(1, self.lookahead + 1):
+            ahead = index + step * offset
+            if 0 <= ahead < self.count and ahead not in self._loads:
+                self._loads[ahead] = get_executor().submit(self.load, ahead)
+        current, following = self._loads[index], self._loads[index + step]
+        if current.done() and following.done():
+            direction['task'] = get_executor().submit(
+                propagate_slice, following.result(), current.result(), direction['mask'], self.tolerance,
+                self.forbidden.get(index + step), self.connectivity, self.erosion)
+
+    def _release(self, index):
+        # Изображение среза нужно, пока по нему размечается следующий; начальный срез нужен обоим направлениям
+        if index != self.start:
+            self._loads.pop(index, None)
+
+    def _pending(self):
+        futures = [future for future in self._loads.values() if not future.done()]
+        return futures + [d['task'] for d in self._directions if d['task'] is not None]
+
+    def _finish(self):
+        self._finished = True
+        self._loads = {}
+        if self.finish is not None:
+            self.finish()
@@ -0,0 +1,77 @@
+import numpy as np
+
+# Прямоугольники задаются как (x0, y0, x1, y1), правая и нижняя границы не включаются
+
+
+def clip_rect(rect, shape):
+    """Обрезает прямоугольник по размерам изображения. Возвращает None, если он пустой."""
+    x0, y0, x1, y1 = rect
+    x0, y0 = max(int(x0), 0), max(int(y0), 0)
+    x1, y1 = min(int(x1), shape[1]), min(int(y1), shape[0])
+    if x0 >= x1 or y0 >= y1:
+        return None
+    return x0, y0, x1, y1
+
+
+def expand_rect(rect, padding, shape):
+    """Расширяет прямоугольник на `padding` пикселей во все стороны с обрезкой по изображению."""
+    x0, y0, x1, y1 = rect
+    return clip_rect((x0 - padding, y0 - padding, x1 + padding, y1 + padding), shape)
+
+
+def union_rect(first, second):
+    """Объединение двух прямоугольников (любой из них может быть None)."""
+    if first is None:
+        return second
+    if second is None:
+        return first
+    return (min(first[0], second[0]), min(first[1], second[1]),
+            max(first[2], second[2]), max(first[3], second[3]))
+
+
+def intersects(first, second):
+    """Пересекаются ли два прямоугольника."""
+    if first is None or second is None:
+        return False
+    return first[0] < second[2] and second[0] < first[2] and first[1] < second[3] and second[1] < first[3]
+
+
+def intersect_rect(first, second):
+    """Пересечение двух прямоугольников или None, если они не пересекаются."""
+    if not intersects(first, second):
+        return None
+    return (max(first[0], second[0]), max(first[1], second[1]),
+            min(first[2], second[2]), min(first[3], second[3]))
+
+
+def subtract_rect(rect, other):
+    """
+    Прямоугольник, ограничивающий часть rect вне other (None, если other покрывает rect целиком).
+    Результат может захватывать и часть other — это ограничивающий прямоугольник, а не точная разность.
+    """
+    if rect is None or not intersects(rect, other):
+        return rect
+    x0, y0, x1, y1 = rect
+    covers_x = other[0] <= x0 and other[2] >= x1
+    covers_y = other[1] <= y0 and other[3] >= y1
+    if covers_x and covers_y:
+        return None
+    if covers_x:  # Остаются полосы сверху и/или снизу
+        y0, y1 = (y0 if y0 < other[1] else other[3]), (y1 if y1 > other[3] else other[1])
+    elif covers_y:  # Остаются полосы слева и/или справа
+        x0, x1 = (x0 if x0 < other[0] else other[2]), (x1 if x1 > other[2] else other[0])
+    return x0, y0, x1, y1
+
+
+def circle_rect(x, y, radius):
+    """Прямоугольник, в который вписан круг."""
+    return x - radius, y - radius, x + radius + 1, y + radius + 1
+
+
+def mask_bounding_rect(mask):
+    """Ограничивающий прямоугольник ненулевых пикселей маски или None."""
+    rows = np.flatnonzero(mask.any(axis=1))
+    if len(rows) == 0:
+        return None
+    cols = np.flatnonzero(mask.any(axis=0))
+    return int(cols[0]), int(rows[0]), int(cols[-1]) + 1, int(rows[-1]) + 1
@@ -0,0 +1,203 @@
+from cv2 import cv2
+import numpy as np
+
+from utils.analysis.contours import find_exterior_contours
+from utils.analysis.rects import clip_rect, expand_rect, union_rect, intersects
+
+
+def find_seed_points(mask):
+    """
+    Стартовые точки для заливки: все точки контуров объектов маски, а также их примерные центры,
+    если центр попадает на размеченную область (а то может быть кольцо).
+    :return: массив (N, 2) координат (x, y)
+    """
+    points = []
+    for contour in find_exterior_contours(mask):
+        points.append(contour[:, 0])
+        centroid = contour.mean(axis=1).mean(axis=0)  # Находим примерный центр
+        xc, yc = int(centroid[0]), int(centroid[1])
+        if mask[yc, xc] != 0:
+            points.append([[xc, yc]])
+    if not points:
+        return np.zeros((0, 2), dtype=np.int32)
+    return np.array(np.concatenate(points), dtype=np.int32)
+
+
+def grow_regions(image, seeds, tolerance, forbidden=None, connectivity=4):
+    """
+    Заливка с фиксированным диапазоном сразу из всех стартовых точек.
+    Результат совпадает с объединением отдельных `cv2.floodFill` из каждой точки: пиксель попадает в область,
+    если до него есть путь, на котором все значения отличаются от значения стартовой точки не больше чем на tolerance.
+    Точки группируются по значению и заливаются в общую маску; точка, уже попавшая в залитую область, пропускается.
+    Поэтому каждый пиксель обходится не больше одного раза на каждое значение стартовых точек,
+    а маска для cv2.floodFill выделяется один раз и очищается только в залитом прямоугольнике.
+    :param image: одноканальное изображение uint8
+    :param seeds: массив (N, 2) координат (x, y)
+    :param tolerance: максимальное отклонение значения пикселя
+    :param forbidden: маска запретной зоны, через которую заливка не проходит
+    :param connectivity: связность (4 или 8)
+    :return: маска uint8, залитые пиксели равны 255
+    """
+    barrier = make_barrier(image.shape[:2], forbidden)
+    work = barrier.copy()
+    result = np.zeros(image.shape[:2], dtype=np.uint8)
+    for _, points in group_seeds(image, seeds):
+        rect = fill_from_points(image, work, points, tolerance, connectivity)
+        if rect is None:
+            continue
+        x0, y0, x1, y1 = rect
+        result[y0:y1, x0:x1][work[y0 + 1:y1 + 1, x0 + 1:x1 + 1] == 255] = 255
+
+        # Возвращаем рабочую маску в исходное состояние только там, где была заливка
+        work[y0 + 1:y1 + 1, x0 + 1:x1 + 1] = barrier[y0 + 1:y1 + 1, x0 + 1:x1 + 1]
+    return result
+
+
+def make_barrier(shape, forbidden=None):
+    """Маска для cv2.floodFill размером (H + 2, W + 2), где запретная зона отмечена единицами."""
+    barrier = np.zeros((shape[0] + 2, shape[1] + 2), dtype=np.uint8)
+    if forbidden is not None:
+        barrier[1:-1, 1:-1][forbidden != 0] = 1
+    return barrier
+
+
+def group_seeds(image, seeds):
+    """Группирует стартовые точки по значению пикселя. Возвращает пары (значение, точки)."""
+    seeds = np.asarray(seeds, dtype=np.int32).reshape(-1, 2)
+    if len(seeds) == 0:
+        return []
+    values = image[seeds[:, 1], seeds[:, 0]]
+    order = np.argsort(values, kind='stable')
+    values, seeds = values[order], seeds[order]
+    bounds = np.flatnonzero(np.diff(values)) + 1
+    return list(zip(values[np.r_[0, bounds]], np.split(seeds, bounds)))
+
+
+def fill_from_points(image, work, points, tolerance, connectivity=4):
+    """
+    Заливает из точек с одинаковым значением в общую маску work (залитые пиксели равны 255).
+    :return: прямоугольник (x0, y0, x1, y1) залитой области или None
+    """
+    flags = connectivity | cv2.FLOODFILL_FIXED_RANGE | cv2.FLOODFILL_MASK_ONLY | 255 << 8
+    rect = None
+    for x, y in points:
+        if work[y + 1, x + 1]:  # Точка уже залита или находится в запретной зоне
+            continue
+        _, _, _, (rx, ry, rw, rh) = cv2.floodFill(image, work, (int(x), int(y)), 0, tolerance, tolerance, flags)
+        rect = union_rect(rect, (rx, ry, rx + rw, ry + rh))
+    return rect
+
+
+UNREACHABLE = 255  # значение карты tolerance для пикселей, недостижимых при любом допустимом tolerance
+
+
+class ToleranceMap:
+    """
+    Карта минимального tolerance, при котором пиксель попадает в заливку `grow_regions`.
+    Заливка растёт с tolerance, поэтому карта строится заливками для tolerance 0..max_tolerance
+    (в фоне, после штриха), а тик колёсика — это одно сравнение карты с порогом.
+    Карта хранится отдельно для каждого значения стартовых точек (только в прямоугольнике, куда может дойти заливка):
+    при новых штрихах пересчитываются только значения, чьи точки изменились или рядом с чьей областью
+    менялась запретная зона.
+    """
+
+    def __init__(self, image, max_tolerance=50, connectivity=4):
+        """
+        :param image: одноканальное изображение uint8
+        :param max_tolerance: наибольший tolerance, для которого строится карта
+        :param connectivity: связность (4 или 8)
+        """
+        if max_tolerance >= UNREACHABLE:
+            raise ValueError(f"max_tolerance must be less than {UNREACHABLE}")
+        self.image = image
+        self.max_tolerance = max_tolerance
+        self.connectivity = connectivity
+        self.shape = image.shape[:2]
+        self.seeds = np.zeros((0, 2), dtype=np.int32)
+        self.barrier = make_barrier(self.shape)
+        self.map = np.full(self.shape, UNREACHABLE, dtype=np.uint8)
+
+        self._work = self.barrier.copy()  # маска для cv2.floodFill, между вызовами совпадает с barrier
+        self._scratch = np.full(self.shape, UNREACHABLE, dtype=np.uint8)  # между вызовами заполнена UNREACHABLE
+        self._levels = {}  # значение стартовых точек -> (точки, прямоугольник, карта в прямоугольнике или None)
+
+    def update(self, seeds, forbidden=None, changed_rect=None):
+        """
+        Обновляет карту под новые стартовые точки и запретную зону.
+        :param seeds: массив (N, 2) координат (x, y)
+        :param forbidden: маска запретной зоны
+        :param changed_rect: прямоугольник, вне которого запретная зона не менялась с прошлого обновления.
+                             None — пересчитать всё
+        """
+        if changed_rect is None:
+            self.barrier = make_barrier(self.shape, forbidden)
+            self._work = self.barrier.copy()
+            self._levels = {}
+        else:
+            changed_rect = clip_rect(changed_rect, self.shape)
+            if changed_rect is not None and forbidden is not None:
+                x0, y0, x1, y1 = changed_rect
+                self.barrier[y0 + 1:y1 + 1, x0 + 1:x1 + 1] = forbidden[y0:y1, x0:x1] != 0
+                self._work[y0 + 1:y1 + 1, x0 + 1:x1 + 1] = self.barrier[y0 + 1:y1 + 1, x0 + 1:x1 + 1]
+        self.seeds = np.asarray(seeds, dtype=np.int32).reshape(-1, 2)
+
+        groups = {int(value): points for value, points in group_seeds(self.image, self.seeds)}
+        for value in [value for value in self._levels if value not in groups]:
+            del self._levels[value]
+        for value, points in groups.items():
+            level = self._levels.get(value)
+            if level is not None and np.array_equal(level[0], points):
+                # Заливка могла измениться, только если запретная зона менялась в её области или вплотную к ней
+                if not intersects(expand_rect(level[1], 1, self.shape), changed_rect):
+                    continue
+            self._levels[value] = (points,) + self._build_level(points)
+
+        self.map.fill(UNREACHABLE)
+        for _, rect, levels in self._levels.values():
+            if levels is not None:
+                x0, y0, x1, y1 = rect
+                np.minimum(self.map[y0:y1, x0:x1], levels, out=self.map[y0:y1, x0:x1])
+
+    def fill(self, tolerance):
+        """Маска заливки для заданного tolerance (залитые пиксели равны 255)."""
+        if tolerance > self.max_tolerance:
+            return grow_regions(self.image, self.seeds, tolerance, self.barrier[1:-1, 1:-1], self.connectivity)
+        return np.array(self.map <= tolerance, dtype=np.uint8) * 255
+
+    def _build_level(self, points):
+        """
+        Карта tolerance для точек с одинаковым значением: заливки для tolerance 0..max_tolerance,
+        каждый пиксель получает первый tolerance, при котором его залило.
+        :return: (прямоугольник, карта в прямоугольнике или None, если все точки в запретной зоне)
+        """
+        xs, ys = points[:, 0], points[:, 1]
+        points_rect = (int(xs.min()), int(ys.min()), int(xs.max()) + 1, int(ys.max()) + 1)
+        filled_rect = None
+        for tolerance in range(self.max_tolerance + 1):
+            rect = fill_from_points(self.image, self._work, points, tolerance, self.connectivity)
+            if rect is None:
+                break
+            filled_rect = union_rect(filled_rect, rect)
+            x0, y0, x1, y1 = rect
+            work = self._work[y0 + 1:y1 + 1, x0 + 1:x1 + 1]
+            scratch = self._scratch[y0:y1, x0:x1]
+            scratch[(work == 255) & (scratch == UNREACHABLE)] = tolerance
+            work[...] = self.barrier[y0 + 1:y1 + 1, x0 + 1:x1 + 1]  # Следующая заливка — снова от точек
+        if filled_rect is None:
+            return points_rect, None
+
+        x0, y0, x1, y1 = filled_rect
+        levels = self._scratch[y0:y1, x0:x1].copy()
+        self._scratch[y0:y1, x0:x1] = UNREACHABLE
+        return union_rect(filled_rect, points_rect), self._crop_levels(levels, filled_rect, points_rect)
+
+    @staticmethod
+    def _crop_levels(levels, filled_rect, rect):
+        """Дополняет карту из filled_rect до прямоугольника rect."""
+        rect = union_rect(filled_rect, rect)
+        if rect == filled_rect:
+            return levels
+        result = np.full((rect[3] - rect[1], rect[2] - rect[0]), UNREACHABLE, dtype=np.uint8)
+        dx, dy = filled_rect[0] - rect[0], filled_rect[1] - rect[1]
+        result[dy:dy + levels.shape[0], dx:dx + levels.shape[1]] = levels
+        return result
@@ -0,0 +1,117 @@
+import numpy as np
+
+
+class LabelStatistics:
+    """
+    Статистика разметки по меткам: количество пикселей, площадь в мм², сумма и сумма квадратов HU
+    и гистограмма HU (по ней — минимум и максимум: при стирании их не пересчитать по суммам).
+    Обновляется только по изменённым пикселям — тем же (индексы, прежние и новые значения), что пишет история правок,
+    поэтому штрих стоит пропорционально своему размеру, а не размеру кадра.
+    """
+
+    def __init__(self, hu_index, hu_min=0, spacing=(1, 1)):
+        """
+        :param hu_index: значения HU минус hu_min (неотрицательные целые) размером с маску
+        :param hu_min: наименьшее значение HU
+        :param spacing: размер пикселя в мм (PixelSpacing)
+        """
+        self.values = np.asarray(hu_index).ravel()
+        self.hu_min = int(hu_min)
+        self.bins = int(self.values.max()) + 1 if self.values.size else 1
+        self.pixel_area = float(spacing[0]) * float(spacing[1])  # площадь пикселя в мм²
+        self._labels = {}  # метка -> [количество, сумма HU, сумма квадратов HU, гистограмма]
+
+    @classmethod
+    def from_engine(cls, engine, spacing=(1, 1)):
+        """Статистика по сырым значениям исследования из движка windowing'а (без копирования)."""
+        return cls(engine.hu_index, engine.hu_min, spacing)
+
+    @classmethod
+    def from_mask(cls, mask, hu, spacing=(1, 1)):
+        """Статистика готовой разметки по массиву HU (для работы без окон)."""
+        hu = np.asarray(hu, dtype=np.int32)
+        hu_min = int(hu.min()) if hu.size else 0
+        statistics = cls(hu - hu_min, hu_min, spacing)
+        statistics.reset(mask)
+        return statistics
+
+    def reset(self, mask):
+        """
+        Пересчитывает статистику по всей разметке: гистограммы всех меток — одним bincount по ключу
+        (номер метки, значение), количества и суммы — по гистограммам.
+        """
+        self._labels = {}
+        labels = np.asarray(mask).ravel()
+        labelled = np.flatnonzero(labels)
+        if len(labelled) == 0:
+            return
+        labels = labels[labelled]
+        present = np.flatnonzero(np.bincount(labels))
+        index = np.zeros(int(present[-1]) + 1, dtype=np.int64)
+        index[present] = np.arange(len(present))
+        keys = index[labels] * self.bins + self.values[labelled]
+        histograms = np.bincount(keys, minlength=len(present) * self.bins).reshape(len(present), self.bins)
+        hu = np.arange(self.bins, dtype=np.int64) + self.hu_min
+        for label, histogram in zip(present, histograms):
+            self._labels[int(label)] = [int(histogram.sum()), int(np.dot(histogram, hu)),
+                                        int(np.dot(histogram, hu * hu)), histogram]
+
+    def update(self, indices, before, after):
+        """
+        Учитывает правку разметки.
+        :param indices: плоские индексы изменённых пикселей
+        :param before: прежние метки этих пикселей
+        :param after: новые метки
+        """
+        if len(indices) == 0:
+            return
+        values = self.values[indices]
+        for labels, sign in ((before, -1), (after, 1)):
+            for label in np.unique(labels):
+                if label != 0:
+                    self._add(int(label), values[labels == label], sign)
+
+    def _add(self, label, values, sign):
+        entry = self._labels.get(label)
+        if entry is None:
+            entry = self._labels[label] = [0, 0, 0, np.zeros(self.bins, dtype=np.int64)]
+        hu = np.asarray(values, dtype=np.int64) + self.hu_min
+        entry[0] += sign * len(values)
+        entry[1] += sign * int(hu.sum())
+        entry[2] += sign * int(np.dot(hu, hu))
+        # Гистограмма меняется только во встреченных значениях: штрих не платит за весь диапазон HU
+        present, counts = np.unique(values, return_counts=True)
+        entry[3][present] += sign * counts
+
+    def count(self, label):
+        """Количество пикселей метки."""
+        entry = self._labels.get(label)
+        return 0 if entry is None else entry[0]
+
+    def counts(self):
+        """Количество пикселей для каждой непустой метки."""
+        return {label: entry[0] for label, entry in self._labels.items() if entry[0] > 0}
+
+    def summary(self, label):
+        """
+        Сводка по метке: количество пикселей, площадь в мм², среднее, стандартное отклонение,
+        минимум и максимум HU. Для пустой метки — None.
+        """
+        entry = self._labels.get(label)
+        if entry is None or entry[0] <= 0:
+            return None
+        count, total, squares, histogram = entry
+        mean = total / count
+        present = np.flatnonzero(histogram)
+        return {
+            'count': count,
+            'area': count * self.pixel_area,
+            'mean': mean,
+            'std': float(np.sqrt(max(squares / count - mean * mean, 0))),
+            'min': int(present[0]) + self.hu_min,
+            'max': int(present[-1]) + self.hu_min,
+        }
+
+    def summaries(self):
+        """Сводки по всем непустым меткам: {метка: сводка}."""
+        return {label: self.summary(label) for label in sorted(self.counts())}
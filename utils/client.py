@@ -0,0 +1,97 @@
+import json
+import os
+import time
+import urllib.error
+import urllib.request
+
+from app.constants import *
+from utils.io.masks import encode_mask, decode_mask
+from utils.service import encode_bytes, decode_bytes, decode_image
+
+
+class ServiceError(Exception):
+    """Сервис недоступен или отклонил запрос; status — код HTTP ответа (None, если ответа нет)."""
+
+    def __init__(self, message, status=None):
+        super(ServiceError, self).__init__(message)
+        self.status = status
+
+
+class ServiceClient:
+    """Клиент локального сервиса разметки (`service.py`). Перегрузку (503) переживает повторами с паузой."""
+
+    def __init__(self, url, timeout=30, retries=3):
+        """
+        :param url: адрес сервиса, например http://127.0.0.1:8765
+        :param timeout: таймаут запроса, в секундах
+        :param retries: сколько раз повторить запрос, отклонённый из-за перегрузки
+        """
+        self.url = url.rstrip('/')
+        self.timeout = timeout
+        self.retries = retries
+
+    @classmethod
+    def from_environment(cls, variable='MEDICAL_ANNOTATOR_SERVICE'):
+        """Клиент по адресу из переменной окружения или None, если сервис не задан."""
+        url = os.environ.get(variable)
+        return cls(url) if url else None
+
+    def request(self, endpoint, payload=None):
+        """POST (или GET без payload) с JSON; возвращает ответ как словарь."""
+        data = None if payload is None else json.dumps(payload).encode()
+        for attempt in range(self.retries + 1):
+            request = urllib.request.Request(self.url + endpoint, data, {'Content-Type': 'application/json'})
+            try:
+                with urllib.request.urlopen(request, timeout=self.timeout) as response:
+                    return json.loads(response.read())
+            except urllib.error.HTTPError as error:
+                if error.code != 503 or attempt == self.retries:
+                    raise ServiceError(f"{endpoint}: {error.read().decode(errors='replace')}", error.code)
+                time.sleep(float(error.headers.get('Retry-After', 1)) * (attempt + 1) / self.retries)
+            except (urllib.error.URLError, OSError) as error:
+                raise ServiceError(f"{endpoint}: {error}")
+
+    @staticmethod
+    def _windowing(window_center, window_width, inverted):
+        return {'window_center': window_center, 'window_width': window_width, 'inverted': inverted}
+
+    def open_study(self, path):
+        """Открывает исследование в сервисе: {shape, windowing, spacing, sop_uid}."""
+        return self.request('/study', {'path': os.path.abspath(path)})
+
+    def windowed(self, path, window_center=None, window_width=None, inverted=None):
+        """Изображение после windowing'а (по умолчанию — windowing из файла)."""
+        payload = dict(self._windowing(window_center, window_width, inverted), path=os.path.abspath(path))
+        return decode_image(self.request('/windowing', payload)['image'])
+
+    def denoised(self, path, window_center=None, window_width=None, inverted=None):
+        """Изображение без шума, как `FloodFillWindow.blurred_image`."""
+        payload = dict(self._windowing(window_center, window_width, inverted), path=os.path.abspath(path))
+        return decode_image(self.request('/denoise', payload)['image'])
+
+    def floodfill(self, path, labels, tolerance, window_center=None, window_width=None, inverted=None,
+                  label=COLOR_POSITIVE):
+        """Маска заливки класса label от карты меток разметки, как `floodfill_labels`."""
+        payload = dict(self._windowing(window_center, window_width, inverted), path=os.path.abspath(path),
+                       labels=encode_bytes(encode_mask(labels)), tolerance=int(tolerance), label=int(label))
+        return decode_mask(decode_bytes(self.request('/floodfill', payload)['flood']))
+
+    def save_mask(self, path, labels):
+        """
+        Сохраняет карту меток рядом с исследованием; возвращает путь файла разметки.
+        Исследование должно быть открыто в сервисе (`open_study` или любой запрос по нему), иначе 403.
+        """
+        payload = {'path': os.path.abspath(path), 'labels': encode_bytes(encode_mask(labels))}
+        return self.request('/mask/save', payload)['saved']
+
+    def load_mask(self, path):
+        """Карта меток, сохранённая рядом с исследованием, или None. Исследование должно быть открыто в сервисе."""
+        try:
+            return decode_mask(decode_bytes(self.request('/mask/load', {'path': os.path.abspath(path)})['labels']))
+        except ServiceError as error:
+            if error.status == 404:
+                return None
+            raise
+
+    def stats(self):
+        return self.request('/stats')
@@ -1,2 +1,6 @@
 from .simple_figures import *
 from .text import *
+from .overlay import *
+from .strokes import *
+from .viewport import *
+from .palette import *
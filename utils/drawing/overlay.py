@@ -0,0 +1,102 @@
+from cv2 import cv2
+import numpy as np
+
+from app.constants import *
+from utils.analysis.contours import find_label_boundaries
+from utils.analysis.rects import clip_rect, expand_rect, union_rect, circle_rect, intersect_rect, subtract_rect
+
+
+class OverlayCompositor:
+    """
+    Наложение разметки на изображение с перерисовкой только изменившихся областей.
+    Кадр с разметкой (`frame`) хранится между вызовами, перерисовывается лишь «грязный» прямоугольник.
+    Курсор и временные линии рисуются в отдельный буфер (`output`) и затираются из `frame` только в своей области.
+    Если задана видимая область, разметка пересчитывается только в ней, остальное — когда оно станет видно.
+    """
+
+    def __init__(self, image, labels, palette, alpha=0.25):
+        """
+        :param image: подложка в BGR (может обновляться на месте, тогда нужно вызвать `invalidate()`)
+        :param labels: функция, возвращающая метки разметки в прямоугольнике (x0, y0, x1, y1)
+        :param palette: словарь {метка: цвет BGR}
+        :param alpha: непрозрачность заливки разметки
+        """
+        self.image = image
+        self.labels = labels
+        self.alpha = alpha
+        self.palette = np.zeros((256, 3), dtype=np.uint8)  # таблица цветов: метка -> цвет, одна на все классы
+
+        self.shape = image.shape[:2]
+        self.frame = np.zeros(image.shape, dtype=np.uint8)  # подложка с разметкой
+        self.output = np.zeros(image.shape, dtype=np.uint8)  # кадр с курсором
+        self._dirty_rect = (0, 0, self.shape[1], self.shape[0])  # что нужно перерисовать
+        self._dynamic_rect = None  # где нарисованы курсор и временные линии
+        self.changed_rect = None  # где `output` изменился при последнем `render()`
+        self.set_palette(palette)
+
+    def set_palette(self, palette):
+        """Задаёт цвета меток {метка: цвет BGR} (остальные метки не отображаются) и перерисовывает кадр."""
+        self.palette[:] = 0
+        for label, color in palette.items():
+            self.palette[label] = color
+        self.invalidate()
+
+    def invalidate(self, rect=None):
+        """Помечает прямоугольник (или весь кадр) для перерисовки при следующем `render()`."""
+        rect = (0, 0, self.shape[1], self.shape[0]) if rect is None else clip_rect(rect, self.shape)
+        self._dirty_rect = union_rect(self._dirty_rect, rect)
+
+    def render(self, cursor=None, radius=CURSOR_SIZE, color=COLOR_WHITE, visible=None, paths=()):
+        """
+        Возвращает готовый кадр. Перерисовываются только изменившиеся области, курсор и линии.
+        :param visible: видимый прямоугольник; None — весь кадр
+        :param paths: временные ломаные [(массив (N, 2) из (x, y), цвет)], которые видны только в этом кадре
+        """
+        self.changed_rect = None
+        if self._dirty_rect is not None:
+            rect = self._dirty_rect if visible is None else intersect_rect(self._dirty_rect, visible)
+            if rect is not None:
+                self.changed_rect = self._composite(rect)
+            self._dirty_rect = None if visible is None else subtract_rect(self._dirty_rect, visible)
+
+        # Стираем старый курсор и линии, восстанавливая их область из кадра
+        if self._dynamic_rect is not None:
+            x0, y0, x1, y1 = self._dynamic_rect
+            self.output[y0:y1, x0:x1] = self.frame[y0:y1, x0:x1]
+            self.changed_rect = union_rect(self.changed_rect, self._dynamic_rect)
+            self._dynamic_rect = None
+
+        if cursor is not None:
+            x, y = cursor
+            cv2.circle(self.output, (x, y), radius, color, 1)
+            self._dynamic_rect = expand_rect(circle_rect(x, y, radius), 1, self.shape)
+        for points, path_color in paths:
+            if len(points) == 0:
+                continue
+            cv2.polylines(self.output, [np.asarray(points, dtype=np.int32).reshape(-1, 1, 2)], False, path_color, 1)
+            x0, y0 = points.min(axis=0)
+            x1, y1 = points.max(axis=0)
+            self._dynamic_rect = union_rect(self._dynamic_rect, expand_rect((x0, y0, x1 + 1, y1 + 1), 1, self.shape))
+        self.changed_rect = union_rect(self.changed_rect, self._dynamic_rect)
+        return self.output
+
+    def _composite(self, rect):
+        # Изменение пикселя меняет границу у его соседей, поэтому расширяем область на 1 пиксель,
+        # а для поиска границ берём ещё 1 пиксель сверху
+        rect = expand_rect(rect, 1, self.shape)
+        source = expand_rect(rect, 1, self.shape)
+        x0, y0, x1, y1 = rect
+        dx, dy = x0 - source[0], y0 - source[1]
+
+        labels = self.labels(source)
+        boundaries = find_label_boundaries(labels)[dy:dy + y1 - y0, dx:dx + x1 - x0]
+        labels = labels[dy:dy + y1 - y0, dx:dx + x1 - x0]
+
+        # Заливка и контуры — один проход по палитре
+        colors = self.palette[labels]
+        frame = cv2.addWeighted(self.image[y0:y1, x0:x1], 1 - self.alpha, colors, self.alpha, 0)
+        frame[boundaries] = colors[boundaries]
+
+        self.frame[y0:y1, x0:x1] = frame
+        self.output[y0:y1, x0:x1] = frame
+        return rect
@@ -0,0 +1,114 @@
+import json
+from collections import namedtuple
+
+from cv2 import cv2
+import numpy as np
+
+from app.constants import *
+
+LabelClass = namedtuple('LabelClass', ['label', 'name', 'color'])
+
+
+def class_labels(count):
+    """Метки первых count классов: 1, затем 3, 4, ... (метка 2 — запретная зона)."""
+    labels = [label for label in range(1, 256) if label != COLOR_NEGATIVE]
+    if count > len(labels):
+        raise ValueError(f"At most {len(labels)} classes fit into uint8 labels, got {count}")
+    return labels[:count]
+
+
+def class_colors(count):
+    """
+    Различимые цвета BGR для count классов. Первый — зелёный, как у разметки без классов;
+    оттенки идут с шагом золотого сечения, красные пропускаются: красный — цвет запретной зоны.
+    """
+    colors = []
+    hue = 60.0  # зелёный в шкале оттенков OpenCV (0..180)
+    while len(colors) < count:
+        if 12 <= hue <= 168:
+            value = 255 if len(colors) < 10 else 170  # после первого круга оттенков — темнее
+            hsv = np.array([[[round(hue), 255, value]]], dtype=np.uint8)
+            colors.append(tuple(int(channel) for channel in cv2.cvtColor(hsv, cv2.COLOR_HSV2BGR)[0, 0]))
+        hue = (hue + 180 * 0.381966) % 180
+    return colors
+
+
+class ClassPalette:
+    """
+    Классы разметки (органы): метка в карте меток, название и цвет.
+    Запретная зона (COLOR_NEGATIVE) — не класс, она общая для всех классов, но её цвет тоже есть в палитре.
+    """
+
+    def __init__(self, classes):
+        """:param classes: список LabelClass"""
+        self.classes = list(classes)
+        labels = [item.label for item in self.classes]
+        if len(set(labels)) != len(labels) or any(label in (0, COLOR_NEGATIVE) for label in labels):
+            raise ValueError(f"Class labels must be unique and differ from 0 and {COLOR_NEGATIVE}: {labels}")
+        self._by_label = {item.label: item for item in self.classes}
+
+    @classmethod
+    def from_names(cls, names):
+        """Палитра по названиям классов: метки и цвета назначаются по порядку."""
+        names = list(names)
+        return cls(map(LabelClass, class_labels(len(names)), names, class_colors(len(names))))
+
+    @classmethod
+    def load(cls, path):
+        """
+        Палитра из JSON: список названий или объектов {"name", "label", "color"}.
+        Метка и цвет необязательны, по умолчанию — как у `from_names`.
+        """
+        with open(path) as file:
+            items = [{'name': item} if isinstance(item, str) else item for item in json.load(file)]
+        defaults = cls.from_names(item['name'] for item in items)
+        return cls(LabelClass(int(item.get('label', default.label)), item['name'],
+                              tuple(item.get('color', default.color)))
+                   for item, default in zip(items, defaults))
+
+    @classmethod
+    def default(cls):
+        """Палитра из файла MEDICAL_ANNOTATOR_CLASSES, если он задан, иначе из CLASS_NAMES."""
+        return cls.load(CLASSES_PATH) if CLASSES_PATH else cls.from_names(CLASS_NAMES)
+
+    def __len__(self):
+        return len(self.classes)
+
+    def __iter__(self):
+        return iter(self.classes)
+
+    def __getitem__(self, index):
+        return self.classes[index]
+
+    @property
+    def labels(self):
+        return [item.label for item in self.classes]
+
+    def name(self, label):
+        """Название класса по метке."""
+        if label == COLOR_NEGATIVE:
+            return "forbidden"
+        item = self._by_label.get(label)
+        return f"label {label}" if item is None else item.name
+
+    def index(self, label):
+        """Номер класса по метке или None."""
+        item = self._by_label.get(label)
+        return None if item is None else self.classes.index(item)
+
+    def extend(self, labels):
+        """Добавляет классы для меток, которых нет в палитре (например, из разметки с другой палитрой)."""
+        labels = [int(label) for label in labels if label not in (0, COLOR_NEGATIVE) and label not in self._by_label]
+        if not labels:
+            return []
+        colors = class_colors(len(self.classes) + len(labels))[len(self.classes):]
+        added = [LabelClass(label, f"label {label}", color) for label, color in zip(labels, colors)]
+        self.classes.extend(added)
+        self._by_label.update((item.label, item) for item in added)
+        return added
+
+    def colors(self):
+        """Словарь {метка: цвет BGR} для OverlayCompositor."""
+        colors = {item.label: item.color for item in self.classes}
+        colors[COLOR_NEGATIVE] = COLOR_RED
+        return colors
@@ -0,0 +1,70 @@
+from cv2 import cv2
+import numpy as np
+
+from utils.analysis.rects import clip_rect
+
+
+class Stroke:
+    """
+    Штрих кисти: точки, радиус и значение метки.
+    Точки копятся между кадрами и рисуются пачкой — толстой ломаной со скруглёнными концами,
+    поэтому быстрый штрих не рвётся, а рисование затрагивает только ограничивающий прямоугольник новых точек.
+    """
+
+    def __init__(self, value, radius):
+        self.value = value
+        self.radius = radius
+        self.points = []
+        self._drawn = 0  # сколько точек уже нарисовано
+
+    def add(self, x, y):
+        if not self.points or self.points[-1] != (x, y):
+            self.points.append((x, y))
+
+    @property
+    def pending(self):
+        """Есть ли ещё не нарисованные точки."""
+        return len(self.points) > self._drawn
+
+    @property
+    def geometry(self):
+        """Точки штриха, массив (N, 2) из (x, y)."""
+        return np.array(self.points, dtype=np.int32).reshape(-1, 2)
+
+    def pending_rect(self, shape):
+        """Прямоугольник, который затронут ещё не нарисованные точки (или None)."""
+        return self._rect(self._pending_points(), shape)
+
+    def rasterize(self, mask):
+        """Рисует в маске накопленные точки. Возвращает изменённый прямоугольник (или None)."""
+        rect = self._draw(mask, self._pending_points())
+        self._drawn = len(self.points)
+        return rect
+
+    def replay(self, mask):
+        """Рисует штрих целиком (например, повторно на другой маске)."""
+        return self._draw(mask, self.geometry)
+
+    def _pending_points(self):
+        # Новые точки продолжают уже нарисованную ломаную от её последней точки
+        return self.geometry[max(self._drawn - 1, 0):]
+
+    def _rect(self, points, shape):
+        if len(points) == 0:
+            return None
+        x0, y0 = points.min(axis=0) - self.radius - 1
+        x1, y1 = points.max(axis=0) + self.radius + 2
+        return clip_rect((x0, y0, x1, y1), shape)
+
+    def _draw(self, mask, points):
+        rect = self._rect(points, mask.shape)
+        if rect is None:
+            return None
+        x0, y0, x1, y1 = rect
+        view = mask[y0:y1, x0:x1]  # рисуем только внутри прямоугольника, координаты сдвигаем
+        points = np.array(points - (x0, y0), dtype=np.int32)
+        if len(points) == 1:
+            cv2.circle(view, tuple(int(c) for c in points[0]), self.radius, self.value, -1)
+        else:
+            cv2.polylines(view, [points.reshape(-1, 1, 2)], False, self.value, thickness=2 * self.radius + 1)
+        return rect
@@ -15,3 +15,10 @@ def draw_text(image, text, pos,
     image = cv2.rectangle(image, pos, (x + text_w, y + text_h), text_color_bg, -1)
     image = cv2.putText(image, text, (x, y + text_h + font_scale - 1), font, font_scale, text_color, font_thickness)
     return image
+
+
+def text_rect(text, pos, font=cv2.FONT_HERSHEY_PLAIN, font_scale=1, font_thickness=1):
+    """Прямоугольник (x0, y0, x1, y1), который займёт подпись draw_text в точке pos."""
+    x, y = pos
+    (text_w, text_h), baseline = cv2.getTextSize(text, font, font_scale, font_thickness)
+    return x, y, x + text_w + 1, y + text_h + font_scale + baseline + 1
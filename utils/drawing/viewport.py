@@ -0,0 +1,161 @@
+import math
+
+from cv2 import cv2
+import numpy as np
+
+from utils.analysis.rects import clip_rect, union_rect
+
+
+class ImagePyramid:
+    """
+    Пирамида уменьшенных копий кадра (каждый уровень вдвое меньше предыдущего), строится лениво.
+    Пиксель уровня — среднее блока 2x2 предыдущего уровня, поэтому после изменения части кадра
+    уровни пересчитываются только в соответствующих прямоугольниках.
+    """
+
+    def __init__(self, image):
+        self.levels = [image]
+        self._dirty = [None]  # что нужно пересчитать на каждом уровне (в его координатах)
+
+    @property
+    def base(self):
+        return self.levels[0]
+
+    def set_base(self, image):
+        """Заменяет кадр: все уровни будут построены заново."""
+        self.levels = [image]
+        self._dirty = [None]
+
+    def invalidate(self, rect=None):
+        """Помечает изменившийся прямоугольник кадра (None — весь кадр)."""
+        for index in range(1, len(self.levels)):
+            shape = self.levels[index].shape
+            if rect is None:
+                level_rect = (0, 0, shape[1], shape[0])
+            else:
+                scale = 2 ** index
+                x0, y0, x1, y1 = rect
+                level_rect = clip_rect((x0 // scale, y0 // scale, -(-x1 // scale), -(-y1 // scale)), shape)
+            self._dirty[index] = union_rect(self._dirty[index], level_rect)
+
+    def level(self, index):
+        """
+        Уровень index (0 — сам кадр), достроенный и обновлённый при необходимости.
+        Возвращает (номер уровня, изображение): у совсем маленьких кадров уровней может быть меньше.
+        """
+        while len(self.levels) <= index:
+            previous = self.levels[-1]
+            height, width = previous.shape[0] // 2, previous.shape[1] // 2
+            if height == 0 or width == 0:
+                index = len(self.levels) - 1
+                break
+            self.levels.append(cv2.resize(previous[:2 * height, :2 * width], (width, height),
+                                          interpolation=cv2.INTER_AREA))
+            self._dirty.append(None)
+        for current in range(1, index + 1):
+            rect = self._dirty[current]
+            if rect is not None:
+                x0, y0, x1, y1 = rect
+                source = self.levels[current - 1][2 * y0:2 * y1, 2 * x0:2 * x1]
+                self.levels[current][y0:y1, x0:x1] = cv2.resize(source, (x1 - x0, y1 - y0),
+                                                                interpolation=cv2.INTER_AREA)
+                self._dirty[current] = None
+        return index, self.levels[index]
+
+
+class Viewport:
+    """
+    Видимая часть изображения: масштаб (пикселей окна на пиксель изображения) и центр.
+    Окно имеет постоянный размер — изображение, вписанное в max_size; крупнее масштаба вписывания
+    изображение можно приблизить и двигать.
+    """
+
+    def __init__(self, image_shape, max_size=1200, max_scale=16):
+        self.image_shape = image_shape[:2]
+        self.fit_scale = min(1.0, max_size / max(self.image_shape))
+        self.view_shape = (max(1, round(self.image_shape[0] * self.fit_scale)),
+                           max(1, round(self.image_shape[1] * self.fit_scale)))
+        self.max_scale = max_scale
+        self.reset()
+
+    def reset(self):
+        """Показывает изображение целиком."""
+        self.scale = self.fit_scale
+        self.center = (self.image_shape[1] / 2, self.image_shape[0] / 2)
+
+    @property
+    def identity(self):
+        """Окно показывает изображение 1:1 целиком — преобразование не нужно."""
+        return self.scale == 1 and self.view_shape == self.image_shape
+
+    @property
+    def origin(self):
+        """Координаты изображения, которые попадают в левый верхний угол окна."""
+        return (self.center[0] - self.view_shape[1] / (2 * self.scale),
+                self.center[1] - self.view_shape[0] / (2 * self.scale))
+
+    def to_image(self, x, y):
+        """Пиксель окна -> пиксель изображения (с обрезкой по изображению)."""
+        x0, y0 = self.origin
+        return (min(max(int(x0 + (x + 0.5) / self.scale), 0), self.image_shape[1] - 1),
+                min(max(int(y0 + (y + 0.5) / self.scale), 0), self.image_shape[0] - 1))
+
+    def to_view(self, x, y):
+        """Пиксель изображения -> пиксель окна."""
+        x0, y0 = self.origin
+        return int((x + 0.5 - x0) * self.scale), int((y + 0.5 - y0) * self.scale)
+
+    def points_to_view(self, points):
+        """Массив (N, 2) пикселей изображения -> пиксели окна."""
+        return np.array((np.asarray(points, dtype=np.float64) + 0.5 - self.origin) * self.scale, dtype=np.int32)
+
+    def image_rect(self):
+        """Видимый прямоугольник изображения (с запасом в пиксель на округление)."""
+        x0, y0 = self.origin
+        x1 = x0 + self.view_shape[1] / self.scale
+        y1 = y0 + self.view_shape[0] / self.scale
+        return clip_rect((math.floor(x0) - 1, math.floor(y0) - 1, math.ceil(x1) + 1, math.ceil(y1) + 1),
+                         self.image_shape)
+
+    def zoom(self, factor, anchor=None):
+        """
+        Меняет масштаб в factor раз.
+        :param anchor: пиксель окна, который должен остаться на месте (по умолчанию — центр окна)
+        """
+        if anchor is None:
+            anchor = (self.view_shape[1] / 2, self.view_shape[0] / 2)
+        x, y = self.to_image(*anchor)
+        self.scale = min(max(self.scale * factor, self.fit_scale), self.max_scale)
+        # Точка под anchor остаётся на месте
+        self.center = (x + 0.5 - (anchor[0] - self.view_shape[1] / 2) / self.scale,
+                       y + 0.5 - (anchor[1] - self.view_shape[0] / 2) / self.scale)
+        self._clamp()
+
+    def pan(self, dx, dy):
+        """Сдвигает изображение на (dx, dy) пикселей окна."""
+        self.center = (self.center[0] - dx / self.scale, self.center[1] - dy / self.scale)
+        self._clamp()
+
+    def _clamp(self):
+        # Видимая область не выходит за изображение; если изображение меньше окна — оно по центру
+        center = []
+        for value, size, view_size in zip(self.center, self.image_shape[::-1], self.view_shape[::-1]):
+            half = view_size / (2 * self.scale)
+            center.append(size / 2 if 2 * half >= size else min(max(value, half), size - half))
+        self.center = tuple(center)
+
+    def level(self):
+        """Уровень пирамиды, с которого выгоднее всего брать пиксели при текущем масштабе."""
+        return max(0, int(math.floor(math.log2(1 / self.scale)))) if self.scale < 1 else 0
+
+    def render(self, pyramid):
+        """Кадр окна: видимая часть нужного уровня пирамиды, приведённая к размеру окна."""
+        level, image = pyramid.level(self.level())
+        x0, y0 = self.origin
+        # Пиксель уровня u — среднее пикселей изображения [u * 2^level, (u + 1) * 2^level), его центр
+        # лежит в точке (u + 0.5) * 2^level; пиксель окна v — в точке origin + (v + 0.5) / scale
+        factor = self.scale * 2 ** level  # пикселей окна на пиксель уровня
+        matrix = np.array([[factor, 0, (0.5 - x0 / 2 ** level) * factor - 0.5],
+                           [0, factor, (0.5 - y0 / 2 ** level) * factor - 0.5]], dtype=np.float64)
+        interpolation = cv2.INTER_NEAREST if factor >= 1 else cv2.INTER_LINEAR
+        return cv2.warpAffine(image, matrix, self.view_shape[::-1], flags=interpolation)
@@ -0,0 +1,173 @@
+import itertools
+import weakref
+from collections import deque
+
+import numpy as np
+
+
+def diff_region(mask, before, rect):
+    """
+    Сравнивает участок маски с его прежним содержимым.
+    :param before: копия участка rect до изменения
+    :return: (плоские индексы изменённых пикселей, прежние значения, новые значения)
+    """
+    x0, y0, x1, y1 = rect
+    after = mask[y0:y1, x0:x1]
+    changed = before != after
+    ys, xs = np.nonzero(changed)
+    indices = (ys + y0) * mask.shape[1] + (xs + x0)
+    return np.array(indices, dtype=np.int64), before[changed], after[changed]
+
+
+class MaskEdit:
+    """
+    Одна правка маски: изменённые пиксели, их прежние и новые значения и прямоугольник правки.
+    Для штрихов кисти хранится и сам штрих, чтобы правку можно было повторить на другой маске.
+    """
+    __slots__ = ('indices', 'before', 'after', 'rect', 'geometry', 'serial')
+
+    def __init__(self, indices, before, after, rect, geometry=None, serial=0):
+        self.indices = indices
+        self.before = before
+        self.after = after
+        self.rect = rect
+        self.geometry = geometry
+        self.serial = serial  # порядковый номер правки среди всех историй с общим бюджетом
+
+    @property
+    def nbytes(self):
+        return self.indices.nbytes + self.before.nbytes + self.after.nbytes
+
+
+class HistoryBudget:
+    """
+    Бюджет памяти, общий для нескольких историй правок (например, историй всех срезов серии).
+    Если истории вместе его превышают, забываются самые старые правки среди всех историй.
+    """
+
+    def __init__(self, memory_budget=64 * 2 ** 20):
+        """:param memory_budget: сколько байт можно занять под все истории"""
+        self.memory_budget = memory_budget
+        self._histories = weakref.WeakSet()  # история, которую больше не используют, бюджет не занимает
+        self._serials = itertools.count()
+
+    @property
+    def nbytes(self):
+        return sum(history.nbytes for history in self._histories)
+
+    def register(self, history):
+        self._histories.add(history)
+
+    def serial(self):
+        """Номер следующей правки: по нему находится самая старая правка среди историй."""
+        return next(self._serials)
+
+    def enforce(self):
+        """Забывает самые старые правки, пока истории не уложатся в бюджет."""
+        nbytes = self.nbytes
+        while nbytes > self.memory_budget:
+            histories = [history for history in self._histories if history.oldest_serial is not None]
+            if not histories:
+                break
+            nbytes -= min(histories, key=lambda history: history.oldest_serial).forget_oldest()
+
+
+class EditHistory:
+    """
+    История правок маски для undo/redo.
+    Хранятся только изменённые пиксели, поэтому и память, и время отмены пропорциональны размеру правки.
+    Если истории превышают бюджет памяти (свой или общий HistoryBudget), самые старые правки забываются.
+    """
+
+    def __init__(self, shape, memory_budget=64 * 2 ** 20, budget=None):
+        """
+        :param shape: размеры маски
+        :param memory_budget: сколько байт можно занять под историю, если общего бюджета нет
+        :param budget: HistoryBudget, общий с другими историями
+        """
+        self.shape = shape
+        self.budget = budget if budget is not None else HistoryBudget(memory_budget)
+        self.budget.register(self)
+        self.nbytes = 0
+        self._index_dtype = np.int32 if shape[0] * shape[1] < 2 ** 31 else np.int64
+        self._undo = deque()
+        self._redo = []
+        self._pending = []  # части незавершённой правки (например, штриха)
+
+    def record(self, indices, before, after):
+        """Добавляет изменения к текущей правке."""
+        if len(indices):
+            self._pending.append((indices, before, after))
+
+    def commit(self, geometry=None):
+        """
+        Завершает текущую правку. Возвращает её или None, если ничего не изменилось.
+        :param geometry: чем сделана правка (например, Stroke), хранится вместе с ней
+        """
+        if not self._pending:
+            return None
+        indices, before, after = (np.concatenate(parts) for parts in zip(*self._pending))
+        self._pending = []
+
+        # Пиксель мог меняться несколько раз: берём самое первое прежнее и самое последнее новое значение
+        unique, first = np.unique(indices, return_index=True)
+        _, last = np.unique(indices[::-1], return_index=True)
+        before, after = before[first], after[::-1][last]
+        changed = before != after
+        unique, before, after = unique[changed], before[changed], after[changed]
+        if len(unique) == 0:
+            return None
+
+        ys, xs = np.divmod(unique, self.shape[1])
+        rect = (int(xs.min()), int(ys.min()), int(xs.max()) + 1, int(ys.max()) + 1)
+        edit = MaskEdit(np.array(unique, dtype=self._index_dtype), before, after, rect, geometry, self.budget.serial())
+        self._undo.append(edit)
+        self.nbytes += edit.nbytes
+
+        # Новая правка делает отменённые правки неактуальными
+        self.nbytes -= sum(dropped.nbytes for dropped in self._redo)
+        self._redo = []
+
+        # Укладываемся в бюджет, забывая самые старые правки (возможно, других историй)
+        self.budget.enforce()
+        return edit
+
+    @property
+    def oldest_serial(self):
+        """
+        Номер правки, которую можно забыть первой, или None: самая старая из отменяемых или та отменённая,
+        что повторяется последней (без неё остальные отменённые правки по-прежнему можно повторить).
+        """
+        serials = [edits[0].serial for edits in (self._undo, self._redo) if edits]
+        return min(serials) if serials else None
+
+    def forget_oldest(self):
+        """Забывает правку с номером `oldest_serial`; возвращает, сколько байт освободилось."""
+        if self._undo and (not self._redo or self._undo[0].serial < self._redo[0].serial):
+            nbytes = self._undo.popleft().nbytes
+        else:
+            nbytes = self._redo.pop(0).nbytes
+        self.nbytes -= nbytes
+        return nbytes
+
+    def undo(self, mask):
+        """
+        Отменяет последнюю правку. Возвращает её (MaskEdit) или None.
+        Перерисовать нужно `edit.rect`, пиксели `edit.indices` получили значения `edit.before`.
+        """
+        self.commit()
+        if not self._undo:
+            return None
+        edit = self._undo.pop()
+        np.put(mask, edit.indices, edit.before)
+        self._redo.append(edit)
+        return edit
+
+    def redo(self, mask):
+        """Повторяет отменённую правку. Возвращает её (MaskEdit) или None."""
+        if self._pending or not self._redo:
+            return None
+        edit = self._redo.pop()
+        np.put(mask, edit.indices, edit.after)
+        self._undo.append(edit)
+        return edit
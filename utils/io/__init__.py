@@ -0,0 +1,4 @@
+from .cache import *
+from .series import *
+from .masks import *
+from .index import *
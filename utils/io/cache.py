@@ -0,0 +1,171 @@
+import hashlib
+import os
+import tempfile
+from contextlib import contextmanager
+
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+
+class ArrayCache:
+    """
+    Кеш массивов NumPy на диске: по файлу `.npy` на ключ, запись атомарная.
+    Если задан предельный размер, лишними удаляются давно не использованные файлы (время использования — mtime,
+    оно обновляется при каждом попадании). Кеш может одновременно использоваться несколькими процессами:
+    вытеснение — под файловой блокировкой.
+    """
+
+    def __init__(self, directory, max_bytes=None):
+        """:param max_bytes: предельный размер кеша в байтах (None — без ограничения)"""
+        self.directory = directory
+        self.max_bytes = max_bytes
+
+    @staticmethod
+    def key(*parts):
+        """Ключ кеша из произвольных значений (SOPInstanceUID, параметры и т.д.)."""
+        return hashlib.sha1(repr(parts).encode()).hexdigest()
+
+    def path(self, key):
+        return os.path.join(self.directory, key + '.npy')
+
+    def get(self, key, mmap_mode=None):
+        """Массив по ключу или None, если его нет в кеше."""
+        try:
+            array = np.load(self.path(key), mmap_mode=mmap_mode)
+        except (FileNotFoundError, ValueError, OSError):
+            return None
+        if self.max_bytes is not None:
+            self._touch(key)
+        return array
+
+    def put(self, key, array):
+        """Сохраняет массив. Пишем во временный файл и переименовываем, чтобы не оставить битый файл."""
+        os.makedirs(self.directory, exist_ok=True)
+        handle, temp_path = tempfile.mkstemp(suffix='.tmp', dir=self.directory)
+        try:
+            with os.fdopen(handle, 'wb') as file:
+                np.save(file, array)
+            os.replace(temp_path, self.path(key))
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+        if self.max_bytes is not None:
+            self.evict()
+
+    def get_or_compute(self, key, function, *args, **kwargs):
+        """Берёт массив из кеша, а если его нет — вычисляет и сохраняет."""
+        array = self.get(key)
+        if array is None:
+            array = function(*args, **kwargs)
+            self.put(key, array)
+        return array
+
+    def evict(self):
+        """Удаляет давно не использованные файлы, пока кеш больше `max_bytes`."""
+        with self._locked():
+            entries = []
+            with os.scandir(self.directory) as iterator:
+                for entry in iterator:
+                    if not entry.name.endswith('.npy'):
+                        continue
+                    try:
+                        stat = entry.stat()
+                    except FileNotFoundError:
+                        continue
+                    entries.append((stat.st_mtime, stat.st_size, entry.path))
+            total = sum(size for _, size, _ in entries)
+            # Уже отображённые в память файлы остаются доступны открывшим их процессам и после удаления
+            for _, size, path in sorted(entries):
+                if total <= self.max_bytes:
+                    break
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+                total -= size
+
+    def _touch(self, key):
+        try:
+            os.utime(self.path(key))
+        except OSError:
+            pass
+
+    @contextmanager
+    def _locked(self):
+        # Вытеснение в нескольких процессах сразу удалило бы лишнее; без fcntl (Windows) работаем без блокировки
+        if fcntl is None:
+            yield
+            return
+        with open(os.path.join(self.directory, '.lock'), 'a') as file:
+            fcntl.flock(file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(file, fcntl.LOCK_UN)
+
+
+class PixelCache(ArrayCache):
+    """
+    Кеш декодированных пикселей DICOM (сжатых JPEG 2000, JPEG-LS и т.д.),
+    ключ — SOPInstanceUID, путь, размер и время изменения файла.
+    Повторное открытие исследования не декодирует пиксели: возвращается отображённый в память массив
+    только для чтения. Общий размер кеша ограничен, как у ArrayCache с max_bytes.
+    """
+
+    def __init__(self, directory, max_bytes=2 * 2 ** 30, compressed_only=True):
+        """
+        :param max_bytes: предельный размер кеша в байтах
+        :param compressed_only: кешировать только сжатые файлы (несжатые и так читаются без декодирования)
+        """
+        super(PixelCache, self).__init__(directory, max_bytes)
+        self.compressed_only = compressed_only
+
+    @staticmethod
+    def file_signature(path):
+        """
+        Путь, размер и время изменения файла: изменённый файл с тем же SOPInstanceUID не возьмёт старые пиксели.
+        Берётся из stat, поэтому попадание в кеш не читает файл целиком.
+        """
+        stat = os.stat(path)
+        return os.path.abspath(path), stat.st_size, stat.st_mtime_ns
+
+    def cacheable(self, dataset):
+        """Стоит ли кешировать пиксели этого DICOM."""
+        if not isinstance(getattr(dataset, 'filename', None), str) or 'SOPInstanceUID' not in dataset:
+            return False
+        if not self.compressed_only:
+            return True
+        transfer_syntax = getattr(getattr(dataset, 'file_meta', None), 'TransferSyntaxUID', None)
+        return transfer_syntax is not None and transfer_syntax.is_compressed
+
+    def lookup(self, header):
+        """
+        Закешированные пиксели (массив только для чтения) или None.
+        Хватает заголовка (`stop_before_pixels=True`): при попадании файл с пикселями не читается.
+        """
+        if not self.cacheable(header):
+            return None
+        return self.get(self.key(str(header.SOPInstanceUID), self.file_signature(header.filename)), mmap_mode='r')
+
+    def pixels(self, dataset):
+        """
+        Пиксели прочитанного DICOM (`pydicom.dcmread` без stop_before_pixels).
+        При попадании в кеш — отображённый в память массив только для чтения, иначе — `pixel_array`.
+        """
+        if not self.cacheable(dataset):
+            return dataset.pixel_array
+        array = self.lookup(dataset)
+        if array is not None:
+            return array
+        key = self.key(str(dataset.SOPInstanceUID), self.file_signature(dataset.filename))
+        array = dataset.pixel_array
+        try:
+            self.put(key, array)
+        except OSError:
+            pass  # Кеш — только ускорение: без места на диске работаем без него
+        return array
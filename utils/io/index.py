@@ -0,0 +1,224 @@
+import os
+import sqlite3
+from collections import namedtuple
+
+import numpy as np
+
+from utils.io.series import HEADER_ERRORS, SliceInfo, read_header, slice_info
+from utils.workers import get_executor
+
+# Строки выдачи индекса
+StudyInfo = namedtuple('StudyInfo', ['study_uid', 'patient_id', 'study_date', 'description', 'series_count'])
+SeriesInfo = namedtuple('SeriesInfo', ['series_uid', 'study_uid', 'modality', 'description', 'directory',
+                                       'slice_count'])
+ScanResult = namedtuple('ScanResult', ['added', 'updated', 'removed', 'unchanged'])
+
+_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS files (
+    path TEXT PRIMARY KEY,
+    mtime REAL NOT NULL,
+    size INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS studies (
+    study_uid TEXT PRIMARY KEY,
+    patient_id TEXT,
+    study_date TEXT,
+    description TEXT
+);
+CREATE TABLE IF NOT EXISTS series (
+    series_uid TEXT PRIMARY KEY,
+    study_uid TEXT NOT NULL,
+    modality TEXT,
+    description TEXT
+);
+CREATE TABLE IF NOT EXISTS instances (
+    path TEXT PRIMARY KEY REFERENCES files(path) ON DELETE CASCADE,
+    series_uid TEXT NOT NULL,
+    sop_uid TEXT,
+    position REAL,
+    rows INTEGER,
+    columns INTEGER,
+    dtype TEXT,
+    window_center INTEGER,
+    window_width INTEGER,
+    intercept INTEGER,
+    slope INTEGER,
+    inverted INTEGER,
+    spacing_row REAL,
+    spacing_column REAL
+);
+CREATE INDEX IF NOT EXISTS instances_series ON instances(series_uid);
+CREATE INDEX IF NOT EXISTS series_study ON series(study_uid);
+'''
+
+_INSTANCE_COLUMNS = ', '.join(('path', 'series_uid', 'sop_uid', 'position', 'rows', 'columns', 'dtype',
+                               'window_center', 'window_width', 'intercept', 'slope', 'inverted', 'spacing_row',
+                               'spacing_column'))
+_INSERT_INSTANCE = f'INSERT INTO instances ({_INSTANCE_COLUMNS}) VALUES ({", ".join("?" * 14)})'
+
+
+def read_record(path):
+    """
+    Читает заголовок файла для индекса (в рабочем потоке).
+    :return: (строка instances, строка series, строка studies) или None, если это не изображение DICOM
+             или заголовок испорчен: такой файл пропускается, а не прерывает сканирование всего архива
+    """
+    header = read_header(path)
+    if header is None:
+        return None
+    try:
+        return _record(path, header)
+    except HEADER_ERRORS as error:
+        print(f"Skipping {path}: malformed header ({error!r})")
+        return None
+
+
+def _record(path, header):
+    info = slice_info(path, header)
+    if info is None:
+        return None
+    window_center, window_width, intercept, slope, inverted = info.windowing
+    spacing_row, spacing_column = (tuple(info.spacing) + (1.0, 1.0))[:2]
+    study_uid = str(header.get('StudyInstanceUID', ''))
+    instance = (path, info.series_uid, info.sop_uid, info.position, info.rows, info.columns, info.dtype.str,
+                window_center, window_width, intercept, slope, int(inverted), spacing_row, spacing_column)
+    series = (info.series_uid, study_uid, str(header.get('Modality', '')), str(header.get('SeriesDescription', '')))
+    study = (study_uid, str(header.get('PatientID', '')), str(header.get('StudyDate', '')),
+             str(header.get('StudyDescription', '')))
+    return instance, series, study
+
+
+class StudyIndex:
+    """
+    Локальный индекс исследований в SQLite: исследования, серии и срезы с windowing'ом по умолчанию.
+    Заполняется только по заголовкам DICOM, пиксели при сканировании не читаются.
+    Повторное сканирование перечитывает лишь новые и изменившиеся (по mtime и размеру) файлы.
+    """
+
+    def __init__(self, path):
+        """
+        :param path: файл базы; ':memory:' — индекс только на время работы
+        """
+        if path != ':memory:':
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.path = path
+        self._connection = sqlite3.connect(path)
+        self._connection.execute('PRAGMA foreign_keys = ON')
+        self._connection.execute('PRAGMA journal_mode = WAL')
+        self._connection.executescript(_SCHEMA)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        self._connection.close()
+
+    def scan(self, directory, batch_size=256):
+        """
+        Добавляет в индекс DICOM файлы из папки (рекурсивно) и убирает из него удалённые.
+        Заголовки читаются параллельно, в базу записываются пачками по batch_size файлов.
+        """
+        prefix = os.path.join(os.path.abspath(directory), '')
+        known = {path: (mtime, size) for path, mtime, size in self._connection.execute(
+            'SELECT path, mtime, size FROM files WHERE substr(path, 1, ?) = ?', (len(prefix), prefix))}
+
+        found = {}
+        for root, _, names in os.walk(prefix):
+            for name in names:
+                path = os.path.join(root, name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                found[path] = (stat.st_mtime, stat.st_size)
+
+        changed = sorted(path for path, state in found.items() if known.get(path) != state)
+        removed = [path for path in known if path not in found]
+        updated = sum(path in known for path in changed)
+
+        with self._connection:
+            self._connection.executemany('DELETE FROM files WHERE path = ?', ((path,) for path in removed))
+        records = get_executor().map(read_record, changed)
+        for start in range(0, len(changed), batch_size):
+            paths = changed[start:start + batch_size]
+            self._store(paths, [next(records) for _ in paths], found)
+        if removed or changed:
+            self._drop_orphans()
+        return ScanResult(len(changed) - updated, updated, len(removed), len(found) - len(changed))
+
+    def _store(self, paths, records, states):
+        with self._connection:
+            self._connection.executemany('INSERT OR REPLACE INTO files (path, mtime, size) VALUES (?, ?, ?)',
+                                         ((path,) + states[path] for path in paths))
+            # Файлы, которые не являются изображениями, остаются только в files, чтобы не читать их снова
+            self._connection.executemany('DELETE FROM instances WHERE path = ?', ((path,) for path in paths))
+            records = [record for record in records if record is not None]
+            self._connection.executemany('INSERT OR REPLACE INTO studies VALUES (?, ?, ?, ?)',
+                                         (study for _, _, study in records))
+            self._connection.executemany('INSERT OR REPLACE INTO series VALUES (?, ?, ?, ?)',
+                                         (series for _, series, _ in records))
+            self._connection.executemany(_INSERT_INSTANCE, (instance for instance, _, _ in records))
+
+    def _drop_orphans(self):
+        with self._connection:
+            self._connection.execute('DELETE FROM series WHERE series_uid NOT IN (SELECT series_uid FROM instances)')
+            self._connection.execute('DELETE FROM studies WHERE study_uid NOT IN (SELECT study_uid FROM series)')
+
+    def studies(self):
+        """Все исследования индекса."""
+        rows = self._connection.execute(
+            'SELECT studies.*, COUNT(series.series_uid) FROM studies '
+            'LEFT JOIN series ON series.study_uid = studies.study_uid '
+            'GROUP BY studies.study_uid ORDER BY studies.study_date, studies.study_uid')
+        return [StudyInfo(*row) for row in rows]
+
+    def series(self, study_uid=None, directory=None):
+        """
+        Серии индекса (по убыванию количества срезов).
+        :param study_uid: только серии этого исследования
+        :param directory: только срезы, лежащие в этой папке
+        """
+        query = ('SELECT series.*, MIN(instances.path), COUNT(*) FROM series '
+                 'JOIN instances ON instances.series_uid = series.series_uid WHERE 1')
+        params = []
+        if study_uid is not None:
+            query += ' AND series.study_uid = ?'
+            params.append(study_uid)
+        if directory is not None:
+            prefix = os.path.join(os.path.abspath(directory), '')
+            query += ' AND substr(instances.path, 1, ?) = ?'
+            params += [len(prefix), prefix]
+        query += ' GROUP BY series.series_uid ORDER BY COUNT(*) DESC, series.series_uid'
+        return [SeriesInfo(*row[:4], os.path.dirname(row[4]), row[5])
+                for row in self._connection.execute(query, params)]
+
+    def slices(self, series_uid=None, directory=None):
+        """
+        Срезы серии в виде SliceInfo, отсортированные по положению — их можно сразу передать в DicomSeries.
+        :param series_uid: какую серию брать; по умолчанию — самую большую
+        :param directory: искать только среди срезов из этой папки
+        """
+        if series_uid is None:
+            candidates = self.series(directory=directory)
+            if not candidates:
+                raise FileNotFoundError(f"No DICOM images in {directory}" if directory else "Index is empty")
+            series_uid = candidates[0].series_uid
+        query = f'SELECT {_INSTANCE_COLUMNS} FROM instances WHERE series_uid = ?'
+        params = [series_uid]
+        if directory is not None:
+            prefix = os.path.join(os.path.abspath(directory), '')
+            query += ' AND substr(path, 1, ?) = ?'
+            params += [len(prefix), prefix]
+        rows = self._connection.execute(query + ' ORDER BY position, path', params)
+        return [self._slice_info(row) for row in rows]
+
+    @staticmethod
+    def _slice_info(row):
+        (path, series_uid, sop_uid, position, rows, columns, dtype, window_center, window_width, intercept, slope,
+         inverted, spacing_row, spacing_column) = row
+        windowing = [window_center, window_width, intercept, slope, bool(inverted)]
+        return SliceInfo(path, series_uid, sop_uid, position, rows, columns, np.dtype(dtype), windowing,
+                         (spacing_row, spacing_column))
@@ -0,0 +1,164 @@
+import os
+import struct
+import tempfile
+import zipfile
+
+import numpy as np
+
+# Формат .rle: заголовок, смещения строк, значения серий, длины серий.
+# Серии не переходят через границу строки, поэтому любую полосу строк можно прочитать, не декодируя остальные
+MASK_EXTENSION = '.rle'
+_MAGIC = b'MRLE'
+_VERSION = 1
+_HEADER = struct.Struct('<4sBBxxIII')  # magic, версия, размер длины серии в байтах, высота, ширина, число серий
+
+
+def encode_mask(labels):
+    """Кодирует карту меток uint8 построчным RLE."""
+    labels = np.ascontiguousarray(labels, dtype=np.uint8)
+    height, width = labels.shape
+
+    # Серия начинается в начале каждой строки и там, где метка меняется
+    starts = np.ones(labels.shape, dtype=bool)
+    starts[:, 1:] = labels[:, 1:] != labels[:, :-1]
+    flat_starts = np.flatnonzero(starts)
+    values = labels.reshape(-1)[flat_starts]
+    length_dtype = np.uint16 if width <= 0xFFFF else np.uint32
+    lengths = np.array(np.diff(np.append(flat_starts, labels.size)), dtype=length_dtype)
+    row_offsets = np.zeros(height + 1, dtype=np.uint32)
+    np.cumsum(starts.sum(axis=1), out=row_offsets[1:])
+
+    header = _HEADER.pack(_MAGIC, _VERSION, lengths.itemsize, height, width, len(values))
+    return b''.join((header, row_offsets.tobytes(), values.tobytes(), lengths.tobytes()))
+
+
+def decode_mask(data, rect=None):
+    """
+    Декодирует карту меток.
+    :param rect: прямоугольник (x0, y0, x1, y1), если нужна только часть карты; обрезается по размерам карты,
+                 прямоугольник вне карты — ValueError
+    """
+    return _decode(_BytesReader(data), rect)
+
+
+def save_mask(path, labels):
+    """Сохраняет карту меток. Запись атомарная."""
+    directory = os.path.dirname(os.path.abspath(path))
+    handle, temp_path = tempfile.mkstemp(suffix='.tmp', dir=directory)
+    try:
+        with os.fdopen(handle, 'wb') as file:
+            file.write(encode_mask(labels))
+        os.replace(temp_path, path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+
+def load_mask(path, rect=None):
+    """Читает карту меток из файла. Для прямоугольника читаются только нужные строки."""
+    with open(path, 'rb') as file:
+        return _decode(file, rect)
+
+
+class MaskArchive:
+    """
+    Набор масок в одном zip-архиве (по записи .rle на маску) для выгрузки результатов пакетной обработки.
+    Записи хранятся без сжатия, поэтому части масок читаются так же, как из отдельных файлов.
+    """
+
+    def __init__(self, path, mode='r'):
+        self._zip = zipfile.ZipFile(path, mode, compression=zipfile.ZIP_STORED)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def __contains__(self, name):
+        return name + MASK_EXTENSION in self._zip.NameToInfo
+
+    def names(self):
+        return [name[:-len(MASK_EXTENSION)] for name in self._zip.namelist() if name.endswith(MASK_EXTENSION)]
+
+    def write(self, name, labels):
+        self.write_encoded(name, encode_mask(labels))
+
+    def write_encoded(self, name, data):
+        """Записывает уже закодированную маску (например, содержимое файла .rle)."""
+        self._zip.writestr(name + MASK_EXTENSION, data)
+
+    def read(self, name, rect=None):
+        with self._zip.open(name + MASK_EXTENSION) as file:
+            return _decode(file, rect)
+
+    def close(self):
+        self._zip.close()
+
+
+def export_masks(path, masks):
+    """
+    Выгружает маски в архив.
+    :param masks: пары (имя, карта меток) или (имя, путь к файлу .rle)
+    """
+    with MaskArchive(path, 'w') as archive:
+        for name, labels in masks:
+            if isinstance(labels, str):
+                with open(labels, 'rb') as file:
+                    archive.write_encoded(name, file.read())
+            else:
+                archive.write(name, labels)
+
+
+class _BytesReader:
+    """Минимальный аналог файла для декодирования из bytes без копирования."""
+
+    def __init__(self, data):
+        self._data = memoryview(data)
+        self._position = 0
+
+    def seek(self, position):
+        self._position = position
+
+    def read(self, size):
+        chunk = self._data[self._position:self._position + size]
+        self._position += size
+        return chunk
+
+
+def _clip(rect, width, height):
+    """Обрезает прямоугольник по размерам карты, как срез массива; пустой прямоугольник — ошибка."""
+    x0, y0, x1, y1 = rect
+    x0, y0 = max(int(x0), 0), max(int(y0), 0)
+    x1, y1 = min(int(x1), width), min(int(y1), height)
+    if x0 >= x1 or y0 >= y1:
+        raise ValueError(f"Rect {tuple(rect)} is outside the {width}x{height} mask")
+    return x0, y0, x1, y1
+
+
+def _decode(file, rect):
+    magic, version, length_size, height, width, runs = _HEADER.unpack(bytes(file.read(_HEADER.size)))
+    if magic != _MAGIC or version != _VERSION:
+        raise ValueError("Not a mask file")
+    length_dtype = np.uint16 if length_size == 2 else np.uint32
+
+    x0, y0, x1, y1 = (0, 0, width, height) if rect is None else _clip(rect, width, height)
+    offsets_start = _HEADER.size
+    values_start = offsets_start + 4 * (height + 1)
+    lengths_start = values_start + runs
+
+    # Смещения серий для нужных строк
+    file.seek(offsets_start + 4 * y0)
+    first, last = np.frombuffer(file.read(4 * (y1 - y0 + 1)), dtype=np.uint32)[[0, -1]]
+    first, last = int(first), int(last)
+
+    file.seek(values_start + first)
+    values = np.frombuffer(file.read(last - first), dtype=np.uint8)
+    file.seek(lengths_start + length_size * first)
+    lengths = np.frombuffer(file.read(length_size * (last - first)), dtype=length_dtype)
+
+    labels = np.repeat(values, lengths).reshape(y1 - y0, width)
+    if x0 != 0 or x1 != width:
+        labels = labels[:, x0:x1].copy()
+    return labels
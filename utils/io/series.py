@@ -0,0 +1,211 @@
+import os
+import tempfile
+import threading
+from collections import OrderedDict, namedtuple, Counter
+from concurrent.futures import wait
+
+import numpy as np
+import pydicom
+from pydicom.errors import InvalidDicomError
+
+from utils.preprocessing.dicom_transforms import get_windowing
+from utils.preprocessing.windowing import WindowingEngine
+from utils.workers import get_executor
+
+# Заголовок среза, достаточный для сортировки серии и выделения памяти под том
+SliceInfo = namedtuple('SliceInfo', ['path', 'series_uid', 'sop_uid', 'position', 'rows', 'columns', 'dtype',
+                                     'windowing', 'spacing'])
+
+
+def pixel_dtype(header):
+    """Тип пикселей по BitsAllocated и PixelRepresentation."""
+    bits = int(header.get('BitsAllocated', 16))
+    signed = int(header.get('PixelRepresentation', 0)) == 1
+    return np.dtype(('int' if signed else 'uint') + str(max(bits, 8)))
+
+
+def slice_position(header):
+    """Положение среза вдоль нормали к его плоскости (или номер среза, если ориентации нет)."""
+    try:
+        orientation = np.array(header.ImageOrientationPatient, dtype=np.float64)
+        position = np.array(header.ImagePositionPatient, dtype=np.float64)
+        return float(np.dot(np.cross(orientation[:3], orientation[3:]), position))
+    except (AttributeError, ValueError):
+        return float(header.get('InstanceNumber', 0) or 0)
+
+
+# Ошибки чтения заголовка: не DICOM, нет доступа или битые значения тегов (pydicom разбирает их лениво,
+# поэтому ValueError и TypeError появляются уже при чтении значений, например пустого WindowCenter)
+HEADER_ERRORS = (InvalidDicomError, OSError, ValueError, TypeError, KeyError, AttributeError)
+
+
+def read_header(path):
+    """Читает только заголовок DICOM (без пикселей). Возвращает None, если это не DICOM или файл не читается."""
+    try:
+        return pydicom.dcmread(path, stop_before_pixels=True)
+    except HEADER_ERRORS:
+        return None
+
+
+def read_slice_info(path):
+    """
+    Читает только заголовок DICOM. Возвращает SliceInfo или None, если это не изображение
+    или заголовок испорчен (такой файл пропускается, а не прерывает чтение всей папки).
+    """
+    header = read_header(path)
+    if header is None:
+        return None
+    try:
+        return slice_info(path, header)
+    except HEADER_ERRORS as error:
+        print(f"Skipping {path}: malformed header ({error!r})")
+        return None
+
+
+def slice_info(path, header):
+    """SliceInfo по уже прочитанному заголовку или None, если это не одноканальное изображение."""
+    if 'Rows' not in header or int(header.get('SamplesPerPixel', 1)) != 1:
+        return None
+    spacing = tuple(float(value) for value in header.get('PixelSpacing', (1, 1)))
+    return SliceInfo(path, str(header.get('SeriesInstanceUID', '')), str(header.get('SOPInstanceUID', '')),
+                     slice_position(header), int(header.Rows), int(header.Columns), pixel_dtype(header),
+                     get_windowing(header), spacing)
+
+
+def index_series(directory, series_uid=None):
+    """
+    Находит срезы серии в папке и сортирует их по положению.
+    :param series_uid: какую серию брать; по умолчанию — самую большую
+    """
+    paths = sorted(os.path.join(root, name) for root, _, names in os.walk(directory) for name in names)
+    slices = [info for info in get_executor().map(read_slice_info, paths) if info is not None]
+    if not slices:
+        raise FileNotFoundError(f"No DICOM images in {directory}")
+    if series_uid is None:
+        series_uid = Counter(info.series_uid for info in slices).most_common(1)[0][0]
+    slices = [info for info in slices if info.series_uid == series_uid]
+    return sorted(slices, key=lambda info: info.position)
+
+
+class DicomSeries:
+    """
+    Серия срезов с ленивой загрузкой.
+    Пиксели декодируются только при первом обращении к срезу и складываются в том, отображённый в память
+    (временный файл), так что повторное обращение не требует декодирования, а память ограничена страницами ОС.
+    Срезы, которые уже есть в PixelCache, не декодируются и не копируются в том: берётся файл кеша.
+    Для последних срезов хранятся движки windowing'а (LRU), соседние срезы подготавливаются в фоне.
+    """
+
+    def __init__(self, slices, cache_size=16, prefetch=2, pixel_cache=None):
+        """
+        :param slices: список SliceInfo, отсортированный по положению
+        :param cache_size: сколько срезов с готовым windowing'ом держать в памяти
+        :param prefetch: сколько соседних срезов с каждой стороны готовить заранее
+        :param pixel_cache: PixelCache для декодированных пикселей между запусками или None
+        """
+        self.slices = slices
+        self.pixel_cache = pixel_cache
+        self.cache_size = max(cache_size, 2 * prefetch + 1)
+        self.prefetch_count = prefetch
+        first = slices[0]
+        self.shape = (len(slices), first.rows, first.columns)
+
+        self._volume_file = tempfile.TemporaryFile()
+        self.volume = np.memmap(self._volume_file, dtype=first.dtype, mode='w+', shape=self.shape)
+        self._decoded = np.zeros(len(slices), dtype=bool)  # срез декодирован в том
+        self._cached = {}  # индекс -> массив из PixelCache (отображённый в память файл кеша)
+
+        self._lock = threading.Lock()
+        self._cache = OrderedDict()  # индекс -> (заголовок, движок windowing'а)
+        self._tasks = {}  # индекс -> Future фоновой подготовки
+
+    @classmethod
+    def from_directory(cls, directory, series_uid=None, **kwargs):
+        return cls(index_series(directory, series_uid), **kwargs)
+
+    def __len__(self):
+        return len(self.slices)
+
+    @property
+    def slice_spacing(self):
+        """Расстояние между соседними срезами в мм (медиана по серии, 1 — если срез один)."""
+        positions = [info.position for info in self.slices]
+        return float(np.median(np.abs(np.diff(positions)))) if len(positions) > 1 else 1.0
+
+    def pixels(self, index):
+        """
+        Сырые пиксели среза: массив из PixelCache, если срез там есть (без декодирования и копирования),
+        иначе вид на отображённый в память том. Массив нельзя изменять.
+        """
+        cached = self._cached.get(index)
+        if cached is not None:
+            return cached
+        if not self._decoded[index]:
+            path = self.slices[index].path
+            if self.pixel_cache is not None:
+                cached = self.pixel_cache.lookup(pydicom.dcmread(path, stop_before_pixels=True))
+                if cached is not None and cached.shape == self.shape[1:]:
+                    self._cached[index] = cached
+                    return cached
+            dataset = pydicom.dcmread(path)
+            self.volume[index] = dataset.pixel_array if self.pixel_cache is None else self.pixel_cache.pixels(dataset)
+            self._decoded[index] = True
+        return self.volume[index]
+
+    def load(self, index, windowing=None):
+        """
+        Заголовок и движок windowing'а для среза. Если срез уже готовится в фоне, ждём его.
+        :param windowing: значения windowing'а, которые нужно применить заранее
+        """
+        with self._lock:
+            task = self._tasks.get(index)
+        if task is not None:
+            wait([task])
+
+        with self._lock:
+            cached = self._cache.get(index)
+            if cached is not None:
+                self._cache.move_to_end(index)
+        if cached is None:
+            cached = self._build(index, windowing)
+            self._remember(index, cached)
+        return cached
+
+    def prefetch(self, index, windowing=None):
+        """Готовит в фоне соседние срезы."""
+        for offset in range(1, self.prefetch_count + 1):
+            for neighbour in (index + offset, index - offset):
+                if not 0 <= neighbour < len(self):
+                    continue
+                with self._lock:
+                    if neighbour in self._cache or neighbour in self._tasks:
+                        continue
+                    self._tasks[neighbour] = get_executor().submit(self._prefetch, neighbour, windowing)
+
+    def _prefetch(self, index, windowing):
+        try:
+            self._remember(index, self._build(index, windowing))
+        finally:
+            with self._lock:
+                self._tasks.pop(index, None)
+
+    def _build(self, index, windowing):
+        info = self.slices[index]
+        header = pydicom.dcmread(info.path, stop_before_pixels=True)
+        engine = WindowingEngine(self.pixels(index), *info.windowing[2:4])
+        if windowing is not None:
+            window_center, window_width, _, _, inverted = windowing
+            engine.apply(window_center, window_width, inverted)
+        return header, engine
+
+    def _remember(self, index, value):
+        with self._lock:
+            self._cache[index] = value
+            self._cache.move_to_end(index)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+
+    def close(self):
+        """Освобождает временный файл тома и файлы кеша пикселей."""
+        self._cached = {}
+        self._volume_file.close()
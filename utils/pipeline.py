@@ -0,0 +1,88 @@
+import numpy as np
+import pydicom
+
+from app.constants import *
+from utils.analysis.region_growing import find_seed_points, grow_regions
+from utils.analysis.statistics import LabelStatistics
+from utils.preprocessing.denoising import cached_denoise
+from utils.preprocessing.dicom_transforms import get_windowing
+from utils.preprocessing.image_transforms import remove_small_dots
+from utils.preprocessing.windowing import WindowingEngine
+
+# Без HighGUI: эти функции используются и окнами, и пакетной обработкой
+
+
+def read_windowed_survey(path, windowing=None, pixel_cache=None):
+    """
+    Читает DICOM и применяет windowing (по умолчанию — из файла).
+    :param pixel_cache: PixelCache для декодированных пикселей или None
+    :return: объект DICOM, одноканальное изображение uint8, значения windowing'а
+    """
+    survey = pydicom.dcmread(path)
+    windowing = list(windowing or get_windowing(survey))
+    pixels = survey.pixel_array if pixel_cache is None else pixel_cache.pixels(survey)
+    engine = WindowingEngine(pixels, *windowing[2:4])
+    engine.apply(windowing[0], windowing[1], windowing[4])
+    return survey, engine.gray, windowing
+
+
+def object_labels(labels):
+    """Метки классов, которые есть в разметке (без запретной зоны), по возрастанию."""
+    present = np.flatnonzero(np.bincount(np.asarray(labels, dtype=np.uint8).ravel()))
+    return [int(label) for label in present if label not in (0, COLOR_NEGATIVE)]
+
+
+def floodfill_labels(blurred_image, labels, tolerance, connectivity=4, label=COLOR_POSITIVE):
+    """
+    Заливка по разметке класса label, как в FloodFillWindow: стартовые точки — контуры и центры разметки класса,
+    запретная зона и разметка других классов — барьеры для заливки, мелкие дырки после заливки убираются.
+    :return: маска заливки (0 — не залито)
+    """
+    class_mask = np.array(labels == label, dtype=np.uint8)
+    flood_mask = grow_regions(blurred_image, find_seed_points(class_mask), tolerance,
+                              forbidden=(labels != 0) & (labels != label), connectivity=connectivity)
+    return remove_small_dots(flood_mask)
+
+
+def merge_flood(labels, flood_mask, label=COLOR_POSITIVE):
+    """Добавляет заливку к разметке меткой класса label, не трогая уже размеченные пиксели."""
+    labels = labels.copy()
+    labels[(labels == 0) & (flood_mask != 0)] = label
+    return labels
+
+
+def floodfill_classes(blurred_image, labels, tolerance, connectivity=4):
+    """
+    Заливка всех классов разметки по очереди (по возрастанию метки); залитое одним классом — барьер для следующих.
+    :return: карта меток с добавленной заливкой
+    """
+    for label in object_labels(labels):
+        labels = merge_flood(labels, floodfill_labels(blurred_image, labels, tolerance, connectivity, label), label)
+    return labels
+
+
+def segment_survey(path, labels, tolerance=10, denoise_power=7, cache=None, pixel_cache=None):
+    """
+    Полный конвейер для одного исследования: windowing -> denoise -> заливка каждого класса -> очистка.
+    :return: карта меток с добавленной заливкой
+    """
+    survey, image, windowing = read_windowed_survey(path, pixel_cache=pixel_cache)
+    blurred_image = cached_denoise(image, uid=survey.get('SOPInstanceUID'), cache=cache,
+                                   windowing=tuple(windowing), power=denoise_power)
+    return floodfill_classes(blurred_image, labels, tolerance)
+
+
+def survey_statistics(path, labels, pixel_cache=None):
+    """
+    Статистика разметки исследования, как в окне: {метка: сводка} с площадью в мм² и HU.
+    :param labels: карта меток той же формы, что и изображение
+    """
+    survey = pydicom.dcmread(path)
+    windowing = get_windowing(survey)
+    pixels = survey.pixel_array if pixel_cache is None else pixel_cache.pixels(survey)
+    engine = WindowingEngine(pixels, *windowing[2:4])
+    if labels.shape != engine.hu_index.shape:
+        raise ValueError(f"Labels have shape {labels.shape}, expected {engine.hu_index.shape}")
+    statistics = LabelStatistics.from_engine(engine, survey.get('PixelSpacing', (1, 1)))
+    statistics.reset(labels)
+    return statistics.summaries()
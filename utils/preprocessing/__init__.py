@@ -1,2 +1,5 @@
 from .dicom_transforms import *
 from .image_transforms import *
+from .windowing import *
+from .denoising import *
+from .morphology import *
@@ -0,0 +1,17 @@
+from utils.preprocessing.image_transforms import denoise
+
+
+def cached_denoise(image, uid=None, cache=None, windowing=None, power=7, temp_window_size=7, search_window_size=21):
+    """
+    Подавление шума с кешем на диске.
+    Ключ — SOPInstanceUID, windowing, при котором получено изображение, и параметры denoise.
+    :param image: одноканальное изображение uint8
+    :param uid: SOPInstanceUID исследования (без него кеш не используется)
+    :param cache: ArrayCache или None
+    :param windowing: значения windowing'а, с которыми получено изображение
+    """
+    params = dict(power=power, temp_window_size=temp_window_size, search_window_size=search_window_size)
+    if cache is None or uid is None:
+        return denoise(image, **params)
+    key = cache.key('denoise', str(uid), windowing, sorted(params.items()))
+    return cache.get_or_compute(key, denoise, image, **params)
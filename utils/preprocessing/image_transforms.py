@@ -1,6 +1,8 @@
 from cv2 import cv2
 import numpy as np
 
+from utils.preprocessing.morphology import select_components
+
 
 def denoise(image, power=13, temp_window_size=7, search_window_size=21):
     denoised = cv2.fastNlMeansDenoising(image, None, power, temp_window_size, search_window_size)
@@ -19,17 +21,10 @@ def transform_to_contours(image):
     return image
 
 
-def remove_small_dots(image):
-    binary_map = image.copy()
-    binary_map = 255 - binary_map  # invert
-    nlabels, labels, stats, centroids = cv2.connectedComponentsWithStats(binary_map, None, None, None, 8, cv2.CV_32S)
-    areas = stats[1:, cv2.CC_STAT_AREA]
-    result = np.zeros(labels.shape, np.uint8)
-    for i in range(nlabels - 1):
-        if areas[i] <= 10:
-            result[labels == i + 1] = 1
-    result = cv2.bitwise_or(result, image)
-    return result
+def remove_small_dots(image, max_area=10):
+    """Заливает значением 1 мелкие (не больше max_area пикселей) дыры в маске заливки."""
+    holes = select_components(255 - image, max_area=max_area)
+    return cv2.bitwise_or(np.array(holes, dtype=np.uint8), image)
 
 
 def erode(image, kernel_size):
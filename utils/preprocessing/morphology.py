@@ -0,0 +1,80 @@
+from cv2 import cv2
+import numpy as np
+
+
+def area_in_pixels(area, spacing):
+    """
+    Переводит площадь из мм² в пиксели.
+    :param spacing: размер пикселя в мм (PixelSpacing: между строками, между столбцами)
+    """
+    return area / (float(spacing[0]) * float(spacing[1]))
+
+
+def component_areas(mask, connectivity=8):
+    """Карта компонент связности ненулевых пикселей и площадь каждой компоненты (для фона — индекс 0)."""
+    binary = np.array(mask != 0, dtype=np.uint8)
+    _, labels, stats, _ = cv2.connectedComponentsWithStats(binary, None, None, None, connectivity, cv2.CV_32S)
+    return labels, stats[:, cv2.CC_STAT_AREA]
+
+
+def select_components(mask, min_area=0, max_area=None, connectivity=8):
+    """
+    Булева маска компонент, площадь которых лежит в [min_area, max_area].
+    Вместо сравнения всего кадра с каждой меткой строится таблица «метка -> оставить» и применяется за один проход.
+    """
+    labels, areas = component_areas(mask, connectivity)
+    keep = areas >= min_area
+    if max_area is not None:
+        keep &= areas <= max_area
+    keep[0] = False
+    return keep[labels]
+
+
+def remove_small_objects(mask, min_area, spacing=None, connectivity=8):
+    """
+    Убирает из маски компоненты площадью меньше min_area.
+    :param spacing: если задан, min_area указана в мм²
+    """
+    if spacing is not None:
+        min_area = area_in_pixels(min_area, spacing)
+    result = mask.copy()
+    result[~select_components(mask, min_area, connectivity=connectivity)] = 0
+    return result
+
+
+def fill_small_holes(mask, max_area, value=255, spacing=None, connectivity=8):
+    """
+    Заливает значением value дыры (компоненты фона) площадью не больше max_area.
+    Фон, касающийся края изображения, тоже считается дырой, если он достаточно мал.
+    :param spacing: если задан, max_area указана в мм²
+    """
+    if spacing is not None:
+        max_area = area_in_pixels(max_area, spacing)
+    result = mask.copy()
+    result[select_components(mask == 0, max_area=max_area, connectivity=connectivity)] = value
+    return result
+
+
+def fill_holes(mask, value=255, connectivity=4):
+    """Заливает значением value все дыры — компоненты фона, не касающиеся края изображения."""
+    labels, _ = component_areas(mask == 0, connectivity)
+    keep = np.ones(labels.max() + 1, dtype=bool)
+    keep[0] = False
+    keep[np.unique(np.concatenate((labels[0], labels[-1], labels[:, 0], labels[:, -1])))] = False
+    result = mask.copy()
+    result[keep[labels]] = value
+    return result
+
+
+def _kernel(radius):
+    return cv2.getStructuringElement(cv2.MORPH_ELLIPSE, (2 * radius + 1, 2 * radius + 1))
+
+
+def opening(mask, radius=1):
+    """Размыкание круглым элементом радиуса radius: убирает выступы и мостики тоньше элемента."""
+    return cv2.morphologyEx(mask, cv2.MORPH_OPEN, _kernel(radius))
+
+
+def closing(mask, radius=1):
+    """Замыкание круглым элементом радиуса radius: закрывает щели и вмятины уже элемента."""
+    return cv2.morphologyEx(mask, cv2.MORPH_CLOSE, _kernel(radius))
@@ -0,0 +1,75 @@
+from cv2 import cv2
+import numpy as np
+
+
+class WindowingEngine:
+    """
+    Windowing через таблицу соответствия (LUT).
+    Пересчитанные в HU значения считаются один раз на исследование и хранятся как индексы в таблице,
+    сама таблица перестраивается только при изменении WC/WW/инверсии.
+    Результат каждый раз пишется в одни и те же буферы `gray` и `image`.
+    """
+
+    def __init__(self, pixels, intercept=0, slope=1):
+        """
+        :param pixels: сырые значения пикселей исследования (pixel_array)
+        :param intercept: Rescale Intercept
+        :param slope: Rescale Slope
+        """
+        hu = np.asarray(pixels, dtype=np.int32) * int(slope) + int(intercept)  # значения в HU
+        self.intercept = intercept
+        self.slope = slope
+        self.hu_min = int(hu.min())
+        self.hu_max = int(hu.max())
+
+        # Индекс пикселя в таблице: для 8-битного диапазона можно использовать cv2.LUT
+        lut_size = self.hu_max - self.hu_min + 1
+        index_dtype = np.uint8 if lut_size <= 256 else np.uint16 if lut_size <= 65536 else np.uint32
+        self._index = np.array(hu - self.hu_min, dtype=index_dtype)
+
+        self.gray = np.zeros(hu.shape, dtype=np.uint8)  # результат windowing'а
+        self.image = np.zeros(hu.shape + (3,), dtype=np.uint8)  # тот же результат в BGR
+        self._lut = None
+        self._lut_key = None  # значения windowing'а, для которых построена таблица
+
+    @property
+    def hu_index(self):
+        """Значения исследования в HU минус `hu_min` (без копирования, только для чтения)."""
+        return self._index
+
+    @property
+    def hu(self):
+        """Значения исследования в HU (создаётся новый массив)."""
+        return np.asarray(self._index, dtype=np.int32) + self.hu_min
+
+    def build_lut(self, window_center, window_width, inverted=False):
+        """Строит таблицу HU -> [0..255], повторяющую арифметику `apply_windowing`."""
+        values = np.arange(self.hu_min, self.hu_max + 1, dtype=np.float64)
+        img_min = window_center - window_width // 2  # minimum HU level
+        img_max = window_center + window_width // 2  # maximum HU level
+        values = np.clip(values, img_min, img_max)
+        if inverted:
+            # Как и в `apply_windowing`, границы берутся по реальным значениям исследования
+            data_max = min(max(self.hu_max, img_min), img_max)
+            data_min = min(max(self.hu_min, img_min), img_max)
+            img_min, img_max = -data_max, -data_min
+            values = -values
+        denominator = img_max - img_min
+        lut = (values - img_min) / (denominator if denominator != 0 else 1) * 255.0
+        return np.array(lut, dtype=np.uint8)
+
+    def apply(self, window_center, window_width, inverted=False):
+        """Возвращает изображение в BGR для заданного windowing'а. Буфер переиспользуется между вызовами."""
+        key = (window_center, window_width, bool(inverted))
+        if key == self._lut_key:  # Ничего не изменилось, буфер уже актуален
+            return self.image
+        self._lut = self.build_lut(*key)
+        self._lut_key = key
+        if self._index.dtype == np.uint8:
+            lut = np.zeros(256, dtype=np.uint8)
+            lut[:len(self._lut)] = self._lut
+            cv2.LUT(self._index, lut, dst=self.gray)
+        else:
+            np.take(self._lut, self._index, out=self.gray, mode='clip')
+        cv2.cvtColor(self.gray, cv2.COLOR_GRAY2BGR, dst=self.image)
+        return self.image
@@ -0,0 +1,145 @@
+import json
+import os
+import threading
+import time
+from collections import deque
+
+import numpy as np
+
+from utils.drawing.text import draw_text
+
+class RollingHistogram:
+    """Задержки по последним window замерам; перцентили считаются по ним точно, когда нужна сводка."""
+
+    def __init__(self, window=1000):
+        self.samples = deque(maxlen=window)
+        self.total = 0  # сколько замеров было за всё время
+
+    def add(self, milliseconds):
+        self.samples.append(milliseconds)
+        self.total += 1
+
+    def summary(self):
+        samples = np.array(self.samples)
+        return {
+            'count': self.total,
+            'mean': float(samples.mean()),
+            'p50': float(np.percentile(samples, 50)),
+            'p95': float(np.percentile(samples, 95)),
+            'max': float(samples.max()),
+        }
+
+
+class Profiler:
+    """
+    Замеры задержек методов окна и времени кадров.
+    Методы оборачиваются на экземпляре, поэтому выключенный профилировщик ничего не стоит.
+    """
+
+    def __init__(self, trace_path=None, window=1000):
+        """
+        :param trace_path: куда писать трассу в формате Chrome trace (chrome://tracing, Perfetto);
+                           события пишутся в файл по мере появления, в памяти не копятся
+        :param window: по скольким последним замерам строятся гистограммы
+        """
+        self.trace_path = trace_path
+        self.window = window
+        self.histograms = {}  # имя -> RollingHistogram
+        self.overlay = False  # показывать ли FPS и задержки поверх кадра
+        self._trace = None  # файл трассы
+        self._trace_lock = threading.Lock()  # замеры приходят и из фоновых потоков
+        self._separator = ''  # что записать перед следующим событием трассы
+        if trace_path:
+            self._trace = open(trace_path, 'w')
+            self._trace.write('{"displayTimeUnit": "ms", "traceEvents": [\n')
+        self._frames = deque()  # время показа кадров за последнюю секунду
+        self._origin = time.perf_counter()
+
+    @classmethod
+    def from_environment(cls):
+        """
+        Профилировщик по переменным окружения или None, если профилирование выключено.
+        MEDICAL_ANNOTATOR_PROFILE=1 — включить, MEDICAL_ANNOTATOR_TRACE=файл — включить и записать трассу.
+        """
+        trace_path = os.environ.get('MEDICAL_ANNOTATOR_TRACE') or None
+        if not trace_path and os.environ.get('MEDICAL_ANNOTATOR_PROFILE', '') in ('', '0'):
+            return None
+        return cls(trace_path)
+
+    def instrument(self, instance, names):
+        """Оборачивает перечисленные методы экземпляра (отсутствующие пропускаются)."""
+        for name in names:
+            method = getattr(instance, name, None)
+            if method is not None:
+                setattr(instance, name, self._timed(name, method))
+
+    def _timed(self, name, method):
+        def timed(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return method(*args, **kwargs)
+            finally:
+                self.record(name, start, time.perf_counter())
+        return timed
+
+    def record(self, name, start, end):
+        """Добавляет замер: start и end — значения time.perf_counter()."""
+        histogram = self.histograms.get(name)
+        if histogram is None:
+            histogram = self.histograms[name] = RollingHistogram(self.window)
+        histogram.add((end - start) * 1000)
+        if self._trace is not None:
+            self._emit({'name': name, 'ph': 'X', 'pid': os.getpid(), 'tid': threading.get_ident(),
+                        'ts': (start - self._origin) * 1e6, 'dur': (end - start) * 1e6})
+
+    def frame(self):
+        """Отмечает показ кадра."""
+        now = time.perf_counter()
+        self._frames.append(now)
+        while now - self._frames[0] > 1:
+            self._frames.popleft()
+        if self._trace is not None:
+            self._emit({'name': 'frame', 'ph': 'i', 's': 'p', 'pid': os.getpid(), 'tid': threading.get_ident(),
+                        'ts': (now - self._origin) * 1e6})
+
+    def _emit(self, event):
+        """Дописывает событие в файл трассы (файл буферизуется, запись на диск — пачками)."""
+        with self._trace_lock:
+            if self._trace is not None:
+                self._trace.write(self._separator + json.dumps(event))
+                self._separator = ',\n'
+
+    @property
+    def fps(self):
+        return len(self._frames)
+
+    def draw_overlay(self, image):
+        """Копия кадра с FPS и p50/p95 задержками (кадр окна не меняется — его буферы переиспользуются)."""
+        image = image.copy()
+        lines = [f"{self.fps} fps"] + [f"{name}: p50 {stats['p50']:.1f} p95 {stats['p95']:.1f} ms"
+                                      for name, stats in self.summary().items()]
+        for row, text in enumerate(lines):
+            draw_text(image, text, (4, 4 + 16 * row))
+        return image
+
+    def summary(self):
+        """Сводка по каждому замеряемому методу (по последним замерам)."""
+        return {name: histogram.summary() for name, histogram in sorted(self.histograms.items())}
+
+    def report(self):
+        """Текстовая таблица задержек."""
+        rows = [f"{'name':<24}{'count':>8}{'mean':>10}{'p50':>10}{'p95':>10}{'max':>10}  (ms)"]
+        for name, stats in self.summary().items():
+            rows.append(f"{name:<24}{stats['count']:>8}" +
+                        "".join(f"{stats[key]:>10.2f}" for key in ('mean', 'p50', 'p95', 'max')))
+        return "\n".join(rows)
+
+    def close(self):
+        """Печатает сводку и дописывает трассу, если она собиралась."""
+        print(self.report())
+        with self._trace_lock:
+            trace, self._trace = self._trace, None
+        if trace is not None:
+            trace.write('\n]}\n')
+            trace.close()
+            print(f"Trace saved to {self.trace_path}")
@@ -0,0 +1,310 @@
+"""
+Локальный сервис разметки: HTTP/JSON на стандартной библиотеке.
+Исследования открываются один раз и хранятся в LRU-кеше сессий (декодированные пиксели, движок windowing'а,
+изображения без шума), поэтому несколько разметчиков на одной машине не повторяют тяжёлые шаги.
+Тяжёлые операции идут в ограниченном пуле потоков с очередью; если очередь заполнена, сервис сразу
+отвечает 503 с Retry-After, а не копит запросы.
+
+Все запросы — POST с JSON; маски передаются в формате .rle, изображения — PNG, оба в base64.
+  /study       {path}                                          -> {shape, windowing, spacing, sop_uid}
+  /windowing   {path, window_center, window_width, inverted}  -> {image}
+  /denoise     {path, window_center, window_width, inverted}  -> {image}
+  /floodfill   {path, labels, tolerance[, label, window_center, window_width, inverted]} -> {flood}
+  /mask/save   {path, labels}                                  -> {saved}
+  /mask/load   {path}                                          -> {labels}
+GET /stats — состояние сервиса.
+Разметка сохраняется и читается только для исследований, открытых через сервис (иначе 403):
+сервис не пишет файлы по произвольным путям. Непредвиденная ошибка — 500 с JSON, как у остальных ответов.
+"""
+import base64
+import json
+import os
+import threading
+from collections import OrderedDict, Counter
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from cv2 import cv2
+import numpy as np
+import pydicom
+
+from app.constants import *
+from utils.io.masks import MASK_EXTENSION, encode_mask, decode_mask, save_mask
+from utils.pipeline import floodfill_labels
+from utils.preprocessing.denoising import cached_denoise
+from utils.preprocessing.dicom_transforms import get_windowing
+from utils.preprocessing.windowing import WindowingEngine
+
+
+class ServiceBusy(Exception):
+    """Очередь тяжёлых операций заполнена."""
+
+
+def encode_bytes(data):
+    return base64.b64encode(data).decode('ascii')
+
+
+def decode_bytes(text):
+    return base64.b64decode(text.encode('ascii'))
+
+
+def encode_image(image):
+    """Одноканальное изображение uint8 -> PNG в base64."""
+    ok, data = cv2.imencode('.png', image)
+    if not ok:
+        raise ValueError("Can't encode image")
+    return encode_bytes(data.tobytes())
+
+
+def decode_image(text):
+    return cv2.imdecode(np.frombuffer(decode_bytes(text), dtype=np.uint8), cv2.IMREAD_GRAYSCALE)
+
+
+class StudySession:
+    """Открытое в сервисе исследование: заголовок, движок windowing'а и изображения без шума для windowing'ов."""
+
+    def __init__(self, path, pixel_cache=None, denoise_cache=None, denoise_power=7, max_denoised=4):
+        self.path = path
+        self.survey = pydicom.dcmread(path)
+        self.base_windowing = get_windowing(self.survey)
+        pixels = self.survey.pixel_array if pixel_cache is None else pixel_cache.pixels(self.survey)
+        self.engine = WindowingEngine(pixels, *self.base_windowing[2:4])
+        self.denoise_cache = denoise_cache
+        self.denoise_power = denoise_power
+        self.max_denoised = max_denoised
+        self._lock = threading.Lock()  # движок пишет результат в общие буферы
+        self._denoise_lock = threading.Lock()  # одинаковые запросы не считают denoise дважды
+        self._denoised = OrderedDict()  # windowing -> изображение без шума
+
+    @property
+    def info(self):
+        return {
+            'shape': list(self.engine.hu_index.shape),
+            'windowing': [int(value) for value in self.base_windowing],
+            'spacing': [float(value) for value in self.survey.get('PixelSpacing', (1, 1))],
+            'sop_uid': str(self.survey.get('SOPInstanceUID', '')),
+        }
+
+    def windowing(self, window_center=None, window_width=None, inverted=None):
+        """Значения windowing'а в формате окон: [WC, WW, intercept, slope, inverted] (по умолчанию — из файла)."""
+        windowing = list(self.base_windowing)
+        for index, value in ((0, window_center), (1, window_width), (4, inverted)):
+            if value is not None:
+                windowing[index] = bool(value) if index == 4 else int(value)
+        return windowing
+
+    def windowed(self, windowing):
+        """Копия изображения после windowing'а."""
+        with self._lock:
+            self.engine.apply(windowing[0], windowing[1], windowing[4])
+            return self.engine.gray.copy()
+
+    def denoised(self, windowing):
+        """Изображение без шума, как `FloodFillWindow.blurred_image` (с тем же ключом дискового кеша)."""
+        key = tuple(windowing)
+        with self._denoise_lock:
+            image = self._denoised.get(key)
+            if image is None:
+                image = cached_denoise(self.windowed(windowing), uid=self.survey.get('SOPInstanceUID'),
+                                       cache=self.denoise_cache, windowing=key, power=self.denoise_power)
+                self._denoised[key] = image
+                while len(self._denoised) > self.max_denoised:
+                    self._denoised.popitem(last=False)
+            self._denoised.move_to_end(key)
+            return image
+
+
+class AnnotationService:
+    """Сессии исследований (LRU) и ограниченный пул тяжёлых операций с очередью и отказом при перегрузке."""
+
+    def __init__(self, workers=None, queue_size=16, max_sessions=8, pixel_cache=None, denoise_cache=None):
+        """
+        :param workers: потоков для тяжёлых операций
+        :param queue_size: сколько операций может ждать свободного потока; сверх этого — ServiceBusy
+        :param max_sessions: сколько исследований держать открытыми
+        """
+        self.workers = workers or os.cpu_count() or 4
+        self.queue_size = queue_size
+        self.max_sessions = max_sessions
+        self.pixel_cache = pixel_cache
+        self.denoise_cache = denoise_cache
+        self.executor = ThreadPoolExecutor(self.workers, thread_name_prefix='service')
+        self.counters = Counter()
+        self._slots = threading.BoundedSemaphore(self.workers + queue_size)
+        self._in_flight = 0
+        self._sessions = OrderedDict()  # путь -> StudySession
+        self._opened = {}  # путь -> размер изображения для всех открытых исследований, в том числе закрытых LRU
+        self._lock = threading.Lock()
+
+    def run(self, function, *args):
+        """Выполняет тяжёлую операцию в пуле и ждёт её. Если пул и очередь заняты — ServiceBusy."""
+        if not self._slots.acquire(blocking=False):
+            with self._lock:
+                self.counters['rejected'] += 1
+            raise ServiceBusy()
+        with self._lock:
+            self._in_flight += 1
+        try:
+            return self.executor.submit(function, *args).result()
+        finally:
+            with self._lock:
+                self._in_flight -= 1
+            self._slots.release()
+
+    def session(self, path):
+        """Сессия исследования; открывается в пуле, лишние сессии закрываются (LRU)."""
+        path = os.path.abspath(path)
+        with self._lock:
+            session = self._sessions.get(path)
+            if session is not None:
+                self._sessions.move_to_end(path)
+                self.counters['session_hits'] += 1
+                return session
+        session = self.run(StudySession, path, self.pixel_cache, self.denoise_cache)
+        with self._lock:
+            self.counters['session_misses'] += 1
+            session = self._sessions.setdefault(path, session)  # Сессию мог открыть параллельный запрос
+            self._opened[path] = tuple(session.info['shape'])
+            self._sessions.move_to_end(path)
+            while len(self._sessions) > self.max_sessions:
+                self._sessions.popitem(last=False)
+        return session
+
+    # Операции сервиса: запрос и ответ — словари, как в JSON
+
+    def open_study(self, request):
+        return self.session(request['path']).info
+
+    def windowing(self, request):
+        session = self.session(request['path'])
+        windowing = self._windowing(session, request)
+        return {'image': encode_image(session.windowed(windowing))}
+
+    def denoise(self, request):
+        session = self.session(request['path'])
+        windowing = self._windowing(session, request)
+        return {'image': encode_image(self.run(session.denoised, windowing))}
+
+    def floodfill(self, request):
+        session = self.session(request['path'])
+        labels = decode_mask(decode_bytes(request['labels']))
+        if list(labels.shape) != session.info['shape']:
+            raise ValueError(f"Labels have shape {labels.shape}, expected {tuple(session.info['shape'])}")
+        windowing = self._windowing(session, request)
+        flood = self.run(self._floodfill, session, windowing, labels, int(request['tolerance']),
+                         int(request.get('label', COLOR_POSITIVE)))
+        return {'flood': encode_bytes(encode_mask(flood))}
+
+    @staticmethod
+    def _floodfill(session, windowing, labels, tolerance, label):
+        return floodfill_labels(session.denoised(windowing), labels, tolerance, label=label)
+
+    def save_mask(self, request):
+        shape = self.opened_shape(request['path'])
+        labels = decode_mask(decode_bytes(request['labels']))
+        if labels.shape != shape:
+            raise ValueError(f"Labels have shape {labels.shape}, expected {shape}")
+        path = self.mask_path(request['path'])
+        save_mask(path, labels)
+        return {'saved': path}
+
+    def load_mask(self, request):
+        self.opened_shape(request['path'])
+        path = self.mask_path(request['path'])
+        if not os.path.exists(path):
+            raise FileNotFoundError(path)
+        with open(path, 'rb') as file:
+            return {'labels': encode_bytes(file.read())}
+
+    def opened_shape(self, path):
+        """Размер изображения исследования, открытого через сервис; для остальных путей — PermissionError."""
+        with self._lock:
+            shape = self._opened.get(os.path.abspath(path))
+        if shape is None:
+            raise PermissionError(f"Study {path} is not opened in the service")
+        return shape
+
+    @staticmethod
+    def mask_path(path):
+        """Файл разметки рядом с DICOM файлом, как у окон."""
+        return os.path.splitext(os.path.abspath(path))[0] + MASK_EXTENSION
+
+    @staticmethod
+    def _windowing(session, request):
+        return session.windowing(request.get('window_center'), request.get('window_width'), request.get('inverted'))
+
+    def stats(self):
+        with self._lock:
+            return dict(self.counters, sessions=len(self._sessions), in_flight=self._in_flight,
+                        workers=self.workers, queue_size=self.queue_size)
+
+    def close(self):
+        self.executor.shutdown(wait=False)
+
+
+class ServiceHandler(BaseHTTPRequestHandler):
+    """HTTP-обработчик: маршрут -> метод AnnotationService."""
+    protocol_version = 'HTTP/1.1'  # соединения переиспользуются
+    routes = {
+        '/study': 'open_study',
+        '/windowing': 'windowing',
+        '/denoise': 'denoise',
+        '/floodfill': 'floodfill',
+        '/mask/save': 'save_mask',
+        '/mask/load': 'load_mask',
+    }
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get('Content-Length', 0)))  # Читаем тело всегда: keep-alive
+        name = self.routes.get(self.path)
+        if name is None:
+            self._reply(404, {'error': f"Unknown endpoint {self.path}"})
+            return
+        service = self.server.service
+        try:
+            result = getattr(service, name)(json.loads(body or b'{}'))
+        except ServiceBusy:
+            self._reply(503, {'error': "Service is busy"}, {'Retry-After': '1'})
+        except PermissionError as error:
+            self._reply(403, {'error': f"Forbidden: {error}"})
+        except FileNotFoundError as error:
+            self._reply(404, {'error': f"Not found: {error}"})
+        except (KeyError, ValueError, TypeError, pydicom.errors.InvalidDicomError) as error:
+            self._reply(400, {'error': f"Bad request: {error!r}"})
+        except Exception as error:  # Клиент получает ответ, а не оборванное соединение
+            with service._lock:
+                service.counters['errors'] += 1
+            self._reply(500, {'error': f"Internal error: {error!r}"})
+        else:
+            with service._lock:
+                service.counters[name] += 1
+            self._reply(200, result)
+
+    def do_GET(self):
+        if self.path == '/stats':
+            self._reply(200, self.server.service.stats())
+        else:
+            self._reply(404, {'error': f"Unknown endpoint {self.path}"})
+
+    def _reply(self, status, payload, headers=None):
+        data = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super(ServiceHandler, self).log_message(format, *args)
+
+
+def make_server(service, host='127.0.0.1', port=8765, verbose=False):
+    """HTTP-сервер сервиса (запросы принимаются в отдельных потоках, тяжёлая работа — в пуле сервиса)."""
+    server = ThreadingHTTPServer((host, port), ServiceHandler)
+    server.daemon_threads = True
+    server.service = service
+    server.verbose = verbose
+    return server
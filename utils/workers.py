@@ -0,0 +1,99 @@
+import os
+import threading
+import time
+import traceback
+from concurrent.futures import ThreadPoolExecutor, wait
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_executor():
+    """Общий пул потоков для фоновых задач (OpenCV и NumPy отпускают GIL на тяжёлых операциях)."""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=os.cpu_count() or 4, thread_name_prefix='annotator')
+    return _executor
+
+
+def print_error(error):
+    """Печатает исключение фоновой задачи с трассировкой."""
+    traceback.print_exception(type(error), error, error.__traceback__)
+
+
+class BackgroundJob:
+    """
+    Тяжёлая задача окна, выполняемая в фоне.
+    Запуск откладывается на delay секунд после последнего запроса, так что серия запросов даёт один запуск.
+    Одновременно выполняется не больше одного запуска; результат запуска, после которого уже были новые
+    запросы, устарел и отбрасывается. Упавший запуск не роняет цикл окна: ошибка запоминается в `error`
+    и передаётся в fail, результата нет, следующий запрос запускается как обычно.
+    """
+
+    def __init__(self, prepare, apply, delay=0.03, fail=None):
+        """
+        :param prepare: вызывается в потоке интерфейса перед запуском, снимает нужное состояние
+                        и возвращает функцию без аргументов для фонового потока
+        :param apply: вызывается в потоке интерфейса с результатом, если он не устарел
+        :param delay: пауза после последнего запроса перед запуском, в секундах
+        :param fail: вызывается в потоке интерфейса с исключением упавшего запуска (по умолчанию — печать)
+        """
+        self.prepare = prepare
+        self.apply = apply
+        self.delay = delay
+        self.fail = fail or print_error
+        self.error = None  # исключение последнего запуска, если он упал
+        self.generation = 0  # номер последнего запроса
+        self._due = None  # когда запускать отложенный запрос
+        self._future = None
+        self._future_generation = None
+
+    def request(self):
+        """Запрашивает пересчёт (предыдущие запросы и незавершённый запуск устаревают)."""
+        self.generation += 1
+        self._due = time.perf_counter() + self.delay
+
+    def cancel(self):
+        """Отменяет отложенный запрос, результат незавершённого запуска будет отброшен."""
+        self.generation += 1
+        self._due = None
+
+    @property
+    def busy(self):
+        return self._due is not None or self._future is not None
+
+    def poll(self):
+        """Применяет готовый результат и запускает отложенный запрос. Вызывается в цикле окна."""
+        if self._future is not None and self._future.done():
+            future, self._future = self._future, None
+            try:
+                result = future.result()
+            except Exception as error:
+                self._failed(error)
+            else:
+                self.error = None
+                if self._future_generation == self.generation:
+                    self.apply(result)
+        if self._future is None and self._due is not None and time.perf_counter() >= self._due:
+            self._due = None
+            self._future_generation = self.generation
+            try:
+                task = self.prepare()
+            except Exception as error:
+                self._failed(error)
+                return
+            self._future = get_executor().submit(task)
+
+    def _failed(self, error):
+        self.error = error
+        self.fail(error)
+
+    def wait(self):
+        """Запускает отложенный запрос без паузы и дожидается всех результатов (для работы без интерфейса)."""
+        while self.busy:
+            if self._due is not None:
+                self._due = 0
+            if self._future is not None:
+                wait([self._future])
+            self.poll()